@@ -8,9 +8,15 @@
 # Copyright (C) 2022. All Rights Reserved.
 
 from argparse import Namespace
+
+import torch
+
 from pyabsa.framework.configuration_class.config_verification import config_check
 from pyabsa.utils.pyabsa_utils import fprint
 
+# the call counts are not updated in the models compiled by torch.compile, which would recompile the model at every call
+_is_compiling = getattr(getattr(torch, "compiler", None), "is_compiling", lambda: False)
+
 
 class ConfigManager(Namespace):
     def __init__(self, args=None, **kwargs):
@@ -43,9 +49,10 @@ class ConfigManager(Namespace):
             return super().__getattribute__(arg_name)
         try:
             value = super().__getattribute__("args")[arg_name]
-            args_call_count = super().__getattribute__("args_call_count")
-            args_call_count[arg_name] += 1
-            super().__setattr__("args_call_count", args_call_count)
+            if not _is_compiling():
+                args_call_count = super().__getattribute__("args_call_count")
+                args_call_count[arg_name] += 1
+                super().__setattr__("args_call_count", args_call_count)
             return value
 
         except Exception as e:
@@ -84,7 +91,7 @@ class ConfigManager(Namespace):
         :param default: The default value to return if the key is not found.
         :return: The value of the key in the parameter dict, or the default value if the key is not found.
         """
-        if key in self.args_call_count:
+        if key in self.args_call_count and not _is_compiling():
             self.args_call_count[key] += 1
         return self.args.get(key, default)
 
@@ -21,6 +21,7 @@ class PyABSADataset(Dataset):
         load_data_from_dict(self, dataset_dict, dataset_type, **kwargs): loads the dataset from a dictionary object containing the preprocessed data. dataset_dict is the dictionary object, dataset_type is the type of the dataset to load, and additional keyword arguments can be passed to customize the loading behavior.
         load_data_from_file(self, dataset_file, dataset_type, **kwargs): loads the dataset from a file containing the preprocessed data. dataset_file is the file path, dataset_type is the type of the dataset to load, and additional keyword arguments can be passed to customize the loading behavior.
         get_labels(self): returns a list of the labels for each data sample in the dataset.
+        get_sample_weights(self): returns the sampling weights of the data samples, or None if the samples are drawn uniformly.
         __len__(self): returns the number of data samples in the dataset.
         __str__(self): returns a string representation of the dataset.
         __repr__(self): returns a string representation of the dataset.
@@ -142,6 +143,13 @@ class PyABSADataset(Dataset):
         """
         return [data["label"] for data in self.data]
 
+    def get_sample_weights(self):
+        """
+        Get the sampling weights of the data samples for training, e.g., the over-sampling factors.
+        :return: A list of weights, or None if the samples are drawn uniformly.
+        """
+        return None
+
     def __len__(self):
         """
         Get the number of data samples in the dataset.
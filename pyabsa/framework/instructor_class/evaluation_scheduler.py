@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# file: evaluation_scheduler.py
+# time: 19/10/2026 13:20
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import time
+from collections import defaultdict
+from numbers import Number
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+
+
+class EvaluationScheduler:
+    """
+    Decide when and on what the model is evaluated during training. By default, the model is fully evaluated
+    every log_step steps, which is the original behaviour. The following config options reduce the evaluation cost:
+        eval_sample_ratio: evaluate on a fixed stratified subsample of the evaluation set for progress checks,
+            a float in (0, 1) is the ratio of the subsample, an int > 1 is the size of the subsample.
+            The full evaluation is only run when the subsample metrics improve, or at the end of each epoch.
+        eval_time_budget: the maximum ratio of the evaluation time to the training time, e.g., 0.1.
+            The progress checks are skipped while the evaluation runs over budget.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.sample_ratio = config.get("eval_sample_ratio", None)
+        self.time_budget = config.get("eval_time_budget", None)
+
+        self.train_time = 0
+        self.eval_time = 0
+        self._tick = None
+        self._epoch_end = False
+
+        self._sample_dataloaders = {}
+        self._best_sample_metrics = {}
+        self._last_full_metrics = {}
+
+    @property
+    def sampling(self):
+        return bool(self.sample_ratio) and self.sample_ratio != 1
+
+    def should_evaluate(self, global_step, epoch_end=False):
+        """
+        Check if the model should be evaluated at this step.
+
+        :param global_step: the global training step
+        :param epoch_end: whether this is the last step of the epoch
+        :return: True if the model should be evaluated
+        """
+        now = time.time()
+        if self._tick is None:
+            self._tick = now
+
+        # the full evaluation at the end of the epoch is always run if the progress checks are sampled,
+        # so that the best checkpoint of each epoch is not missed
+        self._epoch_end = epoch_end and self.sampling
+        if self._epoch_end:
+            return True
+
+        if global_step % self.config.log_step != 0:
+            return False
+
+        if self.time_budget:
+            train_time = self.train_time + now - self._tick
+            return self.eval_time <= self.time_budget * train_time
+        return True
+
+    def evaluate(self, evaluate_fn, dataloader, *args, **kwargs):
+        """
+        Evaluate the model on the subsample of the dataloader, and on the full dataloader if the
+        subsample metrics improve. The metrics of the last full evaluation are returned otherwise,
+        so that the checkpoint is only saved according to the full evaluation.
+
+        :param evaluate_fn: the evaluation function of the instructor, e.g., self._evaluate_acc_f1
+        :param dataloader: the dataloader to evaluate
+        :param args: the additional arguments of evaluate_fn
+        :param kwargs: the additional keyword arguments of evaluate_fn
+        :return: the metrics returned by evaluate_fn
+        """
+        start = time.time()
+        if self._tick is not None:
+            self.train_time += start - self._tick
+
+        sample_dataloader = self._get_sample_dataloader(dataloader)
+        key = id(dataloader)
+        if sample_dataloader is None:
+            metrics = evaluate_fn(dataloader, *args, **kwargs)
+        else:
+            metrics = evaluate_fn(sample_dataloader, *args, **kwargs)
+            improved = self._improved(metrics, self._best_sample_metrics.get(key))
+            if improved:
+                self._best_sample_metrics[key] = metrics
+            if improved or self._epoch_end or key not in self._last_full_metrics:
+                metrics = evaluate_fn(dataloader, *args, **kwargs)
+                self._last_full_metrics[key] = metrics
+            else:
+                metrics = self._last_full_metrics[key]
+
+        self._tick = time.time()
+        self.eval_time += self._tick - start
+        return metrics
+
+    def _get_sample_dataloader(self, dataloader):
+        if not self.sampling or not isinstance(dataloader, DataLoader):
+            return None
+        key = id(dataloader)
+        if key not in self._sample_dataloaders:
+            dataset = dataloader.dataset
+            if self.sample_ratio < 1:
+                sample_size = int(len(dataset) * self.sample_ratio)
+            else:
+                sample_size = int(self.sample_ratio)
+
+            if sample_size <= 0 or sample_size >= len(dataset):
+                self._sample_dataloaders[key] = None
+            else:
+                indices = stratified_sample_indices(
+                    _get_labels(dataset), len(dataset), sample_size, self.config.seed
+                )
+                self._sample_dataloaders[key] = DataLoader(
+                    Subset(dataset, indices),
+                    batch_size=dataloader.batch_size,
+                    collate_fn=dataloader.collate_fn,
+                    pin_memory=dataloader.pin_memory,
+                )
+        return self._sample_dataloaders[key]
+
+    @staticmethod
+    def _improved(metrics, best_metrics):
+        if best_metrics is None:
+            return True
+        return any(
+            m > b
+            for m, b in zip(_flatten_metrics(metrics), _flatten_metrics(best_metrics))
+        )
+
+
+def stratified_sample_indices(labels, population_size, sample_size, seed=None):
+    """
+    Draw a sample of the dataset indices whose label distribution follows the dataset.
+
+    :param labels: the labels of the dataset, the sample is drawn uniformly if labels is None
+    :param population_size: the size of the dataset
+    :param sample_size: the size of the sample
+    :param seed: the random seed, the same seed draws the same sample
+    :return: a sorted list of the sampled indices
+    """
+    rng = np.random.RandomState(seed if isinstance(seed, int) else None)
+    if labels is None:
+        return sorted(rng.choice(population_size, sample_size, replace=False).tolist())
+
+    groups = defaultdict(list)
+    for i, label in enumerate(labels):
+        if isinstance(label, torch.Tensor):
+            label = label.tolist()
+        groups[str(label)].append(i)
+
+    indices = []
+    for group in groups.values():
+        group_size = max(1, round(sample_size * len(group) / population_size))
+        indices.extend(rng.choice(group, min(group_size, len(group)), replace=False))
+    return sorted(int(i) for i in indices)
+
+
+def _get_labels(dataset):
+    data = getattr(dataset, "data", None)
+    for label_key in ["label", "polarity"]:
+        try:
+            return [sample[label_key] for sample in data]
+        except (KeyError, TypeError, IndexError):
+            continue
+    return None
+
+
+def _flatten_metrics(metrics):
+    if isinstance(metrics, Number):
+        return [metrics]
+    if isinstance(metrics, dict):
+        metrics = metrics.values()
+    elif not isinstance(metrics, (list, tuple)):
+        return []
+    flatten = []
+    for m in metrics:
+        flatten.extend(_flatten_metrics(m))
+    return flatten
@@ -26,6 +26,7 @@ from torch.utils.data import (
     ConcatDataset,
     RandomSampler,
     SequentialSampler,
+    WeightedRandomSampler,
 )
 from transformers import BertModel
 
@@ -33,8 +34,71 @@ from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
 
 import pytorch_warmup as warmup
 
+from pyabsa.framework.instructor_class.evaluation_scheduler import (
+    EvaluationScheduler,
+)
+from pyabsa.framework.instructor_class.loss_tracker import LossTracker
 from pyabsa.framework.sampler_class.imblanced_sampler import ImbalancedDatasetSampler
-from pyabsa.utils.pyabsa_utils import print_args, fprint
+from pyabsa.utils.file_utils.checkpoint_writer import CheckpointWriter
+from pyabsa.utils.file_utils.file_utils import load_mmap_cache, save_mmap_cache
+from pyabsa.utils.model_utils.model_utils import compile_model, unwrap_compiled_model
+from pyabsa.utils.pyabsa_utils import print_args, fprint, autocast, get_device_type
+
+# the options of a training run, which are neither hashed into the dataset cache path,
+# nor taken from the cached config, so that the runs share the cache, see load_dataset_cache()
+RUN_SPECIFIC_OPTIONS = [
+    "overwrite_cache",
+    "seed",
+    "device",
+    "device_name",
+    "auto_device",
+    "logger",
+    "MV",
+]
+
+
+def get_dataset_cache_path(config):
+    """
+    Get the path of the dataset cache, which is named by the hash of the config.
+    :param config: The configuration of the training.
+    :return: The path of the dataset cache.
+    """
+    config_str = re.sub(
+        r"<.*?>",
+        "",
+        str(
+            sorted(
+                [
+                    str(config.args[k])
+                    for k in config.args
+                    if k not in RUN_SPECIFIC_OPTIONS
+                ]
+            )
+        ),
+    )
+    hash_tag = sha256(config_str.encode()).hexdigest()
+    return "{}.{}.dataset.{}.cache".format(
+        config.model_name, config.dataset_name, hash_tag
+    )
+
+
+def load_dataset_cache(cache_path, config):
+    """
+    Load the datasets and the config from the dataset cache.
+    :param cache_path: The path of the dataset cache.
+    :param config: The configuration of this run, whose run-specific options are kept.
+    :return: The train set, valid set, test set and the cached config.
+    """
+    # the cache is shared by the runs (e.g., the seeds in the parallel workers), so the options
+    # of this run are kept rather than taken from the cached config of the run which saved it
+    run_options = {
+        key: config.args[key] for key in RUN_SPECIFIC_OPTIONS if key in config.args
+    }
+    # the arrays are memory-mapped, so that the parallel training runs share the cached dataset
+    train_set, valid_set, test_set, cached_config = load_mmap_cache(cache_path)
+    for key, value in run_options.items():
+        setattr(cached_config, key, value)
+    return train_set, valid_set, test_set, cached_config
 
 
 class BaseTrainingInstructor:
@@ -44,19 +108,31 @@ class BaseTrainingInstructor:
         """
         # Check if mixed precision training is enabled
         if config.use_amp:
-            try:
-                # Initialize AMP grad scaler if available
-                self.scaler = torch.cuda.amp.GradScaler()
-                # Print a message to inform the user that AMP is being used
+            if get_device_type(config.device) == DeviceTypeOption.CUDA:
+                try:
+                    # Initialize AMP grad scaler if available
+                    self.scaler = torch.cuda.amp.GradScaler()
+                    # Print a message to inform the user that AMP is being used
+                    fprint(
+                        colored(
+                            "Use torch.AMP for training! Please disable it if you encounter convergence problems.",
+                            "yellow",
+                        )
+                    )
+                except Exception:
+                    # If AMP is not available, set scaler to None
+                    self.scaler = None
+            else:
+                # bfloat16 has the range of float32, so the gradients are not scaled
+                self.scaler = None
                 fprint(
                     colored(
-                        "Use torch.AMP for training! Please disable it if you encounter convergence problems.",
+                        "Use torch.AMP (bfloat16) for training on {}! Please disable it if you encounter convergence problems.".format(
+                            config.device
+                        ),
                         "yellow",
                     )
                 )
-            except Exception:
-                # If AMP is not available, set scaler to None
-                self.scaler = None
         else:
             # If AMP is not enabled, set scaler to None
             self.scaler = None
@@ -92,6 +168,19 @@ class BaseTrainingInstructor:
         self.tokenizer = None
         self.embedding_matrix = None
 
+        # Write the checkpoints in background, see CheckpointWriter for the options
+        self.checkpoint_writer = CheckpointWriter(self.config)
+
+        # Decide when and on what the model is evaluated, see EvaluationScheduler for the options
+        self.eval_scheduler = EvaluationScheduler(self.config)
+
+        # Track the training losses without synchronizing the device at every step, see LossTracker for the options
+        self.loss_tracker = LossTracker(self.config)
+
+        # The state of the gradient accumulation and micro-batching, see _train_step()
+        self._accumulated_batches = 0
+        self._num_micro_batches = 1
+
     def _reset_params(self):
         """
         Reset the parameters of the model before training.
@@ -117,7 +206,7 @@ class BaseTrainingInstructor:
                     torch.load(find_file(ckpt, or_key=[".bin", "state_dict"]))
                 )
             else:
-                self.model.load_state_dict(
+                unwrap_compiled_model(self.model).load_state_dict(
                     torch.load(find_file(ckpt, or_key=[".bin", "state_dict"]))
                 )
 
@@ -127,38 +216,22 @@ class BaseTrainingInstructor:
         :param kwargs: Additional keyword arguments.
         :return: The path to the cache file if it exists. Otherwise, return None.
         """
-        # Generate the hash tag for the cache file
-        config_str = re.sub(
-            r"<.*?>",
-            "",
-            str(
-                sorted(
-                    [str(self.config.args[k]) for k in self.config.args if k != "seed"]
-                )
-            ),
-        )
-        hash_tag = sha256(config_str.encode()).hexdigest()
-
-        # Construct the path to the cache file
-        cache_path = "{}.{}.dataset.{}.cache".format(
-            self.config.model_name, self.config.dataset_name, hash_tag
-        )
+        cache_path = get_dataset_cache_path(self.config)
 
         # Load the dataset from cache if it exists and not set to overwrite the cache
         if os.path.exists(cache_path) and not self.config.overwrite_cache:
-            with open(cache_path, mode="rb") as f_cache:
-                self.config.logger.info("Load cache dataset from {}".format(cache_path))
-                (
-                    self.train_set,
-                    self.valid_set,
-                    self.test_set,
-                    self.config,
-                ) = pickle.load(f_cache)
-                _config = kwargs.get("config", None)
-                if _config:
-                    _config.update(self.config)
-                    _config.args_call_count.update(self.config.args_call_count)
-                return cache_path
+            self.config.logger.info("Load cache dataset from {}".format(cache_path))
+            (
+                self.train_set,
+                self.valid_set,
+                self.test_set,
+                self.config,
+            ) = load_dataset_cache(cache_path, self.config)
+            _config = kwargs.get("config", None)
+            if _config:
+                _config.update(self.config)
+                _config.args_call_count.update(self.config.args_call_count)
+            return cache_path
 
         return cache_path
 
@@ -170,44 +243,50 @@ class BaseTrainingInstructor:
         :return: The path to the saved cache file.
         """
         if cache_path is None:
-            config_str = re.sub(
-                r"<.*?>",
-                "",
-                str(
-                    sorted(
-                        [
-                            str(self.config.args[k])
-                            for k in self.config.args
-                            if k != "seed"
-                        ]
-                    )
-                ),
-            )
-            hash_tag = sha256(config_str.encode()).hexdigest()
-            cache_path = "{}.{}.dataset.{}.cache".format(
-                self.config.model_name, self.config.dataset_name, hash_tag
-            )
+            cache_path = get_dataset_cache_path(self.config)
         if (
             not os.path.exists(cache_path) or self.config.overwrite_cache
         ) and self.config.cache_dataset:
-            with open(cache_path, mode="wb") as f_cache:
-                self.config.logger.info("Save cache dataset to {}".format(cache_path))
-                pickle.dump(
-                    [self.train_set, self.valid_set, self.test_set, self.config],
-                    f_cache,
-                )
-                return cache_path
+            self.config.logger.info("Save cache dataset to {}".format(cache_path))
+            save_mmap_cache(
+                [self.train_set, self.valid_set, self.test_set, self.config],
+                cache_path,
+            )
+            return cache_path
         return None
 
     def _prepare_dataloader(self):
         """
         Prepares the data loaders for training, validation, and testing.
         """
+        # the datasets which over-sample their examples provide the sampling weights
+        get_sample_weights = getattr(self.train_set, "get_sample_weights", None)
+        sample_weights = get_sample_weights() if get_sample_weights else None
         if self.config.get("train_sampler", "random") == "random":
-            train_sampler = RandomSampler(self.train_set)
+            if sample_weights is None:
+                train_sampler = RandomSampler(self.train_set)
+            else:
+                train_sampler = WeightedRandomSampler(
+                    sample_weights, num_samples=round(sum(sample_weights))
+                )
         elif self.config.get("train_sampler", "random") == "imbalanced":
-            train_sampler = ImbalancedDatasetSampler(self.train_set)
+            if sample_weights is None:
+                train_sampler = ImbalancedDatasetSampler(self.train_set)
+            else:
+                train_sampler = ImbalancedDatasetSampler(
+                    self.train_set,
+                    num_samples=round(sum(sample_weights)),
+                    sample_weights=sample_weights,
+                )
         elif self.config.get("train_sampler", "sequential") == "sequential":
+            if sample_weights is not None:
+                fprint(
+                    colored(
+                        "The sequential train_sampler can not over-sample the training examples, "
+                        "the sampling weights of the dataset are ignored.",
+                        "red",
+                    )
+                )
             train_sampler = SequentialSampler(self.train_set)
         else:
             raise ValueError(
@@ -273,7 +352,18 @@ class BaseTrainingInstructor:
                     [x for i, x in enumerate(folds) if i != f_idx]
                 )
                 val_set = folds[f_idx]
-                train_sampler = RandomSampler(train_set)
+                if sample_weights is None:
+                    train_sampler = RandomSampler(train_set)
+                else:
+                    fold_weights = [
+                        sample_weights[idx]
+                        for i, fold in enumerate(folds)
+                        if i != f_idx
+                        for idx in fold.indices
+                    ]
+                    train_sampler = WeightedRandomSampler(
+                        fold_weights, num_samples=round(sum(fold_weights))
+                    )
                 val_sampler = SequentialSampler(val_set)
                 self.train_dataloaders.append(
                     DataLoader(
@@ -345,22 +435,17 @@ class BaseTrainingInstructor:
         self._prepare_env()
         self._prepare_dataloader()
 
-        # Compile the model using torch v2.0.0+ compile feature if specified
-        if self.config.get("use_torch_compile", False):
-            try:
-                self.model = torch.compile(self.model)
-                self.logger.info("use torch v2.0+ compile feature")
-            except Exception as e:
-                pass
-
         # Resume training from a previously trained model
         self._resume_from_checkpoint()
 
+        # Compile the model using torch v2.0.0+ compile feature if specified, see compile_model()
+        self.model = compile_model(self.model, self.config)
+
         # Initialize the learning rate scheduler if warmup_step is specified
         if self.config.warmup_step >= 0:
             self.lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(
                 self.optimizer,
-                T_max=len(self.train_dataloaders[0]) * self.config.num_epoch,
+                T_max=self._get_num_optimization_steps(self.train_dataloaders[0]),
             )
             self.warmup_scheduler = warmup.UntunedLinearWarmup(self.optimizer)
 
@@ -371,6 +456,104 @@ class BaseTrainingInstructor:
         else:
             return self._train_and_evaluate(criterion)
 
+    def _get_num_optimization_steps(self, train_dataloader):
+        """
+        Get the number of optimizer steps of the training, which is the T_max of the lr scheduler.
+
+        :param train_dataloader: the training dataloader
+        :return: the number of optimizer steps in all the epochs
+        """
+        accumulation_steps = max(1, self.config.get("gradient_accumulation_steps", 1))
+        return math.ceil(len(train_dataloader) / accumulation_steps) * int(
+            self.config.num_epoch
+        )
+
+    def _train_step(self, sample_batched, criterion, epoch_end=False):
+        """
+        Run the forward and backward passes of a batch, and step the optimizer (then the warmup and lr schedulers)
+        once the gradients of gradient_accumulation_steps batches are accumulated, or at the end of the epoch.
+        The following config options are used:
+            gradient_accumulation_steps: the number of batches accumulated for each optimizer step, default 1.
+                The effective batch size is batch_size * gradient_accumulation_steps (ATEPC divides the batch_size instead).
+            auto_micro_batch: split the batches into micro-batches if they run out of memory, default False.
+                The gradients accumulated in the current optimizer step are dropped when this happens.
+
+        :param sample_batched: the batch from the training dataloader
+        :param criterion: the loss function passed to _compute_loss()
+        :param epoch_end: whether this is the last batch of the epoch
+        :return: the detached loss of the batch
+        """
+        accumulation_steps = max(1, self.config.get("gradient_accumulation_steps", 1))
+        while True:
+            try:
+                loss = self._accumulate_gradients(
+                    sample_batched, criterion, accumulation_steps
+                )
+                break
+            except RuntimeError as e:
+                if (
+                    not self.config.get("auto_micro_batch", False)
+                    or not _is_out_of_memory(e)
+                    or self._num_micro_batches >= _get_batch_size(sample_batched)
+                ):
+                    raise
+            # retry outside the except block, so that the tensors referenced by the exception are released
+            self.optimizer.zero_grad()
+            self._accumulated_batches = 0
+            self._num_micro_batches *= 2
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            fprint(
+                colored(
+                    "Out of memory, split each batch into {} micro-batches.".format(
+                        self._num_micro_batches
+                    ),
+                    "yellow",
+                )
+            )
+
+        self._accumulated_batches += 1
+        if self._accumulated_batches >= accumulation_steps or epoch_end:
+            if self.config.use_amp and self.scaler:
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
+            else:
+                self.optimizer.step()
+            self._accumulated_batches = 0
+
+            if self.config.warmup_step >= 0:
+                with self.warmup_scheduler.dampening():
+                    self.lr_scheduler.step()
+        return loss
+
+    def _accumulate_gradients(self, sample_batched, criterion, accumulation_steps):
+        if self._accumulated_batches == 0:
+            self.optimizer.zero_grad()
+
+        batch_size = _get_batch_size(sample_batched)
+        batch_loss = 0
+        for micro_batch, micro_batch_size in _split_batch(
+            sample_batched, batch_size, self._num_micro_batches
+        ):
+            # float16 on CUDA, bfloat16 on CPU
+            with autocast(self.config.device, self.config.use_amp):
+                loss = self._compute_loss(micro_batch, criterion)
+            # the mean loss of a micro-batch is weighted by its share of the batch
+            loss = loss * (micro_batch_size / batch_size) / accumulation_steps
+            if self.config.use_amp and self.scaler:
+                self.scaler.scale(loss).backward()
+            else:
+                loss.backward()
+            batch_loss = batch_loss + loss.detach()
+        return batch_loss * accumulation_steps
+
+    def _compute_loss(self, sample_batched, criterion):
+        """
+        Compute the (mean) loss of a training batch, the model is already in the train mode.
+        This method should be implemented in a subclass.
+        """
+        raise NotImplementedError("Please implement this method in subclass")
+
     def _init_misc(self):
         """
         Initialize miscellaneous settings specific to the subclass implementation.
@@ -468,6 +651,57 @@ class BaseTrainingInstructor:
             )
 
 
+def _is_out_of_memory(e):
+    return "out of memory" in str(e) or "can't allocate memory" in str(e)
+
+
+def _get_batch_size(sample_batched):
+    if isinstance(sample_batched, torch.Tensor):
+        return sample_batched.size(0)
+    values = (
+        sample_batched.values() if isinstance(sample_batched, dict) else sample_batched
+    )
+    for value in values:
+        if isinstance(value, torch.Tensor) and value.dim() > 0:
+            return value.size(0)
+    return 1
+
+
+def _split_batch(sample_batched, batch_size, num_micro_batches):
+    """
+    Split a batch (a tensor, or a dict/list/tuple of tensors and lists) into micro-batches along the first dimension.
+
+    :param sample_batched: the batch to split
+    :param batch_size: the size of the batch
+    :param num_micro_batches: the number of micro-batches
+    :return: a list of (micro_batch, micro_batch_size)
+    """
+    if num_micro_batches <= 1:
+        return [(sample_batched, batch_size)]
+
+    def _slice(value, start, end):
+        if isinstance(value, dict):
+            return value.__class__((k, _slice(v, start, end)) for k, v in value.items())
+        if isinstance(value, tuple):
+            return tuple(_slice(v, start, end) for v in value)
+        if isinstance(value, torch.Tensor) and value.dim() > 0:
+            return value[start:end] if value.size(0) == batch_size else value
+        if isinstance(value, list):
+            if len(value) == batch_size:
+                return value[start:end]
+            return [_slice(v, start, end) for v in value]
+        return value
+
+    micro_batch_size = math.ceil(batch_size / num_micro_batches)
+    return [
+        (
+            _slice(sample_batched, start, start + micro_batch_size),
+            min(micro_batch_size, batch_size - start),
+        )
+        for start in range(0, batch_size, micro_batch_size)
+    ]
+
+
 def get_resume_checkpoint(config):
     from pyabsa.framework.checkpoint_class.checkpoint_template import CheckpointManager
 
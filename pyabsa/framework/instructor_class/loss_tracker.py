@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# file: loss_tracker.py
+# time: 19/10/2026 16:40
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import math
+import time
+
+import torch
+
+
+class LossTracker:
+    """
+    Track the training losses without synchronizing the device at every step. The losses are kept on
+    the device and copied to the host in one transfer every log_step steps (or when they are read),
+    and the progress bar is refreshed at most once in a while. The following config options are used:
+        loss_display: "smooth" to display the average loss, or "batch" to display the last loss, default "smooth"
+        progress_refresh_interval: the minimum interval (in seconds) between the progress bar refreshes, default 1
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.loss_display = config.get("loss_display", "smooth")
+        self.refresh_interval = config.get("progress_refresh_interval", 1)
+
+        self._pending = []
+        self._losses = []
+        self._loss_sum = 0.0
+        self._loss_count = 0
+        self._last_refresh = 0
+
+    def reset(self):
+        """
+        Clear the tracked losses, e.g., at the beginning of a training run.
+        """
+        self._pending = []
+        self._losses = []
+        self._loss_sum = 0.0
+        self._loss_count = 0
+
+    def track(self, loss):
+        """
+        Record the loss of a training step, without waiting for the device.
+
+        :param loss: the loss tensor (or number) of the step
+        """
+        if isinstance(loss, torch.Tensor):
+            loss = loss.detach()
+        self._pending.append(loss)
+        if len(self._pending) >= max(1, self.config.log_step):
+            self.materialize()
+
+    def materialize(self):
+        """
+        Copy the pending losses to the host in one transfer.
+        """
+        if not self._pending:
+            return
+        tensors = [l for l in self._pending if isinstance(l, torch.Tensor)]
+        if len(tensors) == len(self._pending):
+            losses = torch.stack([l.float().reshape(()) for l in tensors]).tolist()
+        else:
+            losses = [float(l) for l in self._pending]
+        self._pending = []
+        for loss in losses:
+            if not math.isnan(loss):
+                self._loss_sum += loss
+                self._loss_count += 1
+        self._losses.extend(losses)
+
+    @property
+    def losses(self):
+        self.materialize()
+        return self._losses
+
+    @property
+    def last_loss(self):
+        self.materialize()
+        return self._losses[-1] if self._losses else float("nan")
+
+    @property
+    def smooth_loss(self):
+        """
+        The average of the materialized losses (ignoring NaN), the pending losses are not read,
+        so that the progress display does not synchronize the device.
+        """
+        if not self._loss_count:
+            return float("nan")
+        return self._loss_sum / self._loss_count
+
+    def description(self, epoch):
+        """
+        The loss description of the progress bar, which is only updated when the losses are materialized.
+
+        :param epoch: the current epoch
+        :return: the description, or None if no loss has been materialized
+        """
+        if not self._losses:
+            return None
+        if self.loss_display == "smooth":
+            return "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
+                epoch, round(self.smooth_loss, 4)
+            )
+        else:
+            return "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
+                epoch, round(self._losses[-1], 4)
+            )
+
+    def refresh(self, iterator, description):
+        """
+        Update the description of the progress bar if the last refresh is older than the refresh interval.
+
+        :param iterator: the tqdm progress bar
+        :param description: the description to display
+        """
+        now = time.time()
+        if description and now - self._last_refresh >= self.refresh_interval:
+            iterator.set_description(description)
+            self._last_refresh = now
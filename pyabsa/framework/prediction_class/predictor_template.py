@@ -6,13 +6,29 @@
 # GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
 # ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
 # Copyright (C) 2022. All Rights Reserved.
+import copy
+import json
+import os
 import time
+from collections import OrderedDict
 from typing import Union
 
+import torch
+from pyabsa.utils.file_utils.file_utils import load_dataset_from_file
 from pyabsa.utils.text_utils.mlm import get_mlm_and_tokenizer
 from torch import cuda
 
 from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
+from pyabsa.framework.prediction_class.result_cache import InferenceResultCache
+from pyabsa.utils.model_utils.model_utils import (
+    compile_model,
+    is_compiled_model,
+    pad_batch_to_bucket,
+    quantize_model,
+    unpad_batch,
+)
+from pyabsa.utils.model_utils.model_export import ExportedModel, export_model
+from pyabsa.utils.pyabsa_utils import autocast, fprint
 
 
 class InferenceModel:
@@ -42,6 +58,12 @@ class InferenceModel:
         self.model = None
         self.dataset = None
 
+        # whether the mixed precision outputs have been checked against float32, see _forward()
+        self._amp_checked = False
+
+        # the cache of the prediction results, see _cached_predict()
+        self.result_cache = None
+
     def to(self, device=None):
         """
         Sets the device on which the model will perform inference.
@@ -98,6 +120,184 @@ class InferenceModel:
 
         self.to(self.config.device)
 
+        if not isinstance(self.model, ExportedModel):
+            # quantize the model if quantize is set, see _quantize_model()
+            self._quantize_model()
+
+            # compile the model if compile_model is set, see compile_model()
+            self.model = compile_model(self.model, self.config)
+
+        self.result_cache = InferenceResultCache.from_config(
+            self.config, self.checkpoint
+        )
+
+    def export(self, path, export_format="onnx", samples=None, atol=1e-4):
+        """
+        Export the model to an ONNX graph or a TorchScript module with a fixed positional input signature,
+        see export_model(). The exported model can be loaded by the predictor with the exported_model option,
+        e.g., SentimentClassifier(checkpoint, exported_model=path), which runs it with the same pre- and
+        post-processing, without the model code on the hot path.
+
+        :param path: the path of the exported model
+        :param export_format: "onnx" or "torchscript"
+        :param samples: the example inputs to trace the model, e.g., texts, default the examples of the predictor
+        :param atol: the maximum absolute difference between the exported and eager logits
+        :return: the exported model, see ExportedModel
+        """
+        if isinstance(self.model, ExportedModel):
+            raise RuntimeError(
+                "The model has been exported to {}".format(self.model.path)
+            )
+        inputs_cols, example_inputs, input_format = self._export_inputs(samples)
+        return export_model(
+            self.model,
+            inputs_cols,
+            example_inputs,
+            path,
+            export_format=export_format,
+            input_format=input_format,
+            atol=atol,
+            seq_len=self.config.get("max_seq_len", None),
+        )
+
+    def _export_inputs(self, samples=None):
+        """
+        Build the example inputs to export the model, which should be implemented in the subclass.
+
+        :param samples: the example inputs, e.g., texts
+        :return: the input columns, the input tensors, and the input format of the model ("dict" or "list")
+        """
+        raise NotImplementedError(
+            "The model export is not supported by {}".format(self.__class__.__name__)
+        )
+
+    def _quantize_model(self):
+        """
+        Quantize the model if the quantize option is set, see quantize_model(). The following config options are used:
+            quantize_check_file: a held-out inference file with the reference labels, on which the predictions of
+                the quantized model are compared with the float model, default None (not checked)
+            quantize_tolerance: the quantization is dropped if the accuracy drops by more than quantize_tolerance
+                on the check file (or the predicted labels disagree on more than quantize_tolerance of the examples
+                if the file has no reference labels), default 0.01
+            quantize_cache: whether to cache the quantized state dict (and the result of the check) next to
+                the checkpoint, so that the check is not repeated for the checkpoint, default False
+        """
+        mode = self.config.get("quantize", None)
+        if not mode:
+            return
+        check_file = self.config.get("quantize_check_file", None)
+        tolerance = self.config.get("quantize_tolerance", 0.01)
+
+        cache_path = self._quantize_cache_path(mode)
+        cache = None
+        if cache_path and os.path.exists(cache_path):
+            cache = torch.load(cache_path, map_location=DeviceTypeOption.CPU)
+            if cache.get("check_file", None) != check_file:
+                cache["accuracy_delta"] = None
+            elif (
+                cache["accuracy_delta"] is not None
+                and cache["accuracy_delta"] > tolerance
+            ):
+                fprint(
+                    "The quantized model of {} has been rejected by the accuracy check (delta: {:.4f}), "
+                    "run in float32.".format(self.checkpoint, cache["accuracy_delta"])
+                )
+                return
+
+        float_model = self.model
+        self.model = quantize_model(
+            float_model, self.config, cache["state_dict"] if cache else None
+        )
+        if self.model is float_model:
+            return
+
+        # the quantized layers only take float32 inputs
+        inference_amp = self.config.get("inference_amp", False)
+        if inference_amp:
+            fprint("The quantized model runs in float32, disable inference_amp.")
+            self.config.inference_amp = False
+
+        accuracy_delta = cache["accuracy_delta"] if cache else None
+        if check_file and accuracy_delta is None:
+            accuracy_delta = self._quantize_accuracy_delta(float_model, check_file)
+        if cache_path:
+            torch.save(
+                {
+                    "state_dict": self.model.state_dict(),
+                    "check_file": check_file,
+                    "accuracy_delta": accuracy_delta,
+                },
+                cache_path,
+            )
+        if accuracy_delta is not None and accuracy_delta > tolerance:
+            fprint(
+                "The accuracy of the quantized model drops by {:.4f} (> {}), run in float32.".format(
+                    accuracy_delta, tolerance
+                )
+            )
+            self.model = float_model
+            self.config.inference_amp = inference_amp
+
+    def _quantize_cache_path(self, mode):
+        if not self.config.get("quantize_cache", False) or not isinstance(
+            self.checkpoint, str
+        ):
+            return None
+        checkpoint_dir = (
+            self.checkpoint
+            if os.path.isdir(self.checkpoint)
+            else os.path.dirname(self.checkpoint)
+        )
+        # N.B., the suffix should not be found as a checkpoint file, e.g., *.state_dict or *.model
+        cache_path = os.path.join(checkpoint_dir, "{}.quantized".format(mode))
+        if os.path.exists(cache_path) and any(
+            os.path.getmtime(os.path.join(checkpoint_dir, f))
+            > os.path.getmtime(cache_path)
+            for f in os.listdir(checkpoint_dir)
+        ):
+            # the checkpoint has been changed since the quantized model was cached
+            os.remove(cache_path)
+        return cache_path
+
+    def _quantize_accuracy_delta(self, float_model, check_file):
+        """
+        Compare the predictions of the quantized model (self.model) with the float model on the check file.
+
+        :param float_model: the float model
+        :param check_file: the held-out inference file
+        :return: the accuracy drop, or the rate of the disagreed predictions if the file has no reference labels
+        """
+        quantized_model = self.model
+        self.model = float_model
+        float_results = self.batch_predict(
+            target_file=check_file, print_result=False, save_result=False
+        )
+        self.model = quantized_model
+        quantized_results = self.batch_predict(
+            target_file=check_file, print_result=False, save_result=False
+        )
+
+        float_accuracy = _reference_accuracy(float_results)
+        quantized_accuracy = _reference_accuracy(quantized_results)
+        if float_accuracy is not None and quantized_accuracy is not None:
+            fprint(
+                "The accuracy on {}: {:.4f} (float32), {:.4f} (quantized)".format(
+                    check_file, float_accuracy, quantized_accuracy
+                )
+            )
+            return float_accuracy - quantized_accuracy
+
+        disagreement = sum(
+            _predicted_labels(f) != _predicted_labels(q)
+            for f, q in zip(float_results, quantized_results)
+        ) / max(len(float_results), 1)
+        fprint(
+            "The predictions of the quantized model disagree on {:.4f} of {}".format(
+                disagreement, check_file
+            )
+        )
+        return disagreement
+
     def batch_predict(self, **kwargs):
         """
         Predict from a file of sentences.
@@ -130,6 +330,143 @@ class InferenceModel:
             "Please implement _run_prediction() in your subclass!"
         )
 
+    def _cached_predict(self, samples, predict_fn, merge_fn=None, **kwargs):
+        """
+        Predict the samples through the result cache, which is enabled by the inference_cache_size option
+        (and inference_cache_path for a sqlite database), see InferenceResultCache. The duplicated samples
+        are only predicted once, and only the samples missing in the cache are passed to predict_fn.
+        The results are cached per sample and merged by merge_fn after they are collected, so the outputs
+        do not depend on which samples are already cached.
+        The invalid samples ignored by predict_fn have no result, and are not cached.
+        N.B., the cached results are not printed or counted in the metrics by predict_fn.
+
+        :param samples: the input samples, e.g., texts
+        :param predict_fn: the function predicting a list of samples, which returns a result for each sample
+        :param merge_fn: the function merging the results of the samples, e.g., the results of the aspects of a text
+        :param kwargs: the prediction options which change the results
+        :return: the results of the samples, in the order of the samples
+        """
+        if self.result_cache is None:
+            results = predict_fn(samples)
+            return merge_fn(results) if merge_fn else results
+
+        keys = [self.result_cache.key(sample, **kwargs) for sample in samples]
+        results = {}
+        misses = OrderedDict()
+        for key, sample in zip(keys, samples):
+            if key in results or key in misses:
+                continue
+            result = self.result_cache.get(key)
+            if result is None:
+                misses[key] = sample
+            else:
+                results[key] = result
+
+        if misses:
+            miss_results = predict_fn(list(misses.values()))
+            if len(miss_results) != len(misses):
+                # some invalid samples are ignored by predict_fn (e.g., ignore_error=True), so the samples
+                # are predicted one by one to align the results, the invalid samples get a None placeholder
+                miss_results = []
+                for sample in misses.values():
+                    try:
+                        sample_results = predict_fn([sample])
+                    except Exception:
+                        # e.g., no valid sample is left to build the inputs
+                        sample_results = []
+                    miss_results.append(sample_results[0] if sample_results else None)
+            for key, result in zip(misses, miss_results):
+                # the placeholders are not cached, so the invalid samples are checked again at the next call
+                if result is not None:
+                    self.result_cache.put(key, result)
+                results[key] = result
+        # the hits also update the database (their last used time), which is locked until the commit
+        self.result_cache.commit()
+
+        # the duplicated samples get their own copies of the result
+        returned = set()
+        outputs = []
+        for key in keys:
+            if results[key] is None:
+                # the invalid samples have no result, as if they are predicted without the cache
+                continue
+            outputs.append(
+                copy.deepcopy(results[key]) if key in returned else results[key]
+            )
+            returned.add(key)
+        return merge_fn(outputs) if merge_fn else outputs
+
+    def _cached_batch_predict(
+        self,
+        target_file,
+        predict_fn,
+        save_path=None,
+        merge_fn=None,
+        parse_fn=None,
+        **kwargs
+    ):
+        """
+        Predict the lines of the inference files through the result cache, see _cached_predict().
+
+        :param target_file: the inference files
+        :param predict_fn: the function predicting a list of samples, which returns a result for each sample
+        :param save_path: the path to save the results, the results are not saved if it is None
+        :param merge_fn: the function merging the results of the samples, see _cached_predict()
+        :param parse_fn: the function splitting a line into samples, e.g., a sample per aspect,
+            the lines are the samples if it is None
+        :param kwargs: the prediction options which change the results
+        :return: the results of the samples
+        """
+        samples = []
+        for line in load_dataset_from_file(target_file, config=self.config):
+            if line:
+                samples.extend(parse_fn(line) if parse_fn else [line])
+        results = self._cached_predict(samples, predict_fn, merge_fn, **kwargs)
+        if save_path:
+            with open(save_path, "w", encoding="utf8") as fout:
+                json.dump(str(results), fout, ensure_ascii=False)
+                fprint("inference result saved in: {}".format(save_path))
+        return results
+
+    def _forward(self, *args, **kwargs):
+        """
+        Run the forward pass of the model, in mixed precision (bfloat16 on CPU, float16 on CUDA)
+        if the inference_amp option is set. The batch is padded to a bucket size if the model is compiled. The first mixed precision outputs are checked against float32,
+        the mixed precision is disabled if they differ by more than amp_parity_tolerance (default 0.05)
+        relative to the scale of the outputs. The floating outputs are always returned in float32.
+
+        :param args: the positional arguments of the model
+        :param kwargs: the keyword arguments of the model
+        :return: the outputs of the model
+        """
+        if is_compiled_model(self.model):
+            # pad the batch to a few sizes, so that the compiled model is not recompiled for each batch size
+            (args, kwargs), batch_size = pad_batch_to_bucket((args, kwargs))
+            return unpad_batch(self._run_model(*args, **kwargs), batch_size)
+        return self._run_model(*args, **kwargs)
+
+    def _run_model(self, *args, **kwargs):
+        if not self.config.get("inference_amp", False):
+            return self.model(*args, **kwargs)
+
+        with autocast(self.config.device):
+            outputs = _to_float(self.model(*args, **kwargs))
+
+        if not self._amp_checked:
+            self._amp_checked = True
+            reference = self.model(*args, **kwargs)
+            tolerance = self.config.get("amp_parity_tolerance", 0.05)
+            error = _relative_error(outputs, reference)
+            if error > tolerance:
+                fprint(
+                    "The mixed precision outputs differ from float32 by {:.4f} (> {}), disable inference_amp.".format(
+                        error, tolerance
+                    )
+                )
+                self.config.inference_amp = False
+                return reference
+        return outputs
+
     def destroy(self):
         """
         Deletes the model from memory and empties the CUDA cache.
@@ -137,3 +474,63 @@ class InferenceModel:
         del self.model
         cuda.empty_cache()
         time.sleep(3)
+
+
+def _to_float(outputs):
+    if isinstance(outputs, torch.Tensor):
+        return outputs.float() if outputs.is_floating_point() else outputs
+    if isinstance(outputs, dict):
+        return outputs.__class__((k, _to_float(v)) for k, v in outputs.items())
+    if isinstance(outputs, (list, tuple)):
+        return outputs.__class__(_to_float(v) for v in outputs)
+    return outputs
+
+
+def _relative_error(outputs, reference):
+    if isinstance(outputs, torch.Tensor):
+        if not outputs.is_floating_point() or not outputs.numel():
+            return 0.0
+        scale = max(reference.float().abs().max().item(), 1.0)
+        return (outputs.float() - reference.float()).abs().max().item() / scale
+    if isinstance(outputs, dict):
+        return max(
+            [_relative_error(v, reference[k]) for k, v in outputs.items()], default=0.0
+        )
+    if isinstance(outputs, (list, tuple)):
+        return max(
+            [_relative_error(v, r) for v, r in zip(outputs, reference)], default=0.0
+        )
+    return 0.0
+
+
+def _predicted_labels(result):
+    # the result without the scores (e.g., confidence, probs), whose floating values are dropped
+    if isinstance(result, dict):
+        return {k: _predicted_labels(v) for k, v in result.items()}
+    if isinstance(result, (list, tuple)):
+        return [_predicted_labels(v) for v in result]
+    if result is None or isinstance(result, (str, int)):
+        return result
+    return None
+
+
+def _reference_accuracy(results):
+    # the accuracy of the results with respect to the reference labels, i.e., the ref_check fields
+    checks = []
+
+    def collect(result):
+        if isinstance(result, dict):
+            for k, v in result.items():
+                if k == "ref_check":
+                    checks.extend(v if isinstance(v, list) else [v])
+                else:
+                    collect(v)
+        elif isinstance(result, (list, tuple)):
+            for v in result:
+                collect(v)
+
+    collect(results)
+    checks = [c for c in checks if c in ("Correct", "Wrong")]
+    if not checks:
+        return None
+    return checks.count("Correct") / len(checks)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# file: result_cache.py
+# time: 19/10/2026 19:10
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+# the config options which change the prediction results, which are a part of the cache keys
+RESULT_CACHE_CONFIG_KEYS = [
+    "model_name",
+    "pretrained_bert",
+    "max_seq_len",
+    "inference_amp",
+    "quantize",
+]
+
+
+class InferenceResultCache:
+    """
+    A bounded LRU cache of the prediction results, keyed by the hash of the normalized input, the identity of
+    the checkpoint and the config options which change the results. The results are kept in memory, or in a
+    sqlite database if a path is given, so that they are shared by the processes and kept across the runs.
+    """
+
+    def __init__(self, max_size, identity, path=None):
+        """
+        :param max_size: the maximum number of the cached results
+        :param identity: the identity of the predictor (checkpoint and config), which is a part of the cache keys
+        :param path: the path of the sqlite database, the results are kept in memory if it is None
+        """
+        self.max_size = max_size
+        self.identity = identity
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        self._db = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result BLOB, last_used REAL)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls, config, checkpoint):
+        """
+        Build the cache from the inference_cache_size (0 or None disables the cache) and
+        inference_cache_path (the sqlite database, optional) options.
+
+        :param config: the config of the predictor
+        :param checkpoint: the checkpoint of the predictor
+        :return: the cache, or None if the cache is disabled
+        """
+        max_size = config.get("inference_cache_size", None)
+        if not max_size:
+            return None
+        if isinstance(checkpoint, str):
+            # the checkpoint may be retrained in place, so its files are a part of the identity
+            identity = [checkpoint] + _checkpoint_fingerprint(
+                checkpoint, config.get("inference_cache_path", None)
+            )
+        else:
+            # the models passed from a trainer are only identified in this process
+            identity = ["{}:{}".format(os.getpid(), id(checkpoint))]
+        for key in RESULT_CACHE_CONFIG_KEYS:
+            identity.append("{}={}".format(key, config.get(key, None)))
+        return cls(
+            max_size, "|".join(identity), config.get("inference_cache_path", None)
+        )
+
+    def key(self, sample, **kwargs):
+        """
+        Get the cache key of an input.
+
+        :param sample: the input, e.g., a text
+        :param kwargs: the prediction options which change the result
+        :return: the cache key
+        """
+        if isinstance(sample, str):
+            sample = " ".join(sample.split())
+        options = ",".join("{}={}".format(k, kwargs[k]) for k in sorted(kwargs))
+        return sha256(
+            "{}\n{}\n{}".format(self.identity, options, sample).encode("utf8")
+        ).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT result FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE results SET last_used = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+                    self.hits += 1
+                    return pickle.loads(row[0])
+            elif key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(self._results[key])
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        # the results are pickled, so that the cached results are not changed by the callers
+        value = pickle.dumps(result)
+        with self._lock:
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                    (key, value, time.time()),
+                )
+            else:
+                self._results[key] = value
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_size:
+                    self._results.popitem(last=False)
+
+    def commit(self):
+        """
+        Evict the least recently used results over max_size from the database, and commit the changes.
+        """
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def __len__(self):
+        if self._db is not None:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return len(self._results)
+
+
+def _checkpoint_fingerprint(checkpoint, cache_path=None):
+    """
+    Get the modification times and sizes of the files of a checkpoint, like _quantize_cache_path() of the predictor.
+
+    :param checkpoint: the checkpoint path, i.e., the checkpoint directory or a file in it
+    :param cache_path: the path of the sqlite database, which is excluded if it is in the checkpoint directory
+    :return: a list of "file:mtime:size"
+    """
+    checkpoint_dir = (
+        checkpoint if os.path.isdir(checkpoint) else os.path.dirname(checkpoint)
+    )
+    if not checkpoint_dir or not os.path.isdir(checkpoint_dir):
+        return []
+    cache_path = os.path.abspath(cache_path) if cache_path else None
+    fingerprint = []
+    for root, dirs, files in os.walk(checkpoint_dir):
+        dirs.sort()
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            # the caches written by the predictors, e.g., the quantized model and the result database
+            if file.endswith(".quantized") or (
+                cache_path and os.path.abspath(path).startswith(cache_path)
+            ):
+                continue
+            stat = os.stat(path)
+            fingerprint.append(
+                "{}:{}:{}".format(
+                    os.path.relpath(path, checkpoint_dir),
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                )
+            )
+    return fingerprint
@@ -23,6 +23,7 @@ class ImbalancedDatasetSampler(torch.utils.data.sampler.Sampler):
         indices: a list of indices
         num_samples: number of samples to draw
         callback_get_label: a callback-like function which takes two arguments - dataset and index
+        sample_weights: the over-sampling weights of the elements, which scale the class-balanced weights
     """
 
     def __init__(
@@ -32,6 +33,7 @@ class ImbalancedDatasetSampler(torch.utils.data.sampler.Sampler):
         indices: list = None,
         num_samples: int = None,
         callback_get_label: Callable = None,
+        sample_weights: list = None,
     ):
         # if indices is not provided, all elements in the dataset will be considered
         self.indices = list(range(len(dataset))) if indices is None else indices
@@ -55,6 +57,8 @@ class ImbalancedDatasetSampler(torch.utils.data.sampler.Sampler):
         weights = 1.0 / label_to_count[df["label"]]
 
         self.weights = torch.DoubleTensor(weights.to_list())
+        if sample_weights is not None:
+            self.weights *= torch.DoubleTensor(sample_weights)
 
     def _get_labels(self, dataset):
         if self.callback_get_label:
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# file: parallel_runner.py
+# time: 19/10/2026 15:02
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+
+from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
+from pyabsa.utils.logger.logger import get_logger
+from pyabsa.utils.pyabsa_utils import set_device, fprint
+
+
+def get_worker_slots(config, num_workers):
+    """
+    Assign a device and a CPU set to each worker. The devices are taken from config.parallel_devices,
+    e.g., ["cuda:0", "cuda:1"], which defaults to all the visible CUDA devices, or CPU if there is none.
+    The available CPUs are evenly split among the workers.
+
+    :param config: the training configuration
+    :param num_workers: the number of worker processes
+    :return: a list of (device, cpu_set) for each worker
+    """
+    devices = config.get("parallel_devices", None)
+    if not devices:
+        devices = ["cuda:{}".format(i) for i in range(torch.cuda.device_count())] or [
+            DeviceTypeOption.CPU
+        ]
+    elif isinstance(devices, str):
+        devices = [devices]
+
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = []
+    cpus_per_worker = len(cpus) // num_workers
+
+    slots = []
+    for i in range(num_workers):
+        cpu_set = cpus[i * cpus_per_worker : (i + 1) * cpus_per_worker]
+        slots.append((devices[i % len(devices)], cpu_set))
+    return slots
+
+
+def _train_worker(
+    training_instructor, config, seed, slots, dataset_ready=None, overwrite_cache=None
+):
+    slot = slots.get()
+    try:
+        config.seed = seed
+        if overwrite_cache is not None:
+            config.overwrite_cache = overwrite_cache
+        device, cpu_set = slot
+        if cpu_set:
+            os.sched_setaffinity(0, cpu_set)
+            torch.set_num_threads(len(cpu_set))
+        set_device(config, device)
+        config.logger = get_logger(
+            os.getcwd(), log_name=config.model_name, log_type="trainer"
+        )
+        # only collect the metrics of this run, which are merged in the parent process
+        config.MV.metrics = OrderedDict()
+        config.MV.trial2unit = {}
+
+        instructor = training_instructor(config)
+        if dataset_ready is not None:
+            dataset_ready.set()
+        model_path = instructor.run()
+
+        while config.logger.handlers:
+            config.logger.removeHandler(config.logger.handlers[0])
+
+        metrics = {
+            metric_name: {trial: list(values) for trial, values in trials.items()}
+            for metric_name, trials in config.MV.metrics.items()
+        }
+        return model_path, metrics, dict(config.MV.trial2unit)
+    finally:
+        slots.put(slot)
+
+
+def run_parallel(training_instructor, config, seeds, num_workers):
+    """
+    Run the training of each seed in an independent worker process, the k-fold training of a seed
+    runs in the same worker. The folds are not parallelized, as they are not independent runs: the folds
+    share the model and optimizer states (e.g., a fold of APC continues from the best checkpoint of the
+    previous fold), so running them in separate workers would change the results and the selected checkpoint.
+    Each worker is pinned to a device and a CPU set (see get_worker_slots()).
+    The first run builds the dataset cache, the other runs start after it and share the cache,
+    which is memory-mapped. The metrics of the runs are merged into config.MV in the order of the seeds.
+    N.B., the worker processes are spawned, so the training script should be guarded by
+    `if __name__ == "__main__":`.
+
+    :param training_instructor: the training instructor class
+    :param config: the training configuration
+    :param seeds: the random seeds to run
+    :param num_workers: the number of worker processes
+    :return: the list of the checkpoint paths of the runs
+    """
+    num_workers = min(num_workers, len(seeds))
+    fprint(
+        "Training {} seeds in {} parallel worker processes".format(
+            len(seeds), num_workers
+        )
+    )
+    context = multiprocessing.get_context("spawn")
+    manager = context.Manager()
+    slots = manager.Queue()
+    for slot in get_worker_slots(config, num_workers):
+        slots.put(slot)
+    dataset_ready = manager.Event()
+
+    # the logger is recreated in each worker, and the metrics are sent back to the parent process
+    logger, MV = config.logger, config.MV
+    config.logger = None
+    try:
+        with ProcessPoolExecutor(num_workers, mp_context=context) as executor:
+            futures = [
+                executor.submit(
+                    _train_worker,
+                    training_instructor,
+                    config,
+                    seeds[0],
+                    slots,
+                    dataset_ready,
+                )
+            ]
+            # wait for the first run to build (and cache) the dataset
+            while not dataset_ready.wait(1) and not futures[0].done():
+                pass
+
+            for seed in seeds[1:]:
+                futures.append(
+                    executor.submit(
+                        _train_worker,
+                        training_instructor,
+                        config,
+                        seed,
+                        slots,
+                        overwrite_cache=False,
+                    )
+                )
+
+            model_path = []
+            for future in futures:
+                path, metrics, trial2unit = future.result()
+                model_path.append(path)
+                for metric_name, trials in metrics.items():
+                    for trial, values in trials.items():
+                        for value in values:
+                            MV.log_metric(
+                                trial, metric_name, value, trial2unit.get(metric_name)
+                            )
+    finally:
+        config.logger = logger
+        manager.shutdown()
+
+    return model_path
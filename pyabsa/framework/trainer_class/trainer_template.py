@@ -23,6 +23,7 @@ from ..configuration_class.config_verification import config_check
 from ..dataset_class.dataset_dict_class import DatasetDict
 
 from ..flag_class.flag_template import DeviceTypeOption, ModelSaveOption
+from .parallel_runner import run_parallel
 from ..configuration_class.configuration_template import ConfigManager
 
 from pyabsa.utils.logger.logger import get_logger
@@ -235,15 +236,31 @@ class Trainer:
         # trainer using all random seeds
         model_path = []
         model = None
-        for i, s in enumerate(seeds):
-            self.config.seed = s
+        parallel_workers = self.config.get("parallel_workers", 1)
+        if parallel_workers > 1 and self.config.get("cross_validate_fold", -1) > 1:
+            # the folds are not independent runs, see run_parallel()
+            fprint(
+                "Only the seeds are trained in parallel, the folds of a seed are trained sequentially in its worker."
+            )
+        if parallel_workers > 1 and len(seeds) > 1:
             if self.config.checkpoint_save_mode:
-                model_path.append(self.training_instructor(self.config).run())
+                model_path = run_parallel(
+                    self.training_instructor, self.config, seeds, parallel_workers
+                )
             else:
-                # always return the last trained model if you don't save trained model
-                model = self.inference_model_class(
-                    checkpoint=self.training_instructor(self.config).run()
+                fprint(
+                    "Parallel training needs to save checkpoint, train the seeds sequentially."
                 )
+        if not model_path:
+            for i, s in enumerate(seeds):
+                self.config.seed = s
+                if self.config.checkpoint_save_mode:
+                    model_path.append(self.training_instructor(self.config).run())
+                else:
+                    # always return the last trained model if you don't save trained model
+                    model = self.inference_model_class(
+                        checkpoint=self.training_instructor(self.config).run()
+                    )
         self.config.seed = seeds
 
         # remove logger
@@ -6,7 +6,6 @@
 # Copyright (C) 2021. All Rights Reserved.
 import math
 
-import numpy as np
 import torch
 import torch.nn as nn
 
@@ -224,7 +223,11 @@ class SelfAttention(nn.Module):
         :param inputs: Input tensor of size (batch_size, seq_len, hidden_size)
         :return: Encoded tensor of the same size as the input tensor
         """
-        zero_vec = np.zeros((inputs.size(0), 1, 1, self.config.max_seq_len))
-        zero_tensor = torch.tensor(zero_vec).float().to(inputs.device)
+        # built from the input shape, so that the traced (or exported) model is not fixed to a batch size
+        zero_tensor = torch.zeros(
+            (inputs.size(0), 1, 1, inputs.size(1)),
+            dtype=torch.float,
+            device=inputs.device,
+        )
         SA_out = self.SA(inputs, zero_tensor)
         return SA_out
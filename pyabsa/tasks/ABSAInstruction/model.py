@@ -80,78 +80,109 @@ class T5Generator:
         """
         Predict the output from the model.
         """
+        ensemble_result = self.batch_predict([text], **kwargs)[0]
+        print(ensemble_result)
+        return ensemble_result
+
+    def batch_predict(self, texts, batch_size=16, **kwargs):
+        """
+        Predict the quadruples of a list of texts. The aspects of all the texts are generated first,
+        then the polarity, opinion and category prompts, which only depend on the aspects,
+        are generated together as one stacked batch.
+
+        :param texts: the list of texts
+        :param batch_size: the number of texts in a generation batch
+        :param kwargs: the keyword arguments of model.generate()
+        :return: the list of the results, in the order of the texts
+        """
         ate_instructor = ATEInstruction()
         apc_instructor = APCInstruction()
         op_instructor = OpinionInstruction()
         cat_instructor = CategoryInstruction()
-        result = {
-            "text": text,
-        }
 
         # ATE inference
-        inputs = self.tokenizer(
-            ate_instructor.prepare_input(text), truncation=True, return_tensors="pt"
-        ).to(self.device)
-        ate_outputs = self.model.generate(**inputs, **kwargs)
-        ate_outputs = self.tokenizer.batch_decode(
-            ate_outputs, skip_special_tokens=True
-        )[0]
-        result["aspect"] = [asp.strip() for asp in ate_outputs.split("|")]
-
-        # APC inference
-        inputs = self.tokenizer(
-            apc_instructor.prepare_input(text, ate_outputs),
-            truncation=True,
-            return_tensors="pt",
-        ).to(self.device)
-        apc_outputs = self.model.generate(**inputs, **kwargs)
-        apc_outputs = self.tokenizer.batch_decode(
-            apc_outputs, skip_special_tokens=True
-        )[0]
-        result["polarity"] = [sent.strip() for sent in apc_outputs.split("|")]
-
-        # Opinion inference
-        inputs = self.tokenizer(
-            op_instructor.prepare_input(text, ate_outputs),
-            truncation=True,
-            return_tensors="pt",
-        ).to(self.device)
-        op_outputs = self.model.generate(**inputs, **kwargs)
-        op_outputs = self.tokenizer.batch_decode(op_outputs, skip_special_tokens=True)[
-            0
-        ]
-        result["opinion"] = [op.strip() for op in op_outputs.split("|")]
-
-        # Category inference
-        inputs = self.tokenizer(
-            cat_instructor.prepare_input(text, ate_outputs),
-            truncation=True,
-            return_tensors="pt",
-        ).to(self.device)
-        cat_outputs = self.model.generate(**inputs, **kwargs)
-        cat_outputs = self.tokenizer.batch_decode(
-            cat_outputs, skip_special_tokens=True
-        )[0]
-        result["category"] = [cat.strip() for cat in cat_outputs.split("|")]
-        ensemble_result = {
-            "text": text,
-            "Quadruples": [
+        ate_outputs = self._generate(
+            [ate_instructor.prepare_input(text) for text in texts], batch_size, **kwargs
+        )
+
+        # APC, opinion and category inference
+        dependent_inputs = []
+        for text, ate_output in zip(texts, ate_outputs):
+            dependent_inputs.append(apc_instructor.prepare_input(text, ate_output))
+            dependent_inputs.append(op_instructor.prepare_input(text, ate_output))
+            dependent_inputs.append(cat_instructor.prepare_input(text, ate_output))
+        dependent_outputs = self._generate(dependent_inputs, batch_size * 3, **kwargs)
+
+        ensemble_results = []
+        for i, text in enumerate(texts):
+            apc_outputs, op_outputs, cat_outputs = dependent_outputs[3 * i : 3 * i + 3]
+            result = {
+                "aspect": [asp.strip() for asp in ate_outputs[i].split("|")],
+                "polarity": [sent.strip() for sent in apc_outputs.split("|")],
+                "opinion": [op.strip() for op in op_outputs.split("|")],
+                "category": [cat.strip() for cat in cat_outputs.split("|")],
+            }
+            ensemble_results.append(
                 {
-                    "aspect": asp,
-                    "polarity": sent.partition(":")[2],
-                    "opinion": op.partition(":")[2],
-                    "category": cat.partition(":")[2],
+                    "text": text,
+                    "Quadruples": [
+                        {
+                            "aspect": asp,
+                            "polarity": sent.partition(":")[2],
+                            "opinion": op.partition(":")[2],
+                            "category": cat.partition(":")[2],
+                        }
+                        for asp, sent, op, cat in zip(
+                            result["aspect"],
+                            result["polarity"],
+                            result["opinion"],
+                            result["category"],
+                        )
+                    ],
                 }
-                for asp, sent, op, cat in zip(
-                    result["aspect"],
-                    result["polarity"],
-                    result["opinion"],
-                    result["category"],
-                )
-            ],
+            )
+        return ensemble_results
+
+    def _collate(self, input_ids):
+        """
+        Pad a list of input ids and build the attention mask of the padded batch.
+        """
+        input_ids = [torch.tensor(ids) for ids in input_ids]
+        return {
+            "input_ids": pad_sequence(
+                input_ids,
+                batch_first=True,
+                padding_value=self.tokenizer.pad_token_id,
+            ),
+            "attention_mask": pad_sequence(
+                [torch.ones_like(ids) for ids in input_ids],
+                batch_first=True,
+                padding_value=0,
+            ),
         }
-        print(ensemble_result)
-        return ensemble_result
+
+    def _generate(self, inputs, batch_size, **kwargs):
+        """
+        Generate the outputs of a list of input texts. The inputs are sorted by length before batching
+        to reduce the padding, and the outputs are returned in the order of the inputs.
+        """
+        input_ids = self.tokenizer(inputs, truncation=True)["input_ids"]
+        order = sorted(
+            range(len(inputs)), key=lambda i: len(input_ids[i]), reverse=True
+        )
+        outputs = [None] * len(inputs)
+        for start in range(0, len(order), batch_size):
+            batch_index = order[start : start + batch_size]
+            batch = self._collate([input_ids[i] for i in batch_index])
+            output_ids = self.model.generate(
+                **{k: v.to(self.device) for k, v in batch.items()}, **kwargs
+            )
+            output_texts = self.tokenizer.batch_decode(
+                output_ids, skip_special_tokens=True
+            )
+            for i, output_text in zip(batch_index, output_texts):
+                outputs[i] = output_text
+        return outputs
 
     def get_labels(
         self,
@@ -168,31 +199,34 @@ class T5Generator:
             print("Prediction from checkpoint")
 
             def collate_fn(batch):
-                input_ids = [torch.tensor(example["input_ids"]) for example in batch]
-                input_ids = pad_sequence(
-                    input_ids,
-                    batch_first=True,
-                    padding_value=self.tokenizer.pad_token_id,
-                )
-                return input_ids
-
+                return self._collate([example["input_ids"] for example in batch])
+
+            # sort the samples by length to reduce the padding, the predictions are restored to the sample order
+            dataset = tokenized_dataset[sample_set]
+            order = sorted(
+                range(len(dataset)),
+                key=lambda i: len(dataset[i]["input_ids"]),
+                reverse=True,
+            )
             dataloader = DataLoader(
-                tokenized_dataset[sample_set],
+                dataset,
                 batch_size=batch_size,
+                sampler=order,
                 collate_fn=collate_fn,
             )
-            predicted_output = []
+            predicted_output = [None] * len(dataset)
             self.model.to(self.device)
             print("Model loaded to: ", self.device)
 
+            index = iter(order)
             for batch in tqdm(dataloader):
-                batch = batch.to(self.device)
-                output_ids = self.model.generate(batch)
+                batch = {k: v.to(self.device) for k, v in batch.items()}
+                output_ids = self.model.generate(**batch)
                 output_texts = self.tokenizer.batch_decode(
                     output_ids, skip_special_tokens=True
                 )
                 for output_text in output_texts:
-                    predicted_output.append(output_text)
+                    predicted_output[next(index)] = output_text
         else:
             print("Prediction from trainer")
             output_ids = predictor.predict(
@@ -15,6 +15,11 @@ from pyabsa.framework.dataset_class.dataset_template import PyABSADataset
 from pyabsa.utils.pyabsa_utils import validate_absa_example, fprint
 from .classic_glove_apc_utils import build_sentiment_window
 from .dependency_graph import dependency_adj_matrix, configure_spacy_model
+from .feature_registry import (
+    build_classic_apc_features,
+    build_cluster_ids,
+    requires_dependency_graph,
+)
 from ..__lcf__.data_utils_for_inference import ABSAInferenceDataset
 
 
@@ -23,7 +28,9 @@ class GloVeABSAInferenceDataset(ABSAInferenceDataset):
         self.config = config
         self.tokenizer = tokenizer
 
-        configure_spacy_model(config)
+        # the dependency graphs are only parsed for the models using them
+        if requires_dependency_graph(config):
+            configure_spacy_model(config)
 
         self.data = []
 
@@ -68,93 +75,24 @@ class GloVeABSAInferenceDataset(ABSAInferenceDataset):
                 ):
                     continue
 
-                text_indices = self.tokenizer.text_to_sequence(
-                    text_left + " " + aspect + " " + text_right
+                features = build_classic_apc_features(
+                    {
+                        "text_left": text_left,
+                        "aspect": aspect,
+                        "text_right": text_right,
+                        "reverse_right": True,
+                        "dependency_graph": lambda: dependency_adj_matrix(text),
+                    },
+                    self.config,
+                    self.tokenizer,
                 )
-                context_indices = self.tokenizer.text_to_sequence(
-                    text_left + " " + text_right
-                )
-                left_indices = self.tokenizer.text_to_sequence(text_left)
-                left_with_aspect_indices = self.tokenizer.text_to_sequence(
-                    text_left + " " + aspect
-                )
-                right_indices = self.tokenizer.text_to_sequence(
-                    text_right, reverse=True
-                )
-                right_with_aspect_indices = self.tokenizer.text_to_sequence(
-                    aspect + " " + text_right, reverse=True
-                )
-                aspect_indices = self.tokenizer.text_to_sequence(aspect)
-                left_len = np.count_nonzero(left_indices)
-                aspect_len = np.count_nonzero(aspect_indices)
-                aspect_boundary = np.asarray(
-                    [
-                        left_len,
-                        min(left_len + aspect_len - 1, self.config.max_seq_len - 1),
-                    ]
-                )
-
-                idx2graph = dependency_adj_matrix(
-                    text_left + " " + aspect + " " + text_right
-                )
-                dependency_graph = np.pad(
-                    idx2graph,
-                    (
-                        (0, max(0, self.config.max_seq_len - idx2graph.shape[0])),
-                        (0, max(0, self.config.max_seq_len - idx2graph.shape[0])),
-                    ),
-                    "constant",
-                )
-                dependency_graph = dependency_graph[
-                    :, range(0, self.config.max_seq_len)
-                ]
-                dependency_graph = dependency_graph[
-                    range(0, self.config.max_seq_len), :
-                ]
-
-                aspect_begin = np.count_nonzero(
-                    self.tokenizer.text_to_sequence(text_left)
-                )
-                aspect_position = set(
-                    range(aspect_begin, aspect_begin + np.count_nonzero(aspect_indices))
-                )
-                if len(aspect_position) < 1:
+                if len(features["aspect_position"]) < 1:
                     raise RuntimeError("Invalid Input: {}".format(text))
                 validate_absa_example(text, aspect, polarity, config=self.config)
 
                 data = {
                     "ex_id": ex_id,
-                    "text_indices": text_indices
-                    if "text_indices" in self.config.inputs_cols
-                    else 0,
-                    "context_indices": context_indices
-                    if "context_indices" in self.config.inputs_cols
-                    else 0,
-                    "left_indices": left_indices
-                    if "left_indices" in self.config.inputs_cols
-                    else 0,
-                    "left_with_aspect_indices": left_with_aspect_indices
-                    if "left_with_aspect_indices" in self.config.inputs_cols
-                    else 0,
-                    "right_indices": right_indices
-                    if "right_indices" in self.config.inputs_cols
-                    else 0,
-                    "right_with_aspect_indices": right_with_aspect_indices
-                    if "right_with_aspect_indices" in self.config.inputs_cols
-                    else 0,
-                    "aspect_indices": aspect_indices
-                    if "aspect_indices" in self.config.inputs_cols
-                    else 0,
-                    "aspect_len": aspect_len
-                    if "aspect_len" in self.config.inputs_cols
-                    else 0,
-                    "aspect_boundary": aspect_boundary
-                    if "aspect_boundary" in self.config.inputs_cols
-                    else 0,
-                    "aspect_position": np.array(list(aspect_position)),
-                    "dependency_graph": dependency_graph
-                    if "dependency_graph" in self.config.inputs_cols
-                    else 0,
+                    **features,
                     "text_raw": text,
                     "aspect": aspect,
                     "polarity": polarity,
@@ -183,20 +121,14 @@ class GloVeABSAInferenceDataset(ABSAInferenceDataset):
             input_demands=self.config.inputs_cols,
         )
         for data in all_data:
-            cluster_ids = []
-            for pad_idx in range(self.config.max_seq_len):
-                if pad_idx in data["cluster_ids"]:
-                    cluster_ids.append(
-                        self.config.label_to_index.get(
-                            self.config.index_to_label.get(data["polarity"], "N.A."),
-                            LabelPaddingOption.SENTIMENT_PADDING,
-                        )
-                    )
-                else:
-                    cluster_ids.append(-100)
-                    # cluster_ids.append(3)
-
-            data["cluster_ids"] = np.asarray(cluster_ids, dtype=np.int64)
+            data["cluster_ids"] = build_cluster_ids(
+                data["cluster_ids"],
+                self.config.label_to_index.get(
+                    self.config.index_to_label.get(data["polarity"], "N.A."),
+                    LabelPaddingOption.SENTIMENT_PADDING,
+                ),
+                self.config.max_seq_len,
+            )
             data["side_ex_ids"] = np.array(0)
             data["aspect_position"] = np.array(0)
         self.data = all_data
@@ -18,6 +18,11 @@ from pyabsa.framework.dataset_class.dataset_template import PyABSADataset
 from pyabsa.utils.file_utils.file_utils import load_dataset_from_file
 from .classic_glove_apc_utils import build_sentiment_window
 from .dependency_graph import prepare_dependency_graph, configure_spacy_model
+from .feature_registry import (
+    build_classic_apc_features,
+    build_cluster_ids,
+    requires_dependency_graph,
+)
 from pyabsa.utils.pyabsa_utils import (
     check_and_fix_labels,
     validate_absa_example,
@@ -30,7 +35,23 @@ class GloVeABSADataset(PyABSADataset):
         pass
 
     def load_data_from_file(self, dataset_file, **kwargs):
-        configure_spacy_model(self.config)
+        # the dependency graphs are only parsed for the models using them
+        idx2graph = {}
+        if requires_dependency_graph(self.config):
+            configure_spacy_model(self.config)
+            dep_cache_path = os.path.join(
+                os.getcwd(), "run/{}/dependency_cache/".format(self.config.dataset_name)
+            )
+            if not os.path.exists(dep_cache_path):
+                os.makedirs(dep_cache_path)
+            graph_path = prepare_dependency_graph(
+                self.config.dataset_file[self.dataset_type],
+                dep_cache_path,
+                self.config.max_seq_len,
+                self.config,
+            )
+            with open(graph_path, "rb") as fin:
+                idx2graph = pickle.load(fin)
 
         lines = load_dataset_from_file(
             self.config.dataset_file[self.dataset_type], config=self.config
@@ -38,20 +59,6 @@ class GloVeABSADataset(PyABSADataset):
         all_data = []
         label_set = set()
 
-        dep_cache_path = os.path.join(
-            os.getcwd(), "run/{}/dependency_cache/".format(self.config.dataset_name)
-        )
-        if not os.path.exists(dep_cache_path):
-            os.makedirs(dep_cache_path)
-        graph_path = prepare_dependency_graph(
-            self.config.dataset_file[self.dataset_type],
-            dep_cache_path,
-            self.config.max_seq_len,
-            self.config,
-        )
-        fin = open(graph_path, "rb")
-        idx2graph = pickle.load(fin)
-
         ex_id = 0
 
         if len(lines) % 3 != 0 or len(lines) == 0:
@@ -78,76 +85,19 @@ class GloVeABSADataset(PyABSADataset):
             if validate_absa_example(text_raw, aspect, polarity, self.config):
                 continue
 
-            text_indices = self.tokenizer.text_to_sequence(
-                text_left + " " + aspect + " " + text_right
-            )
-            context_indices = self.tokenizer.text_to_sequence(
-                text_left + " " + text_right
-            )
-            left_indices = self.tokenizer.text_to_sequence(text_left)
-            left_with_aspect_indices = self.tokenizer.text_to_sequence(
-                text_left + " " + aspect
+            features = build_classic_apc_features(
+                {
+                    "text_left": text_left,
+                    "aspect": aspect,
+                    "text_right": text_right,
+                    "dependency_graph": lambda: idx2graph[text_raw],
+                },
+                self.config,
+                self.tokenizer,
             )
-            right_indices = self.tokenizer.text_to_sequence(text_right)
-            right_with_aspect_indices = self.tokenizer.text_to_sequence(
-                aspect + " " + text_right
-            )
-            aspect_indices = self.tokenizer.text_to_sequence(aspect)
-            left_len = np.count_nonzero(left_indices)
-            aspect_len = np.count_nonzero(aspect_indices)
-            aspect_boundary = np.asarray(
-                [left_len, min(left_len + aspect_len - 1, self.config.max_seq_len)]
-            )
-
-            dependency_graph = np.pad(
-                idx2graph[text_raw],
-                (
-                    (0, max(0, self.config.max_seq_len - idx2graph[text_raw].shape[0])),
-                    (0, max(0, self.config.max_seq_len - idx2graph[text_raw].shape[0])),
-                ),
-                "constant",
-            )
-            dependency_graph = dependency_graph[:, range(0, self.config.max_seq_len)]
-            dependency_graph = dependency_graph[range(0, self.config.max_seq_len), :]
-
-            aspect_begin = np.count_nonzero(self.tokenizer.text_to_sequence(text_left))
-            aspect_position = set(
-                range(aspect_begin, aspect_begin + np.count_nonzero(aspect_indices))
-            )
-            if len(aspect_position) < 1:
+            if len(features["aspect_position"]) < 1:
                 raise RuntimeError("Invalid Input: {}".format(text_raw))
-            data = {
-                "ex_id": ex_id,
-                "text_indices": text_indices
-                if "text_indices" in self.config.inputs_cols
-                else 0,
-                "context_indices": context_indices
-                if "context_indices" in self.config.inputs_cols
-                else 0,
-                "left_indices": left_indices
-                if "left_indices" in self.config.inputs_cols
-                else 0,
-                "left_with_aspect_indices": left_with_aspect_indices
-                if "left_with_aspect_indices" in self.config.inputs_cols
-                else 0,
-                "right_indices": right_indices
-                if "right_indices" in self.config.inputs_cols
-                else 0,
-                "right_with_aspect_indices": right_with_aspect_indices
-                if "right_with_aspect_indices" in self.config.inputs_cols
-                else 0,
-                "aspect_indices": aspect_indices
-                if "aspect_indices" in self.config.inputs_cols
-                else 0,
-                "aspect_boundary": aspect_boundary
-                if "aspect_boundary" in self.config.inputs_cols
-                else 0,
-                "aspect_position": aspect_position,
-                "dependency_graph": dependency_graph
-                if "dependency_graph" in self.config.inputs_cols
-                else 0,
-                "polarity": polarity,
-            }
+            data = {"ex_id": ex_id, **features, "polarity": polarity}
             ex_id += 1
 
             label_set.add(polarity)
@@ -164,15 +114,9 @@ class GloVeABSADataset(PyABSADataset):
             input_demands=self.config.inputs_cols,
         )
         for data in all_data:
-            cluster_ids = []
-            for pad_idx in range(self.config.max_seq_len):
-                if pad_idx in data["cluster_ids"]:
-                    cluster_ids.append(data["polarity"])
-                else:
-                    cluster_ids.append(-100)
-                    # cluster_ids.append(3)
-
-            data["cluster_ids"] = np.asarray(cluster_ids, dtype=np.int64)
+            data["cluster_ids"] = build_cluster_ids(
+                data["cluster_ids"], data["polarity"], self.config.max_seq_len
+            )
             data["side_ex_ids"] = np.array(0)
             data["aspect_position"] = np.array(0)
         self.data = all_data
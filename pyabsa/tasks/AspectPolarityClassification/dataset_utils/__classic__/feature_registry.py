@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# file: feature_registry.py
+# time: 19/10/2026 18:05
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+import numpy as np
+
+
+class FeatureRegistry:
+    """
+    Map the feature names to the functions that build them, and the features they depend on.
+    A dataset only builds the features demanded by the model (i.e., config.inputs_cols) and their dependencies,
+    e.g., the dependency graphs are not parsed and padded for the models which do not use them.
+    A feature builder is called as builder(sample, features, config, tokenizer), where sample is the dict of the
+    raw example (text_left, aspect, text_right, ...) and features is the dict of the features built so far.
+    """
+
+    def __init__(self):
+        self.builders = {}
+        self.dependencies = {}
+
+    def register(self, name, depends_on=()):
+        """
+        Register a feature builder.
+
+        :param name: the name of the feature
+        :param depends_on: the names of the features used by the builder
+        """
+
+        def decorator(builder):
+            self.builders[name] = builder
+            self.dependencies[name] = tuple(depends_on)
+            return builder
+
+        return decorator
+
+    def resolve(self, column):
+        """
+        Resolve an input column to the feature it is built from, the columns of the side aspects,
+        e.g., left_aspect_indices and left_left_indices, are copied from the features of the neighbour examples.
+
+        :param column: the input column
+        :return: the feature name, or None if the column is not built by the registry
+        """
+        if column in self.builders:
+            return column
+        for side in ["left_", "right_"]:
+            if column.startswith(side):
+                return self.resolve(column[len(side) :])
+        return None
+
+    def closure(self, columns):
+        """
+        Get the features needed to build the columns, in the order they should be built.
+
+        :param columns: the demanded columns, e.g., config.inputs_cols
+        :return: the ordered list of the feature names
+        """
+        ordered = []
+
+        def visit(name):
+            if name in ordered:
+                return
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            ordered.append(name)
+
+        for column in columns:
+            name = self.resolve(column)
+            if name is not None:
+                visit(name)
+        return ordered
+
+    def build(self, names, sample, config, tokenizer):
+        """
+        Build the features of an example.
+
+        :param names: the ordered feature names returned by closure()
+        :param sample: the raw example
+        :param config: the config
+        :param tokenizer: the tokenizer
+        :return: the dict of the built features
+        """
+        features = {}
+        for name in names:
+            features[name] = self.builders[name](sample, features, config, tokenizer)
+        return features
+
+
+classic_apc_features = FeatureRegistry()
+
+# the input columns of the classic APC models, which are set to 0 if the model does not use them
+CLASSIC_APC_INPUT_COLUMNS = [
+    "text_indices",
+    "context_indices",
+    "left_indices",
+    "left_with_aspect_indices",
+    "right_indices",
+    "right_with_aspect_indices",
+    "aspect_indices",
+    "aspect_len",
+    "aspect_boundary",
+    "dependency_graph",
+]
+
+
+@classic_apc_features.register("text_indices")
+def build_text_indices(sample, features, config, tokenizer):
+    return tokenizer.text_to_sequence(
+        sample["text_left"] + " " + sample["aspect"] + " " + sample["text_right"]
+    )
+
+
+@classic_apc_features.register("context_indices")
+def build_context_indices(sample, features, config, tokenizer):
+    return tokenizer.text_to_sequence(sample["text_left"] + " " + sample["text_right"])
+
+
+@classic_apc_features.register("left_indices")
+def build_left_indices(sample, features, config, tokenizer):
+    return tokenizer.text_to_sequence(sample["text_left"])
+
+
+@classic_apc_features.register("left_with_aspect_indices")
+def build_left_with_aspect_indices(sample, features, config, tokenizer):
+    return tokenizer.text_to_sequence(sample["text_left"] + " " + sample["aspect"])
+
+
+@classic_apc_features.register("right_indices")
+def build_right_indices(sample, features, config, tokenizer):
+    if sample.get("reverse_right", False):
+        return tokenizer.text_to_sequence(sample["text_right"], reverse=True)
+    return tokenizer.text_to_sequence(sample["text_right"])
+
+
+@classic_apc_features.register("right_with_aspect_indices")
+def build_right_with_aspect_indices(sample, features, config, tokenizer):
+    text = sample["aspect"] + " " + sample["text_right"]
+    if sample.get("reverse_right", False):
+        return tokenizer.text_to_sequence(text, reverse=True)
+    return tokenizer.text_to_sequence(text)
+
+
+@classic_apc_features.register("aspect_indices")
+def build_aspect_indices(sample, features, config, tokenizer):
+    return tokenizer.text_to_sequence(sample["aspect"])
+
+
+@classic_apc_features.register("left_len", depends_on=["left_indices"])
+def build_left_len(sample, features, config, tokenizer):
+    return np.count_nonzero(features["left_indices"])
+
+
+@classic_apc_features.register("aspect_len", depends_on=["aspect_indices"])
+def build_aspect_len(sample, features, config, tokenizer):
+    return np.count_nonzero(features["aspect_indices"])
+
+
+@classic_apc_features.register("aspect_boundary", depends_on=["left_len", "aspect_len"])
+def build_aspect_boundary(sample, features, config, tokenizer):
+    left_len, aspect_len = features["left_len"], features["aspect_len"]
+    return np.asarray(
+        [left_len, min(left_len + aspect_len - 1, config.max_seq_len - 1)]
+    )
+
+
+@classic_apc_features.register("aspect_position", depends_on=["left_len", "aspect_len"])
+def build_aspect_position(sample, features, config, tokenizer):
+    aspect_begin = features["left_len"]
+    return set(range(aspect_begin, aspect_begin + features["aspect_len"]))
+
+
+@classic_apc_features.register("dependency_graph")
+def build_dependency_graph(sample, features, config, tokenizer):
+    graph = sample["dependency_graph"]()
+    size = min(graph.shape[0], config.max_seq_len)
+    dependency_graph = np.zeros((config.max_seq_len, config.max_seq_len), graph.dtype)
+    dependency_graph[:size, :size] = graph[:size, :size]
+    return dependency_graph
+
+
+def build_classic_apc_features(sample, config, tokenizer):
+    """
+    Build the features demanded by config.inputs_cols (and the aspect position used by the sentiment window).
+
+    :param sample: the raw example, i.e., text_left, aspect, text_right, and dependency_graph,
+        a function returning the dependency graph of the text, which is only called if the model uses the graph
+    :param config: the config
+    :param tokenizer: the tokenizer
+    :return: the dict of the features, the input columns not used by the model are set to 0
+    """
+    names = classic_apc_features.closure(list(config.inputs_cols) + ["aspect_position"])
+    features = classic_apc_features.build(names, sample, config, tokenizer)
+    demands = {classic_apc_features.resolve(col) for col in config.inputs_cols}
+    inputs = {
+        col: features[col] if col in demands else 0 for col in CLASSIC_APC_INPUT_COLUMNS
+    }
+    inputs["aspect_position"] = features["aspect_position"]
+    return inputs
+
+
+def requires_dependency_graph(config):
+    return "dependency_graph" in classic_apc_features.closure(config.inputs_cols)
+
+
+def build_cluster_ids(cluster_ids, label, max_seq_len):
+    """
+    Build the cluster ids vector, i.e., the label at the aspect positions of the sentiment window and -100 elsewhere.
+
+    :param cluster_ids: the aspect positions of the sentiment window
+    :param label: the label of the aspect positions
+    :param max_seq_len: the length of the vector
+    """
+    vec = np.full(max_seq_len, -100, dtype=np.int64)
+    positions = np.fromiter(cluster_ids, dtype=np.int64, count=len(cluster_ids))
+    vec[positions[(positions >= 0) & (positions < max_seq_len)]] = label
+    return vec
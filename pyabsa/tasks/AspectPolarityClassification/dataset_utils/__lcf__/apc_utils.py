@@ -8,6 +8,8 @@
 import os
 
 import copy
+from functools import lru_cache
+
 import networkx as nx
 import numpy as np
 import spacy
@@ -401,27 +403,27 @@ def configure_spacy_model(config):
                     config.spacy_model
                 )
             )
+    parse_dependency_graph.cache_clear()
     return nlp
 
 
-def calculate_dep_dist(sentence, aspect):
-    terms = [a.lower() for a in aspect.split()]
+@lru_cache(maxsize=1024)
+def parse_dependency_graph(sentence):
+    """
+    Parse the sentence and load spacy's dependency tree into a networkx graph. The parses are cached,
+    as a sentence is usually parsed once for each of its aspects.
+
+    :param sentence: the sentence to parse
+    :return: the texts and the lower-cased texts of the tokens, and the dependency graph
+    """
     try:
         doc = nlp(sentence)
     except NameError as e:
         raise RuntimeError(
             "Fail to load nlp model, maybe you forget to download en_core_web_sm"
         )
-    # Load spacy's dependency tree into a networkx graph
     edges = []
-    cnt = 0
-    term_ids = [0] * len(terms)
     for token in doc:
-        # Record the position of aspect terms
-        if cnt < len(terms) and token.lower_ == terms[cnt]:
-            term_ids[cnt] = token.i
-            cnt += 1
-
         for child in token.children:
             edges.append(
                 (
@@ -429,25 +431,48 @@ def calculate_dep_dist(sentence, aspect):
                     "{}_{}".format(child.lower_, child.i),
                 )
             )
+    return (
+        tuple(token.text for token in doc),
+        tuple(token.lower_ for token in doc),
+        nx.Graph(edges),
+    )
+
 
-    graph = nx.Graph(edges)
+def calculate_dep_dist(sentence, aspect):
+    terms = [a.lower() for a in aspect.split()]
+    doc_text, doc_lower, graph = parse_dependency_graph(sentence)
+    cnt = 0
+    term_ids = [0] * len(terms)
+    for i, lower in enumerate(doc_lower):
+        # Record the position of aspect terms
+        if cnt < len(terms) and lower == terms[cnt]:
+            term_ids[cnt] = i
+            cnt += 1
 
-    dist = [0.0] * len(doc)
-    text = [""] * len(doc)
+    # the distances from each aspect term to all the tokens, instead of a search for each pair of token and term
+    term_dists = []
+    for term_id, term in zip(term_ids, terms):
+        target = "{}_{}".format(term, term_id)
+        if target in graph:
+            term_dists.append(nx.single_source_shortest_path_length(graph, target))
+        else:
+            term_dists.append({})
+
+    dist = [0.0] * len(doc_text)
+    text = [""] * len(doc_text)
     max_dist_temp = []
-    for i, word in enumerate(doc):
-        source = "{}_{}".format(word.lower_, word.i)
+    for i, lower in enumerate(doc_lower):
+        source = "{}_{}".format(lower, i)
         sum = 0
         flag = 1
-        for term_id, term in zip(term_ids, terms):
-            target = "{}_{}".format(term, term_id)
-            try:
-                sum += nx.shortest_path_length(graph, source=source, target=target)
-            except:
-                sum += len(doc)  # No connection between source and target
+        for term_dist in term_dists:
+            if source in term_dist:
+                sum += term_dist[source]
+            else:
+                sum += len(doc_text)  # No connection between source and target
                 flag = 0
         dist[i] = sum / len(terms)
-        text[i] = word.text
+        text[i] = doc_text[i]
         if flag == 1:
             max_dist_temp.append(dist[i])
     max_dist = 0
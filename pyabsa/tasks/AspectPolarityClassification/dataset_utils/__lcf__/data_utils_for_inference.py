@@ -268,12 +268,14 @@ class ABSAInferenceDataset(Dataset):
                         )
                     )
 
-        all_data = build_sentiment_window(
-            all_data,
-            self.tokenizer,
-            self.config.similarity_threshold,
-            input_demands=self.config.inputs_cols,
-        )
+        if all_data:
+            # all the samples may be invalid and ignored
+            all_data = build_sentiment_window(
+                all_data,
+                self.tokenizer,
+                self.config.similarity_threshold,
+                input_demands=self.config.inputs_cols,
+            )
         for data in all_data:
             cluster_ids = []
             for pad_idx in range(self.config.max_seq_len):
@@ -6,11 +6,9 @@
 # Copyright (C) 2021. All Rights Reserved.
 
 import os
-import shutil
 import time
 
 import numpy
-import numpy as np
 import pandas
 import torch
 import torch.nn as nn
@@ -21,7 +19,6 @@ from tqdm import tqdm
 from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
 from pyabsa.framework.instructor_class.instructor_template import BaseTrainingInstructor
 from ..instructor.ensembler import APCEnsembler
-from pyabsa.utils.file_utils.file_utils import save_model
 from pyabsa.utils.pyabsa_utils import init_optimizer, fprint
 
 
@@ -43,6 +40,23 @@ class APCTrainingInstructor(BaseTrainingInstructor):
 
         self._init_misc()
 
+    def _compute_loss(self, sample_batched, criterion):
+        inputs = {
+            col: sample_batched[col].to(self.config.device)
+            for col in self.config.inputs_cols
+        }
+        outputs = self.model(inputs)
+        targets = sample_batched["polarity"].to(self.config.device)
+
+        if isinstance(outputs, dict) and "loss" in outputs and outputs["loss"] != 0:
+            loss = outputs["loss"]
+        else:
+            loss = criterion(outputs["logits"], targets)
+
+        if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
+            loss = loss.mean()
+        return loss
+
     def _train_and_evaluate(self, criterion):
         global_step = 0
         max_fold_acc = 0
@@ -56,7 +70,7 @@ class APCTrainingInstructor(BaseTrainingInstructor):
         self.config.metrics_of_this_checkpoint = {"acc": 0, "f1": 0}
         self.config.max_test_metrics = {"max_apc_test_acc": 0, "max_apc_test_f1": 0}
 
-        losses = []
+        self.loss_tracker.reset()
 
         Total_params = 0
         Trainable_params = 0
@@ -109,57 +123,26 @@ class APCTrainingInstructor(BaseTrainingInstructor):
             iterator = tqdm(self.train_dataloaders[0], desc=description)
             for i_batch, sample_batched in enumerate(iterator):
                 global_step += 1
-                # switch model to trainer mode, clear gradient accumulators
+                # switch model to trainer mode
                 self.model.train()
-                self.optimizer.zero_grad()
-                inputs = {
-                    col: sample_batched[col].to(self.config.device)
-                    for col in self.config.inputs_cols
-                }
-
-                if self.config.use_amp:
-                    with torch.cuda.amp.autocast():
-                        outputs = self.model(inputs)
-                else:
-                    outputs = self.model(inputs)
-
-                targets = sample_batched["polarity"].to(self.config.device)
-
-                if (
-                    isinstance(outputs, dict)
-                    and "loss" in outputs
-                    and outputs["loss"] != 0
-                ):
-                    loss = outputs["loss"]
-                else:
-                    loss = criterion(outputs["logits"], targets)
-
-                if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
-                    loss = loss.mean()
-
-                losses.append(loss.item())
-
-                if self.config.use_amp and self.scaler:
-                    self.scaler.scale(loss).backward()
-                    self.scaler.step(self.optimizer)
-                    self.scaler.update()
-                else:
-                    loss.backward()
-                    self.optimizer.step()
-
-                if self.config.warmup_step >= 0:
-                    with self.warmup_scheduler.dampening():
-                        self.lr_scheduler.step()
+                loss = self._train_step(
+                    sample_batched, criterion, i_batch + 1 == len(iterator)
+                )
+                self.loss_tracker.track(loss)
 
                 # evaluate if test set is available
-                if global_step % self.config.log_step == 0:
+                if self.eval_scheduler.should_evaluate(
+                    global_step, i_batch + 1 == len(iterator)
+                ):
                     if self.test_dataloader and epoch >= self.config.evaluate_begin:
                         if len(self.valid_dataloaders) > 1:
-                            test_acc, f1 = self._evaluate_acc_f1(
-                                self.valid_dataloaders[0]
+                            test_acc, f1 = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.valid_dataloaders[0]
                             )
                         else:
-                            test_acc, f1 = self._evaluate_acc_f1(self.test_dataloader)
+                            test_acc, f1 = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.test_dataloader
+                            )
                         self.config.metrics_of_this_checkpoint["acc"] = test_acc
                         self.config.metrics_of_this_checkpoint["f1"] = f1
 
@@ -175,13 +158,6 @@ class APCTrainingInstructor(BaseTrainingInstructor):
                             if self.config.model_path_to_save:
                                 if not os.path.exists(self.config.model_path_to_save):
                                     os.makedirs(self.config.model_path_to_save)
-                                if save_path:
-                                    try:
-                                        shutil.rmtree(save_path)
-                                        # logger.info('Remove sub-optimal trained model:', save_path)
-                                    except:
-                                        # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                        pass
                                 save_path = "{0}/{1}_{2}_acc_{3}_f1_{4}/".format(
                                     self.config.model_path_to_save,
                                     self.config.model_name,
@@ -200,8 +176,8 @@ class APCTrainingInstructor(BaseTrainingInstructor):
                                 if f1 > self.config.max_test_metrics["max_apc_test_f1"]:
                                     self.config.max_test_metrics["max_apc_test_f1"] = f1
 
-                                save_model(
-                                    self.config, self.model, self.tokenizer, save_path
+                                self.checkpoint_writer.save(
+                                    self.model, self.tokenizer, save_path
                                 )
 
                         postfix = "Dev Acc:{:>.2f}(max:{:>.2f}) Dev F1:{:>.2f}(max:{:>.2f})".format(
@@ -212,26 +188,20 @@ class APCTrainingInstructor(BaseTrainingInstructor):
                         )
                         iterator.set_postfix_str(postfix)
                     elif self.config.save_mode and epoch >= self.config.evaluate_begin:
-                        save_model(
-                            self.config,
+                        self.checkpoint_writer.save(
                             self.model,
                             self.tokenizer,
-                            save_path + "_{}/".format(loss.item()),
+                            save_path + "_{}/".format(self.loss_tracker.last_loss),
+                            prune=False,
                         )
                 else:
-                    if self.config.get("loss_display", "smooth") == "smooth":
-                        description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                            epoch, round(np.nanmean(losses), 4)
-                        )
-                    else:
-                        description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                            epoch, round(loss.item(), 4)
-                        )
-                iterator.set_description(description)
-                iterator.refresh()
+                    description = self.loss_tracker.description(epoch)
+                self.loss_tracker.refresh(iterator, description)
             if patience == 0:
                 break
 
+        self.checkpoint_writer.close()
+
         if not self.valid_dataloaders:
             self.config.MV.log_metric(
                 self.config.model_name
@@ -283,7 +253,7 @@ class APCTrainingInstructor(BaseTrainingInstructor):
         # self.logger.info(self.config.MV.short_summary(no_print=True))
 
         rolling_intv = 5
-        df = pandas.DataFrame(losses)
+        df = pandas.DataFrame(self.loss_tracker.losses)
         losses = list(
             numpy.hstack(df.rolling(rolling_intv, min_periods=1).mean().values)
         )
@@ -313,7 +283,7 @@ class APCTrainingInstructor(BaseTrainingInstructor):
         save_path_k_fold = ""
         max_fold_acc_k_fold = 0
 
-        losses = []
+        self.loss_tracker.reset()
 
         self.config.metrics_of_this_checkpoint = {"acc": 0, "f1": 0}
         self.config.max_test_metrics = {"max_apc_test_acc": 0, "max_apc_test_f1": 0}
@@ -356,58 +326,29 @@ class APCTrainingInstructor(BaseTrainingInstructor):
                 self.config.model_name,
                 self.config.dataset_name,
             )
+            # the best checkpoints of each fold are retained, see CheckpointWriter.reset()
+            self.checkpoint_writer.reset()
             for epoch in range(self.config.num_epoch):
                 patience -= 1
                 description = "Epoch:{} | Loss:{}".format(epoch, 0)
                 iterator = tqdm(train_dataloader, desc=description)
                 for i_batch, sample_batched in enumerate(iterator):
                     global_step += 1
-                    # switch model to train mode, clear gradient accumulators
+                    # switch model to train mode
                     self.model.train()
-                    self.optimizer.zero_grad()
-                    inputs = {
-                        col: sample_batched[col].to(self.config.device)
-                        for col in self.config.inputs_cols
-                    }
-
-                    if self.config.use_amp:
-                        with torch.cuda.amp.autocast():
-                            outputs = self.model(inputs)
-                    else:
-                        outputs = self.model(inputs)
-
-                    targets = sample_batched["polarity"].to(self.config.device)
-
-                    if (
-                        isinstance(outputs, dict)
-                        and "loss" in outputs
-                        and outputs["loss"] != 0
-                    ):
-                        loss = outputs["loss"]
-                    else:
-                        loss = criterion(outputs["logits"], targets)
-
-                    if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
-                        loss = loss.mean()
-
-                    losses.append(loss.item())
-
-                    if self.config.use_amp and self.scaler:
-                        self.scaler.scale(loss).backward()
-                        self.scaler.step(self.optimizer)
-                        self.scaler.update()
-                    else:
-                        loss.backward()
-                        self.optimizer.step()
-
-                    if self.config.warmup_step >= 0:
-                        with self.warmup_scheduler.dampening():
-                            self.lr_scheduler.step()
+                    loss = self._train_step(
+                        sample_batched, criterion, i_batch + 1 == len(iterator)
+                    )
+                    self.loss_tracker.track(loss)
 
                     # evaluate if test set is available
-                    if global_step % self.config.log_step == 0:
+                    if self.eval_scheduler.should_evaluate(
+                        global_step, i_batch + 1 == len(iterator)
+                    ):
                         if self.test_dataloader and epoch >= self.config.evaluate_begin:
-                            test_acc, f1 = self._evaluate_acc_f1(valid_dataloader)
+                            test_acc, f1 = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, valid_dataloader
+                            )
 
                             self.config.metrics_of_this_checkpoint["acc"] = test_acc
                             self.config.metrics_of_this_checkpoint["f1"] = f1
@@ -426,13 +367,6 @@ class APCTrainingInstructor(BaseTrainingInstructor):
                                         self.config.model_path_to_save
                                     ):
                                         os.makedirs(self.config.model_path_to_save)
-                                    if save_path:
-                                        try:
-                                            shutil.rmtree(save_path)
-                                            # logger.info('Remove sub-optimal trained model:', save_path)
-                                        except:
-                                            # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                            pass
                                     save_path = "{0}/{1}_{2}_acc_{3}_f1_{4}/".format(
                                         self.config.model_path_to_save,
                                         self.config.model_name,
@@ -460,11 +394,8 @@ class APCTrainingInstructor(BaseTrainingInstructor):
                                             "max_apc_test_f1"
                                         ] = f1
 
-                                    save_model(
-                                        self.config,
-                                        self.model,
-                                        self.tokenizer,
-                                        save_path,
+                                    self.checkpoint_writer.save(
+                                        self.model, self.tokenizer, save_path
                                     )
 
                             postfix = "Dev Acc:{:>.2f}(max:{:>.2f}) Dev F1:{:>.2f}(max:{:>.2f})".format(
@@ -478,26 +409,20 @@ class APCTrainingInstructor(BaseTrainingInstructor):
                             self.config.save_mode
                             and epoch >= self.config.evaluate_begin
                         ):
-                            save_model(
-                                self.config,
+                            self.checkpoint_writer.save(
                                 self.model,
                                 self.tokenizer,
-                                save_path + "_{}/".format(loss.item()),
+                                save_path + "_{}/".format(self.loss_tracker.last_loss),
+                                prune=False,
                             )
                     else:
-                        if self.config.get("loss_display", "smooth") == "smooth":
-                            description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                                epoch, round(np.nanmean(losses), 4)
-                            )
-                        else:
-                            description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                                epoch, round(loss.item(), 4)
-                            )
+                        description = self.loss_tracker.description(epoch)
 
-                    iterator.set_description(description)
-                    iterator.refresh()
+                    self.loss_tracker.refresh(iterator, description)
                 if patience == 0:
                     break
+
+            self.checkpoint_writer.close()
             max_fold_acc, max_fold_f1 = self._evaluate_acc_f1(self.test_dataloader)
             if max_fold_acc > max_fold_acc_k_fold:
                 save_path_k_fold = save_path
@@ -547,7 +472,7 @@ class APCTrainingInstructor(BaseTrainingInstructor):
         self._reload_model_state_dict(save_path_k_fold)
 
         rolling_intv = 5
-        df = pandas.DataFrame(losses)
+        df = pandas.DataFrame(self.loss_tracker.losses)
         losses = list(
             numpy.hstack(df.rolling(rolling_intv, min_periods=1).mean().values)
         )
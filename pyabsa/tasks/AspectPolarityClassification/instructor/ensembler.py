@@ -6,9 +6,6 @@
 # Copyright (C) 2021. All Rights Reserved.
 import copy
 import os
-import pickle
-import re
-from hashlib import sha256
 
 from findfile import find_cwd_dir
 from termcolor import colored
@@ -19,6 +16,12 @@ import torch
 from torch.utils.data import DataLoader, RandomSampler, SequentialSampler
 from transformers import AutoTokenizer, AutoModel
 
+from pyabsa.framework.instructor_class.instructor_template import (
+    get_dataset_cache_path,
+    load_dataset_cache,
+)
+from pyabsa.utils.file_utils.file_utils import save_mmap_cache
+from pyabsa.utils.model_utils.model_utils import build_pretrained_skeleton
 from pyabsa.utils.pyabsa_utils import fprint
 from ..models.__classic__ import GloVeAPCModelList
 from ..models.__lcf__ import APCModelList
@@ -33,6 +36,20 @@ from pyabsa.framework.tokenizer_class.tokenizer_class import (
 )
 
 
+def build_pretrained_model(config, **kwargs):
+    """
+    Load the pretrained model, or only build its skeleton if skeleton=True,
+    i.e., the weights will be loaded from a checkpoint afterwards.
+    """
+    if kwargs.get("skeleton", False):
+        return build_pretrained_skeleton(config, offline=kwargs.get("offline", False))
+    if kwargs.get("offline", False):
+        return AutoModel.from_pretrained(
+            find_cwd_dir(config.pretrained_bert.split("/")[-1])
+        )
+    return AutoModel.from_pretrained(config.pretrained_bert)
+
+
 def model_pool_check(models):
     set1 = set([model for model in models if hasattr(APCModelList, model.__name__)])
     set2 = set(
@@ -71,23 +88,7 @@ class APCEnsembler(nn.Module):
         self.valid_dataloader = None
 
         for i in range(len(models)):
-            config_str = re.sub(
-                r"<.*?>",
-                "",
-                str(
-                    sorted(
-                        [
-                            str(self.config.args[k])
-                            for k in self.config.args
-                            if k != "seed"
-                        ]
-                    )
-                ),
-            )
-            hash_tag = sha256(config_str.encode()).hexdigest()
-            cache_path = "{}.{}.dataset.{}.cache".format(
-                self.config.model_name, self.config.dataset_name, hash_tag
-            )
+            cache_path = get_dataset_cache_path(self.config)
 
             if (
                 load_dataset
@@ -95,15 +96,14 @@ class APCEnsembler(nn.Module):
                 and not self.config.overwrite_cache
             ):
                 fprint(colored("Loading dataset cache: {}".format(cache_path), "green"))
-                with open(cache_path, mode="rb") as f_cache:
-                    (
-                        self.train_set,
-                        self.valid_set,
-                        self.test_set,
-                        self.config,
-                    ) = pickle.load(f_cache)
-                    config.update(self.config)
-                    config.args_call_count.update(self.config.args_call_count)
+                (
+                    self.train_set,
+                    self.valid_set,
+                    self.test_set,
+                    self.config,
+                ) = load_dataset_cache(cache_path, self.config)
+                config.update(self.config)
+                config.args_call_count.update(self.config.args_call_count)
             if hasattr(APCModelList, models[i].__name__):
                 try:
                     if kwargs.get("offline", False):
@@ -112,9 +112,7 @@ class APCEnsembler(nn.Module):
                             do_lower_case="uncased" in self.config.pretrained_bert,
                         )
                         self.bert = (
-                            AutoModel.from_pretrained(
-                                find_cwd_dir(self.config.pretrained_bert.split("/")[-1])
-                            )
+                            build_pretrained_model(self.config, **kwargs)
                             if not self.bert
                             else self.bert
                         )  # share the underlying bert between models
@@ -124,7 +122,7 @@ class APCEnsembler(nn.Module):
                             do_lower_case="uncased" in self.config.pretrained_bert,
                         )
                         self.bert = (
-                            AutoModel.from_pretrained(self.config.pretrained_bert)
+                            build_pretrained_model(self.config, **kwargs)
                             if not self.bert
                             else self.bert
                         )
@@ -161,7 +159,7 @@ class APCEnsembler(nn.Module):
                     else self.tokenizer
                 )
                 self.bert = (
-                    AutoModel.from_pretrained(self.config.pretrained_bert)
+                    build_pretrained_model(self.config, **kwargs)
                     if not self.bert
                     else self.bert
                 )
@@ -262,7 +260,8 @@ class APCEnsembler(nn.Module):
                 self.config.embedding_matrix = self.embedding_matrix
 
             if (
-                self.config.cache_dataset
+                load_dataset
+                and self.config.cache_dataset
                 and not os.path.exists(cache_path)
                 and not self.config.overwrite_cache
             ):
@@ -272,11 +271,10 @@ class APCEnsembler(nn.Module):
                         "red",
                     )
                 )
-                with open(cache_path, mode="wb") as f_cache:
-                    pickle.dump(
-                        (self.train_set, self.valid_set, self.test_set, self.config),
-                        f_cache,
-                    )
+                save_mmap_cache(
+                    (self.train_set, self.valid_set, self.test_set, self.config),
+                    cache_path,
+                )
 
             if load_dataset:
                 train_sampler = RandomSampler(self.train_set)
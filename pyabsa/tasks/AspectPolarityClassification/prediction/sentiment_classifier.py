@@ -27,10 +27,15 @@ from ..models.__lcf__ import APCModelList
 from ..dataset_utils.__classic__.data_utils_for_inference import (
     GloVeABSAInferenceDataset,
 )
-from ..dataset_utils.__lcf__.data_utils_for_inference import ABSAInferenceDataset
+from ..dataset_utils.__lcf__.data_utils_for_inference import (
+    ABSAInferenceDataset,
+    parse_sample,
+)
 from ..dataset_utils.__plm__.data_utils_for_inference import BERTABSAInferenceDataset
 from ..instructor.ensembler import APCEnsembler
 from pyabsa.utils.data_utils.dataset_manager import detect_infer_dataset
+from pyabsa.utils.model_utils.model_export import ExportedModel
+from pyabsa.utils.model_utils.model_utils import build_model_from_state_dict
 from pyabsa.utils.pyabsa_utils import set_device, print_args, fprint, rprint
 
 
@@ -78,15 +83,18 @@ class SentimentClassifier(InferenceModel):
                     self.config.auto_device = kwargs.get("auto_device", True)
                     set_device(self.config, self.config.auto_device)
 
-                if state_dict_path or model_path:
+                if kwargs.get("exported_model", None):
+                    # the model exported by export(), the model code is not run
+                    self.model = ExportedModel(
+                        kwargs["exported_model"], self.config.device
+                    )
+                elif state_dict_path or model_path:
                     if state_dict_path:
-                        self.model = APCEnsembler(
-                            self.config, load_dataset=False, **kwargs
-                        )
-                        self.model.load_state_dict(
-                            torch.load(
-                                state_dict_path, map_location=DeviceTypeOption.CPU
-                            )
+                        self.model = build_model_from_state_dict(
+                            lambda: APCEnsembler(
+                                self.config, load_dataset=False, skeleton=True, **kwargs
+                            ),
+                            state_dict_path,
                         )
                     elif model_path:
                         self.model = torch.load(
@@ -207,6 +215,21 @@ class SentimentClassifier(InferenceModel):
         if not target_file:
             raise FileNotFoundError("Can not find inference datasets!")
 
+        if self.result_cache is not None:
+            # the lines are split into a sample per aspect, whose results are cached and merged after they are collected
+            results = self._cached_batch_predict(
+                target_file,
+                lambda samples: self._predict_samples(
+                    samples, False, ignore_error, parsed=True, merge_results=False
+                ),
+                save_path if save_result else None,
+                self.merge_results,
+                parse_sample,
+            )
+            if print_result:
+                self._print_results(results)
+            return results
+
         self.dataset.prepare_infer_dataset(target_file, ignore_error=ignore_error)
         self.infer_dataloader = DataLoader(
             dataset=self.dataset,
@@ -233,17 +256,63 @@ class SentimentClassifier(InferenceModel):
         param: kwargs: other parameters.
         """
         self.config.eval_batch_size = kwargs.get("eval_batch_size", 32)
+        if not text:
+            raise RuntimeError("Please specify your datasets path!")
+        if self.result_cache is None:
+            results = self._predict_samples(
+                [text] if isinstance(text, str) else text,
+                print_result,
+                ignore_error,
+                **kwargs
+            )
+            return results[0] if isinstance(text, str) else results
+
+        # the texts are split into a sample per aspect, whose results are cached and merged after they are collected
+        merge_results = kwargs.pop("merge_results", True)
+        samples = []
+        for sample in [text] if isinstance(text, str) else text:
+            samples.extend(parse_sample(sample))
+        results = self._cached_predict(
+            samples,
+            lambda samples: self._predict_samples(
+                samples, False, ignore_error, parsed=True, merge_results=False, **kwargs
+            ),
+            self.merge_results if merge_results else None,
+        )
+        if print_result:
+            self._print_results(
+                results if merge_results else self.merge_results(results)
+            )
+        return results[0] if isinstance(text, str) else results
+
+    def _predict_samples(
+        self, samples, print_result=True, ignore_error=True, parsed=False, **kwargs
+    ):
+        """
+        Predict a list of samples, i.e., the input texts or the lines of the inference files.
+        The samples are already split into a sample per aspect by parse_sample() if parsed is True.
+        """
         self.infer_dataloader = DataLoader(
             dataset=self.dataset, batch_size=self.config.eval_batch_size, shuffle=False
         )
-        if text:
-            self.dataset.prepare_infer_sample(text, ignore_error=ignore_error)
-        else:
-            raise RuntimeError("Please specify your datasets path!")
-        if isinstance(text, str):
-            return self._run_prediction(print_result=print_result, **kwargs)[0]
+        if parsed:
+            self.dataset.process_data(samples, ignore_error=ignore_error)
         else:
-            return self._run_prediction(print_result=print_result, **kwargs)
+            self.dataset.prepare_infer_sample(samples, ignore_error=ignore_error)
+        return self._run_prediction(print_result=print_result, **kwargs)
+
+    def _export_inputs(self, samples=None):
+        if not samples:
+            samples = [
+                "The [B-ASP]food[E-ASP] is good but the service is bad .",
+                "The food is good but the [B-ASP]service[E-ASP] is bad .",
+            ]
+        self.dataset.prepare_infer_sample(samples, ignore_error=False)
+        sample = next(
+            iter(DataLoader(self.dataset, batch_size=len(self.dataset), shuffle=False))
+        )
+        inputs_cols = [col for col in self.config.inputs_cols if col != "polarity"]
+        return inputs_cols, [sample[col] for col in inputs_cols], "dict"
 
     def merge_results(self, results):
         """merge APC results have the same input text"""
@@ -284,6 +353,55 @@ class SentimentClassifier(InferenceModel):
 
         return final_res
 
+    def _print_results(self, results):
+        """
+        Print the merged results, the aspects are highlighted in the texts.
+        """
+        for ex_id, result in enumerate(results):
+            # flag = False  # only print error cases
+            # for ref_check in result['ref_check']:
+            #     if ref_check == 'Wrong':
+            #         flag = True
+            # if not flag:
+            #     continue
+            text_printing = result["text"]
+            for i in range(len(result["aspect"])):
+                if result["ref_sentiment"][i] != LabelPaddingOption.SENTIMENT_PADDING:
+                    if result["sentiment"][i] == result["ref_sentiment"][i]:
+                        aspect_info = colored(
+                            "<{}:{}(confidence:{}, ref:{})>".format(
+                                result["aspect"][i],
+                                result["sentiment"][i],
+                                round(result["confidence"][i], 3),
+                                result["ref_sentiment"][i],
+                            ),
+                            "green",
+                        )
+                    else:
+                        aspect_info = colored(
+                            "<{}:{}(confidence:{}, ref:{})>".format(
+                                result["aspect"][i],
+                                result["sentiment"][i],
+                                round(result["confidence"][i], 3),
+                                result["ref_sentiment"][i],
+                            ),
+                            "red",
+                        )
+
+                else:
+                    aspect_info = "<{}:{}(confidence:{})>".format(
+                        result["aspect"][i],
+                        result["sentiment"][i],
+                        round(result["confidence"][i], 3),
+                    )
+                text_printing = text_printing.replace(result["aspect"][i], aspect_info)
+            if self.cal_perplexity:
+                text_printing += colored(
+                    " --> <perplexity:{}>".format(result["perplexity"]),
+                    "yellow",
+                )
+            fprint("Example {}: {}".format(ex_id, text_printing))
+
     def _run_prediction(self, save_path=None, print_result=True, **kwargs):
         _params = filter(lambda p: p.requires_grad, self.model.parameters())
 
@@ -308,15 +426,17 @@ class SentimentClassifier(InferenceModel):
                     if col != "polarity"
                 }
                 self.model.eval()
-                outputs = self.model(inputs)
+                outputs = self._forward(inputs)
                 sen_logits = outputs["logits"]
 
                 if t_targets_all is None:
                     t_targets_all = np.array(
                         [
-                            self.config.label_to_index[x]
-                            if x in self.config.label_to_index
-                            else LabelPaddingOption.SENTIMENT_PADDING
+                            (
+                                self.config.label_to_index[x]
+                                if x in self.config.label_to_index
+                                else LabelPaddingOption.SENTIMENT_PADDING
+                            )
                             for x in sample["polarity"]
                         ]
                     )
@@ -326,9 +446,11 @@ class SentimentClassifier(InferenceModel):
                         (
                             t_targets_all,
                             [
-                                self.config.label_to_index[x]
-                                if x in self.config.label_to_index
-                                else LabelPaddingOption.SENTIMENT_PADDING
+                                (
+                                    self.config.label_to_index[x]
+                                    if x in self.config.label_to_index
+                                    else LabelPaddingOption.SENTIMENT_PADDING
+                                )
                                 for x in sample["polarity"]
                             ],
                         ),
@@ -387,55 +509,7 @@ class SentimentClassifier(InferenceModel):
             results = self.merge_results(results)
         try:
             if print_result:
-                for ex_id, result in enumerate(results):
-                    # flag = False  # only print error cases
-                    # for ref_check in result['ref_check']:
-                    #     if ref_check == 'Wrong':
-                    #         flag = True
-                    # if not flag:
-                    #     continue
-                    text_printing = result["text"]
-                    for i in range(len(result["aspect"])):
-                        if (
-                            result["ref_sentiment"][i]
-                            != LabelPaddingOption.SENTIMENT_PADDING
-                        ):
-                            if result["sentiment"][i] == result["ref_sentiment"][i]:
-                                aspect_info = colored(
-                                    "<{}:{}(confidence:{}, ref:{})>".format(
-                                        result["aspect"][i],
-                                        result["sentiment"][i],
-                                        round(result["confidence"][i], 3),
-                                        result["ref_sentiment"][i],
-                                    ),
-                                    "green",
-                                )
-                            else:
-                                aspect_info = colored(
-                                    "<{}:{}(confidence:{}, ref:{})>".format(
-                                        result["aspect"][i],
-                                        result["sentiment"][i],
-                                        round(result["confidence"][i], 3),
-                                        result["ref_sentiment"][i],
-                                    ),
-                                    "red",
-                                )
-
-                        else:
-                            aspect_info = "<{}:{}(confidence:{})>".format(
-                                result["aspect"][i],
-                                result["sentiment"][i],
-                                round(result["confidence"][i], 3),
-                            )
-                        text_printing = text_printing.replace(
-                            result["aspect"][i], aspect_info
-                        )
-                    if self.cal_perplexity:
-                        text_printing += colored(
-                            " --> <perplexity:{}>".format(result["perplexity"]),
-                            "yellow",
-                        )
-                    fprint("Example {}: {}".format(ex_id, text_printing))
+                self._print_results(results)
             if save_path:
                 with open(save_path, "w", encoding="utf8") as fout:
                     json.dump(str(results), fout, ensure_ascii=False)
@@ -10,7 +10,9 @@ import json
 
 import math
 import pickle
+import random
 
+import numpy as np
 import torch
 from collections import OrderedDict, defaultdict
 
@@ -375,13 +377,25 @@ class Metric:
         bert_lengths,
         sen_lengths,
         tokens_ranges,
+        golden_tuples=None,
     ):
+        """
+        :param config: the config
+        :param predictions: the predicted tags of the examples
+        :param goldens: the gold tags of the examples, which are not used by the scores if golden_tuples is given
+        :param bert_lengths: the numbers of the tokens of the examples
+        :param sen_lengths: the numbers of the words of the examples
+        :param tokens_ranges: the token ranges of the words of the examples
+        :param golden_tuples: the decoded gold spans and tuples of the examples, see decode_tuples(), optional
+        """
         self.config = config
         self.predictions = predictions
         self.goldens = goldens
         self.bert_lengths = bert_lengths
         self.sen_lengths = sen_lengths
         self.tokens_ranges = tokens_ranges
+        self.golden_tuples = golden_tuples
+        self.predicted_tuples = None
         self.ignore_index = -1
         self.data_num = len(self.predictions)
 
@@ -453,132 +467,65 @@ class Metric:
 
         return triplets_utm
 
-    def score_aspect(self):
-        assert len(self.predictions) == len(self.goldens)
-        golden_set = set()
-        predicted_set = set()
-        for i in range(self.data_num):
-            golden_aspect_spans = get_aspects(
-                self.goldens[i], self.sen_lengths[i], self.tokens_ranges[i], self.config
-            )
-            for spans in golden_aspect_spans:
-                golden_set.add(str(i) + "-" + "-".join(map(str, spans)))
-
-            predicted_aspect_spans = get_aspects(
-                self.predictions[i],
-                self.sen_lengths[i],
-                self.tokens_ranges[i],
-                self.config,
-            )
-            for spans in predicted_aspect_spans:
-                predicted_set.add(str(i) + "-" + "-".join(map(str, spans)))
-
-        correct_num = len(golden_set & predicted_set)
-        precision = correct_num / len(predicted_set) if len(predicted_set) > 0 else 0
-        recall = correct_num / len(golden_set) if len(golden_set) > 0 else 0
-        f1 = (
-            2 * precision * recall / (precision + recall)
-            if (precision + recall) > 0
-            else 0
-        )
-        return precision, recall, f1
-
-    def score_opinion(self):
-        assert len(self.predictions) == len(self.goldens)
-        golden_set = set()
-        predicted_set = set()
-        for i in range(self.data_num):
-            golden_opinion_spans = get_opinions(
-                self.goldens[i], self.sen_lengths[i], self.tokens_ranges[i], self.config
-            )
-            for spans in golden_opinion_spans:
-                golden_set.add(str(i) + "-" + "-".join(map(str, spans)))
-
-            predicted_opinion_spans = get_opinions(
-                self.predictions[i],
-                self.sen_lengths[i],
-                self.tokens_ranges[i],
-                self.config,
-            )
-            for spans in predicted_opinion_spans:
-                predicted_set.add(str(i) + "-" + "-".join(map(str, spans)))
-
-        correct_num = len(golden_set & predicted_set)
-        precision = correct_num / len(predicted_set) if len(predicted_set) > 0 else 0
-        recall = correct_num / len(golden_set) if len(golden_set) > 0 else 0
-        f1 = (
-            2 * precision * recall / (precision + recall)
-            if (precision + recall) > 0
-            else 0
-        )
-        return precision, recall, f1
-
-    def score_uniontags(self):
-        assert len(self.predictions) == len(self.goldens)
-        golden_set = set()
-        predicted_set = set()
-        for i in range(self.data_num):
-            golden_aspect_spans = get_aspects(
-                self.goldens[i], self.sen_lengths[i], self.tokens_ranges[i], self.config
-            )
-            golden_opinion_spans = get_opinions(
-                self.goldens[i], self.sen_lengths[i], self.tokens_ranges[i], self.config
-            )
-            if self.config.task == "pair":
-                golden_tuples = self.find_pair(
-                    self.goldens[i],
-                    golden_aspect_spans,
-                    golden_opinion_spans,
+    def decode(self):
+        """
+        Decode the spans and tuples of the predictions, and of the goldens if golden_tuples is not given, once.
+        """
+        if self.predicted_tuples is None:
+            self.predicted_tuples = [
+                decode_tuples(
+                    self.predictions[i],
+                    self.sen_lengths[i],
                     self.tokens_ranges[i],
+                    self.config,
                 )
-            elif self.config.task == "triplet":
-                golden_tuples = self.find_triplet(
+                for i in range(self.data_num)
+            ]
+        if self.golden_tuples is None:
+            assert len(self.predictions) == len(self.goldens)
+            self.golden_tuples = [
+                decode_tuples(
                     self.goldens[i],
-                    golden_aspect_spans,
-                    golden_opinion_spans,
+                    self.sen_lengths[i],
                     self.tokens_ranges[i],
+                    self.config,
                 )
-            for pair in golden_tuples:
-                golden_set.add(str(i) + "-" + "-".join(map(str, pair)))
+                for i in range(self.data_num)
+            ]
+        assert len(self.predicted_tuples) == len(self.golden_tuples)
+        return self.golden_tuples, self.predicted_tuples
+
+    def scores(self):
+        """
+        Score the tuples (pairs or triplets), the aspect terms and the opinion terms in one pass.
+
+        :return: the (precision, recall, f1) of the tuples, the aspect terms and the opinion terms
+        """
+        golden_tuples, predicted_tuples = self.decode()
+        golden_sets = [set(), set(), set()]
+        predicted_sets = [set(), set(), set()]
+        for i in range(self.data_num):
+            for decoded, sets in [
+                (golden_tuples[i], golden_sets),
+                (predicted_tuples[i], predicted_sets),
+            ]:
+                aspect_spans, opinion_spans, tuples = decoded
+                sets[0].update((i,) + tuple(t) for t in tuples)
+                sets[1].update((i,) + tuple(span) for span in aspect_spans)
+                sets[2].update((i,) + tuple(span) for span in opinion_spans)
+        return tuple(
+            _precision_recall_f1(golden_set, predicted_set)
+            for golden_set, predicted_set in zip(golden_sets, predicted_sets)
+        )
 
-            predicted_aspect_spans = get_aspects(
-                self.predictions[i],
-                self.sen_lengths[i],
-                self.tokens_ranges[i],
-                self.config,
-            )
-            predicted_opinion_spans = get_opinions(
-                self.predictions[i],
-                self.sen_lengths[i],
-                self.tokens_ranges[i],
-                self.config,
-            )
-            if self.config.task == "pair":
-                predicted_tuples = self.find_pair(
-                    self.predictions[i],
-                    predicted_aspect_spans,
-                    predicted_opinion_spans,
-                    self.tokens_ranges[i],
-                )
-            elif self.config.task == "triplet":
-                predicted_tuples = self.find_triplet(
-                    self.predictions[i],
-                    predicted_aspect_spans,
-                    predicted_opinion_spans,
-                    self.tokens_ranges[i],
-                )
-            for pair in predicted_tuples:
-                predicted_set.add(str(i) + "-" + "-".join(map(str, pair)))
+    def score_aspect(self):
+        return self.scores()[1]
 
-        correct_num = len(golden_set & predicted_set)
-        precision = correct_num / len(predicted_set) if len(predicted_set) > 0 else 0
-        recall = correct_num / len(golden_set) if len(golden_set) > 0 else 0
-        f1 = (
-            2 * precision * recall / (precision + recall)
-            if (precision + recall) > 0
-            else 0
-        )
-        return precision, recall, f1
+    def score_opinion(self):
+        return self.scores()[2]
+
+    def score_uniontags(self):
+        return self.scores()[0]
 
     def parse_triplet(self, golden=True):
         all_golden_tuples = []
@@ -726,8 +673,8 @@ class Metric:
         golden_tags = []
         predict_tags = []
         for i in range(self.data_num):
-            for r in range(102):
-                for c in range(r, 102):
+            for r in range(len(self.goldens[i])):
+                for c in range(r, len(self.goldens[i])):
                     if self.goldens[i][r][c] == -1:
                         continue
                     golden_tags.append(self.goldens[i][r][c])
@@ -805,84 +752,227 @@ def get_opinions(tags, length, token_range, config=None):
     return spans
 
 
+def _precision_recall_f1(golden_set, predicted_set):
+    correct_num = len(golden_set & predicted_set)
+    precision = correct_num / len(predicted_set) if len(predicted_set) > 0 else 0
+    recall = correct_num / len(golden_set) if len(golden_set) > 0 else 0
+    f1 = (
+        2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
+    )
+    return precision, recall, f1
+
+
+def decode_spans(word_tags, begin, inside, length):
+    """
+    Decode the spans of the BIO tags of the words, the same as get_aspects() and get_opinions().
+
+    :param word_tags: the int array of the tags of the first tokens of the words, -1 for the ignored words
+    :param begin: the index of the B tag
+    :param inside: the index of the I tag
+    :param length: the number of the words
+    :return: the int array of the [start, end] spans, of shape (num_spans, 2)
+    """
+    positions = np.flatnonzero(word_tags != -1)
+    tags = word_tags[positions]
+    starts = np.flatnonzero(tags == begin)
+    # a span is ended by the next tag which is not an I tag, or by the end of the sentence
+    breaks = np.flatnonzero(tags != inside)
+    next_breaks = np.searchsorted(breaks, starts, side="right")
+    ends = np.full(len(starts), length - 1, dtype=np.int64)
+    closed = next_breaks < len(breaks)
+    ends[closed] = positions[breaks[next_breaks[closed]] - 1]
+    return np.stack([positions[starts], ends], axis=1)
+
+
+def decode_tuples(tags, length, token_range, config):
+    """
+    Decode the aspect spans, the opinion spans and the tuples (pairs or triplets) of the tags of an example,
+    the same as get_aspects(), get_opinions() and Metric.find_pair() (or Metric.find_triplet()).
+    Only the diagonal and the upper triangle of the tags are used.
+
+    :param tags: the tags of the tokens, of shape (seq_len, seq_len)
+    :param length: the number of the words
+    :param token_range: the token ranges of the words
+    :param config: the config, config.task is "pair" or "triplet"
+    :return: the aspect spans, the opinion spans and the tuples, as lists
+    """
+    if isinstance(tags, torch.Tensor):
+        tags = tags.cpu().numpy()
+    tags = np.asarray(tags)
+    label_to_index = config.label_to_index
+    word_starts = np.asarray([token_range[i][0] for i in range(length)], dtype=np.int64)
+    aspect_spans = decode_spans(
+        tags[word_starts, word_starts],
+        label_to_index["B-A"],
+        label_to_index["I-A"],
+        length,
+    )
+    opinion_spans = decode_spans(
+        tags[word_starts, word_starts],
+        label_to_index["B-O"],
+        label_to_index["I-O"],
+        length,
+    )
+    if config.task == "pair":
+        classes = [label_to_index["A"]]
+    elif config.task == "triplet":
+        classes = [
+            label_to_index["Negative"],
+            label_to_index["Neutral"],
+            label_to_index["Positive"],
+        ]
+    else:
+        raise ValueError("task must be pair or triplet")
+
+    tuples = []
+    if len(aspect_spans) and len(opinion_spans):
+        # the tags of the word pairs, the tag of (i, j) is read from the upper triangle
+        pair_tags = tags[np.ix_(word_starts, word_starts)]
+        pair_tags = np.where(
+            np.triu(np.ones(pair_tags.shape, dtype=bool)), pair_tags, pair_tags.T
+        )
+        # the numbers of the tags of each class in the blocks of the span pairs, by the 2D prefix sums
+        counts = np.zeros((len(classes), length + 1, length + 1), dtype=np.int64)
+        counts[:, 1:, 1:] = (
+            (pair_tags[None] == np.asarray(classes)[:, None, None])
+            .cumsum(axis=1)
+            .cumsum(axis=2)
+        )
+        al, ar = aspect_spans[:, None, 0], aspect_spans[:, None, 1] + 1
+        pl, pr = opinion_spans[None, :, 0], opinion_spans[None, :, 1] + 1
+        nums = (
+            counts[:, ar, pr]
+            - counts[:, al, pr]
+            - counts[:, ar, pl]
+            + counts[:, al, pl]
+        )
+        if config.task == "pair":
+            sentiments = np.full(nums.shape[1:], -1, dtype=np.int64)
+        else:
+            negative, neutral, positive = nums
+            sentiments = np.where(
+                (positive >= neutral) & (positive >= negative),
+                classes[2],
+                np.where(
+                    (neutral >= negative) & (neutral >= positive),
+                    classes[1],
+                    classes[0],
+                ),
+            )
+        aspects, opinions = np.nonzero(nums.sum(axis=0) > 0)
+        tuples = np.concatenate(
+            [
+                aspect_spans[aspects],
+                opinion_spans[opinions],
+                sentiments[aspects, opinions][:, None],
+            ],
+            axis=1,
+        ).tolist()
+
+    return aspect_spans.tolist(), opinion_spans.tolist(), tuples
+
+
 class DataIterator(object):
-    def __init__(self, instances, config):
+    def __init__(self, instances, config, shuffle=False):
+        """
+        Iterate the batches of the instances, each batch is trimmed to the max length of its instances,
+        as the cost of the word pair grids is quadratic in the sequence length. The length is rounded up to
+        a multiple of the seq_len_bucket option (default 16, capped at max_seq_len), so that a compiled model
+        (see compile_model()) is only compiled for a few shapes.
+
+        :param instances: the instances
+        :param config: the config, the bucket_batches option is the number of batches in a length bucket, default 100
+        :param shuffle: whether to shuffle the instances at each epoch, the shuffled instances are sorted by
+            length in the buckets, and the batches are shuffled, so that a batch contains the instances of
+            similar lengths. The instances are batched in their order if shuffle is False.
+        """
         self.instances = instances
         self.config = config
+        self.shuffle = shuffle
         self.batch_count = math.ceil(len(instances) / config.batch_size)
+        self.batches = self._make_batches()
+        self.decoded_goldens = [None] * len(instances)
+
+    def _make_batches(self):
+        indices = list(range(len(self.instances)))
+        batch_size = self.config.batch_size
+        if self.shuffle:
+            random.shuffle(indices)
+            bucket_size = batch_size * self.config.get("bucket_batches", 100)
+            for i in range(0, len(indices), bucket_size):
+                indices[i : i + bucket_size] = sorted(
+                    indices[i : i + bucket_size],
+                    key=lambda idx: self.instances[idx].length,
+                )
+        batches = [
+            indices[i : i + batch_size] for i in range(0, len(indices), batch_size)
+        ]
+        if self.shuffle:
+            random.shuffle(batches)
+        return batches
+
+    def _to_device(self, tensor):
+        if str(self.config.device).startswith("cuda") and torch.cuda.is_available():
+            return tensor.pin_memory().to(self.config.device, non_blocking=True)
+        return tensor.to(self.config.device)
 
     def get_batch(self, index):
-        sentence_ids = []
-        sentences = []
-        sens_lens = []
-        token_ranges = []
-        bert_tokens = []
-        lengths = []
-        masks = []
-        aspect_tags = []
-        opinion_tags = []
-        tags = []
-        tags_symmetry = []
-        word_pair_position = []
-        word_pair_deprel = []
-        word_pair_pos = []
-        word_pair_synpost = []
-
-        for i in range(
-            index * self.config.batch_size,
-            min((index + 1) * self.config.batch_size, len(self.instances)),
-        ):
-            sentence_ids.append(self.instances[i].id)
-            sentences.append(self.instances[i].sentence)
-            sens_lens.append(self.instances[i].sen_length)
-            token_ranges.append(self.instances[i].token_range)
-            bert_tokens.append(self.instances[i].bert_tokens_padding)
-            lengths.append(self.instances[i].length)
-            masks.append(self.instances[i].mask)
-            aspect_tags.append(self.instances[i].aspect_tags)
-            opinion_tags.append(self.instances[i].opinion_tags)
-            tags.append(self.instances[i].tags)
-            tags_symmetry.append(self.instances[i].tags_symmetry)
-
-            word_pair_position.append(self.instances[i].word_pair_position)
-            word_pair_deprel.append(self.instances[i].word_pair_deprel)
-            word_pair_pos.append(self.instances[i].word_pair_pos)
-            word_pair_synpost.append(self.instances[i].word_pair_synpost)
-
-        bert_tokens = torch.stack(bert_tokens).to(self.config.device)
-        lengths = torch.tensor(lengths).to(self.config.device)
-        masks = torch.stack(masks).to(self.config.device)
-        aspect_tags = torch.stack(aspect_tags).to(self.config.device)
-        opinion_tags = torch.stack(opinion_tags).to(self.config.device)
-        tags = torch.stack(tags).to(self.config.device)
-        tags_symmetry = torch.stack(tags_symmetry).to(self.config.device)
-
-        word_pair_position = torch.stack(word_pair_position).to(self.config.device)
-        word_pair_deprel = torch.stack(word_pair_deprel).to(self.config.device)
-        word_pair_pos = torch.stack(word_pair_pos).to(self.config.device)
-        word_pair_synpost = torch.stack(word_pair_synpost).to(self.config.device)
+        instances = [self.instances[i] for i in self.batches[index]]
+        # the max length of the batch rounded up to the bucket, the positions after the lengths are padding
+        seq_len = max(instance.length for instance in instances)
+        bucket = self.config.get("seq_len_bucket", 16)
+        seq_len = min(math.ceil(seq_len / bucket) * bucket, self.config.max_seq_len)
+
+        def stack(name):
+            tensors = [getattr(instance, name) for instance in instances]
+            if tensors[0].dim() == 1:
+                tensors = [tensor[:seq_len] for tensor in tensors]
+            else:
+                tensors = [tensor[:seq_len, :seq_len] for tensor in tensors]
+            return self._to_device(torch.stack(tensors))
 
         return (
-            sentence_ids,
-            sentences,
-            bert_tokens,
-            lengths,
-            masks,
-            sens_lens,
-            token_ranges,
-            aspect_tags,
-            tags,
-            word_pair_position,
-            word_pair_deprel,
-            word_pair_pos,
-            word_pair_synpost,
-            tags_symmetry,
+            [instance.id for instance in instances],
+            [instance.sentence for instance in instances],
+            stack("bert_tokens_padding"),
+            self._to_device(torch.tensor([instance.length for instance in instances])),
+            stack("mask"),
+            [instance.sen_length for instance in instances],
+            [instance.token_range for instance in instances],
+            stack("aspect_tags"),
+            stack("tags"),
+            stack("word_pair_position"),
+            stack("word_pair_deprel"),
+            stack("word_pair_pos"),
+            stack("word_pair_synpost"),
+            stack("tags_symmetry"),
         )
 
+    def golden_tuples(self, index):
+        """
+        Get the gold spans and tuples of the instances of a batch (see decode_tuples()),
+        the tags of an instance are decoded once and cached for the following evaluations.
+
+        :param index: the index of the batch
+        :return: the list of the decoded gold spans and tuples
+        """
+        for i in self.batches[index]:
+            if self.decoded_goldens[i] is None:
+                instance = self.instances[i]
+                self.decoded_goldens[i] = decode_tuples(
+                    instance.tags,
+                    instance.sen_length,
+                    instance.token_range,
+                    self.config,
+                )
+        return [self.decoded_goldens[i] for i in self.batches[index]]
+
     def __len__(self):
         return self.batch_count
 
     def __iter__(self):
+        if self.shuffle:
+            self.batches = self._make_batches()
         for i in range(self.batch_count):
             yield self.get_batch(i)
 
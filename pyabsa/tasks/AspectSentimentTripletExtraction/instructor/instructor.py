@@ -7,7 +7,6 @@
 import os
 import pickle
 import random
-import shutil
 import time
 
 import numpy as np
@@ -22,7 +21,6 @@ from pyabsa.tasks.AspectSentimentTripletExtraction.dataset_utils.aste_utils impo
 )
 from pyabsa.utils.pyabsa_utils import fprint, init_optimizer, print_args
 
-from pyabsa.utils.file_utils.file_utils import save_model
 
 from pyabsa.framework.flag_class import DeviceTypeOption
 from tqdm import tqdm
@@ -30,6 +28,7 @@ from tqdm import tqdm
 from pyabsa.framework.tokenizer_class.tokenizer_class import PretrainedTokenizer
 
 from pyabsa.framework.instructor_class.instructor_template import BaseTrainingInstructor
+from pyabsa.utils.model_utils.model_utils import compile_model
 from pyabsa.tasks.AspectSentimentTripletExtraction.dataset_utils.data_utils_for_training import (
     ASTEDataset,
 )
@@ -96,6 +95,7 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                 DataIterator(
                     self.train_set,
                     config=self.config,
+                    shuffle=True,
                 )
             )
 
@@ -141,6 +141,7 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                     DataIterator(
                         train_set,
                         config=self.config,
+                        shuffle=True,
                     )
                 )
                 self.valid_dataloaders.append(
@@ -150,6 +151,106 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                     )
                 )
 
+    def _compute_loss(self, sample_batched, criterion):
+        (
+            _,
+            sentences,
+            token_ids,
+            lengths,
+            masks,
+            _,
+            _,
+            aspect_tags,
+            tags,
+            word_pair_position,
+            word_pair_deprel,
+            word_pair_pos,
+            word_pair_synpost,
+            tags_symmetry,
+        ) = sample_batched
+
+        inputs = {
+            "token_ids": token_ids,
+            "masks": masks,
+            "word_pair_position": word_pair_position,
+            "word_pair_deprel": word_pair_deprel,
+            "word_pair_pos": word_pair_pos,
+            "word_pair_synpost": word_pair_synpost,
+        }
+
+        tags_flatten = tags.reshape([-1])
+        tags_symmetry_flatten = tags_symmetry.reshape([-1])
+        if self.config.get("relation_constraint", True):
+            predictions = self.model(inputs)
+            (
+                biaffine_pred,
+                post_pred,
+                deprel_pred,
+                postag,
+                synpost,
+                final_pred,
+            ) = (
+                predictions[0],
+                predictions[1],
+                predictions[2],
+                predictions[3],
+                predictions[4],
+                predictions[5],
+            )
+            l_ba = 0.10 * criterion(
+                biaffine_pred.reshape([-1, biaffine_pred.shape[3]]),
+                tags_symmetry_flatten,
+            )
+            l_rpd = 0.01 * criterion(
+                post_pred.reshape([-1, post_pred.shape[3]]),
+                tags_symmetry_flatten,
+            )
+            l_dep = 0.01 * criterion(
+                deprel_pred.reshape([-1, deprel_pred.shape[3]]),
+                tags_symmetry_flatten,
+            )
+            l_psc = 0.01 * criterion(
+                postag.reshape([-1, postag.shape[3]]), tags_symmetry_flatten
+            )
+            l_tbd = 0.01 * criterion(
+                synpost.reshape([-1, synpost.shape[3]]), tags_symmetry_flatten
+            )
+
+            if self.config.get("symmetry_decoding", False):
+                l_p = torch.nn.functional.cross_entropy(
+                    final_pred.reshape([-1, final_pred.shape[3]]),
+                    tags_symmetry_flatten,
+                    weight=self.tag_weight,
+                    ignore_index=-1,
+                )
+            else:
+                l_p = torch.nn.functional.cross_entropy(
+                    final_pred.reshape([-1, final_pred.shape[3]]),
+                    tags_flatten,
+                    weight=self.tag_weight,
+                    ignore_index=-1,
+                )
+
+            loss = l_ba + l_rpd + l_dep + l_psc + l_tbd + l_p
+        else:
+            preds = self.model(inputs)[-1]
+            preds_flatten = preds.reshape([-1, preds.shape[3]])
+            if self.config.symmetry_decoding:
+                loss = torch.nn.functional.cross_entropy(
+                    preds_flatten,
+                    tags_symmetry_flatten,
+                    weight=self.tag_weight,
+                    ignore_index=-1,
+                )
+            else:
+                loss = torch.nn.functional.cross_entropy(
+                    preds_flatten, tags_flatten, weight=self.tag_weight, ignore_index=-1
+                )
+
+        if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
+            loss = loss.mean()
+        return loss
+
     def _train_and_evaluate(self, criterion):
         global_step = 0
         max_fold_f1 = -1
@@ -162,7 +263,7 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
         self.config.metrics_of_this_checkpoint = {"f1": 0}
         self.config.max_test_metrics = {"max_apc_test_f1": 0}
 
-        losses = []
+        self.loss_tracker.reset()
 
         Total_params = 0
         Trainable_params = 0
@@ -203,165 +304,36 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
             "Num steps = %d",
             len(self.train_dataloaders[0]) * self.config.num_epoch,
         )
-        weight = (
-            torch.tensor([1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 2.0, 2.0, 2.0])
-            .float()
-            .to(self.config.device)
-        )
-
         for epoch in range(self.config.num_epoch):
             patience -= 1
             description = "Epoch:{} | Loss:{}".format(epoch, 0)
             iterator = tqdm(self.train_dataloaders[0], desc=description)
             for i_batch, sample_batched in enumerate(iterator):
                 global_step += 1
-                # switch model to trainer mode, clear gradient accumulators
+                # switch model to trainer mode
                 self.model.train()
-                self.optimizer.zero_grad()
-
-                if self.config.use_amp:
-                    with torch.cuda.amp.autocast():
-                        (
-                            _,
-                            sentences,
-                            token_ids,
-                            lengths,
-                            masks,
-                            _,
-                            _,
-                            aspect_tags,
-                            tags,
-                            word_pair_position,
-                            word_pair_deprel,
-                            word_pair_pos,
-                            word_pair_synpost,
-                            tags_symmetry,
-                        ) = sample_batched
-
-                else:
-                    (
-                        _,
-                        sentences,
-                        token_ids,
-                        lengths,
-                        masks,
-                        _,
-                        _,
-                        aspect_tags,
-                        tags,
-                        word_pair_position,
-                        word_pair_deprel,
-                        word_pair_pos,
-                        word_pair_synpost,
-                        tags_symmetry,
-                    ) = sample_batched
-
-                inputs = {
-                    "token_ids": token_ids,
-                    "masks": masks,
-                    "word_pair_position": word_pair_position,
-                    "word_pair_deprel": word_pair_deprel,
-                    "word_pair_pos": word_pair_pos,
-                    "word_pair_synpost": word_pair_synpost,
-                }
-
-                tags_flatten = tags.reshape([-1])
-                tags_symmetry_flatten = tags_symmetry.reshape([-1])
-                if self.config.get("relation_constraint", True):
-                    predictions = self.model(inputs)
-                    (
-                        biaffine_pred,
-                        post_pred,
-                        deprel_pred,
-                        postag,
-                        synpost,
-                        final_pred,
-                    ) = (
-                        predictions[0],
-                        predictions[1],
-                        predictions[2],
-                        predictions[3],
-                        predictions[4],
-                        predictions[5],
-                    )
-                    l_ba = 0.10 * criterion(
-                        biaffine_pred.reshape([-1, biaffine_pred.shape[3]]),
-                        tags_symmetry_flatten,
-                    )
-                    l_rpd = 0.01 * criterion(
-                        post_pred.reshape([-1, post_pred.shape[3]]),
-                        tags_symmetry_flatten,
-                    )
-                    l_dep = 0.01 * criterion(
-                        deprel_pred.reshape([-1, deprel_pred.shape[3]]),
-                        tags_symmetry_flatten,
-                    )
-                    l_psc = 0.01 * criterion(
-                        postag.reshape([-1, postag.shape[3]]), tags_symmetry_flatten
-                    )
-                    l_tbd = 0.01 * criterion(
-                        synpost.reshape([-1, synpost.shape[3]]), tags_symmetry_flatten
-                    )
-
-                    if self.config.get("symmetry_decoding", False):
-                        l_p = torch.nn.functional.cross_entropy(
-                            final_pred.reshape([-1, final_pred.shape[3]]),
-                            tags_symmetry_flatten,
-                            weight=weight,
-                            ignore_index=-1,
-                        )
-                    else:
-                        l_p = torch.nn.functional.cross_entropy(
-                            final_pred.reshape([-1, final_pred.shape[3]]),
-                            tags_flatten,
-                            weight=weight,
-                            ignore_index=-1,
-                        )
-
-                    loss = l_ba + l_rpd + l_dep + l_psc + l_tbd + l_p
-                else:
-                    preds = self.model(inputs)[-1]
-                    preds_flatten = preds.reshape([-1, preds.shape[3]])
-                    if self.config.symmetry_decoding:
-                        loss = torch.nn.functional.cross_entropy(
-                            preds_flatten,
-                            tags_symmetry_flatten,
-                            weight=weight,
-                            ignore_index=-1,
-                        )
-                    else:
-                        loss = torch.nn.functional.cross_entropy(
-                            preds_flatten, tags_flatten, weight=weight, ignore_index=-1
-                        )
-
-                if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
-                    loss = loss.mean()
-
-                losses.append(loss.item())
-
-                if self.config.use_amp and self.scaler:
-                    self.scaler.scale(loss).backward()
-                    self.scaler.step(self.optimizer)
-                    self.scaler.update()
-                else:
-                    loss.backward()
-                    self.optimizer.step()
-
-                if self.config.warmup_step >= 0:
-                    with self.warmup_scheduler.dampening():
-                        self.lr_scheduler.step()
+                loss = self._train_step(
+                    sample_batched, criterion, i_batch + 1 == len(iterator)
+                )
+                self.loss_tracker.track(loss)
 
                 # evaluate if test set is available
-                if global_step % self.config.log_step == 0:
+                if self.eval_scheduler.should_evaluate(
+                    global_step, i_batch + 1 == len(iterator)
+                ):
                     if self.test_dataloader and epoch >= self.config.evaluate_begin:
                         if len(self.valid_dataloaders) > 1:
-                            joint_precision, joint_recall, joint_f1 = self._evaluate_f1(
-                                self.valid_dataloaders[0]
+                            joint_precision, joint_recall, joint_f1 = (
+                                self.eval_scheduler.evaluate(
+                                    self._evaluate_f1, self.valid_dataloaders[0]
+                                )
                             )
 
                         else:
-                            joint_precision, joint_recall, joint_f1 = self._evaluate_f1(
-                                self.test_dataloader
+                            joint_precision, joint_recall, joint_f1 = (
+                                self.eval_scheduler.evaluate(
+                                    self._evaluate_f1, self.test_dataloader
+                                )
                             )
                         self.config.metrics_of_this_checkpoint["f1"] = joint_f1
 
@@ -373,13 +345,6 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                             if self.config.model_path_to_save:
                                 if not os.path.exists(self.config.model_path_to_save):
                                     os.makedirs(self.config.model_path_to_save)
-                                if save_path:
-                                    try:
-                                        shutil.rmtree(save_path)
-                                        # logger.info('Remove sub-optimal trained model:', save_path)
-                                    except:
-                                        # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                        pass
                                 save_path = "{0}/{1}_{2}_f1_{3}/".format(
                                     self.config.model_path_to_save,
                                     self.config.model_name,
@@ -395,8 +360,8 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                                         "max_apc_test_f1"
                                     ] = joint_f1
 
-                                save_model(
-                                    self.config, self.model, self.tokenizer, save_path
+                                self.checkpoint_writer.save(
+                                    self.model, self.tokenizer, save_path
                                 )
 
                         postfix = "Dev F1:{:>.2f}(max:{:>.2f})".format(
@@ -405,26 +370,20 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                         )
                         iterator.set_postfix_str(postfix)
                     elif self.config.save_mode and epoch >= self.config.evaluate_begin:
-                        save_model(
-                            self.config,
+                        self.checkpoint_writer.save(
                             self.model,
                             self.tokenizer,
-                            save_path + "_{}/".format(loss.item()),
+                            save_path + "_{}/".format(self.loss_tracker.last_loss),
+                            prune=False,
                         )
                 else:
-                    if self.config.get("loss_display", "smooth") == "smooth":
-                        description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                            epoch, round(np.nanmean(losses), 4)
-                        )
-                    else:
-                        description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                            epoch, round(loss.item(), 4)
-                        )
-                iterator.set_description(description)
-                iterator.refresh()
+                    description = self.loss_tracker.description(epoch)
+                self.loss_tracker.refresh(iterator, description)
             if patience == 0:
                 break
 
+        self.checkpoint_writer.close()
+
         if not self.valid_dataloaders:
             self.config.MV.log_metric(
                 self.config.model_name
@@ -482,7 +441,7 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
         save_path_k_fold = ""
         max_fold_acc_k_fold = 0
 
-        losses = []
+        self.loss_tracker.reset()
 
         self.config.metrics_of_this_checkpoint = {"acc": 0, "f1": 0}
         self.config.max_test_metrics = {"max_apc_test_acc": 0, "max_apc_test_f1": 0}
@@ -525,58 +484,29 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                 self.config.model_name,
                 self.config.dataset_name,
             )
+            # the best checkpoints of each fold are retained, see CheckpointWriter.reset()
+            self.checkpoint_writer.reset()
             for epoch in range(self.config.num_epoch):
                 patience -= 1
                 description = "Epoch:{} | Loss:{}".format(epoch, 0)
                 iterator = tqdm(train_dataloader, desc=description)
                 for i_batch, sample_batched in enumerate(iterator):
                     global_step += 1
-                    # switch model to train mode, clear gradient accumulators
+                    # switch model to train mode
                     self.model.train()
-                    self.optimizer.zero_grad()
-                    inputs = {
-                        col: sample_batched[col].to(self.config.device)
-                        for col in self.config.inputs
-                    }
-
-                    if self.config.use_amp:
-                        with torch.cuda.amp.autocast():
-                            outputs = self.model(inputs)
-                    else:
-                        outputs = self.model(inputs)
-
-                    targets = sample_batched["polarity"].to(self.config.device)
-
-                    if (
-                        isinstance(outputs, dict)
-                        and "loss" in outputs
-                        and outputs["loss"] != 0
-                    ):
-                        loss = outputs["loss"]
-                    else:
-                        loss = criterion(outputs["logits"], targets)
-
-                    if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
-                        loss = loss.mean()
-
-                    losses.append(loss.item())
-
-                    if self.config.use_amp and self.scaler:
-                        self.scaler.scale(loss).backward()
-                        self.scaler.step(self.optimizer)
-                        self.scaler.update()
-                    else:
-                        loss.backward()
-                        self.optimizer.step()
-
-                    if self.config.warmup_step >= 0:
-                        with self.warmup_scheduler.dampening():
-                            self.lr_scheduler.step()
+                    loss = self._train_step(
+                        sample_batched, criterion, i_batch + 1 == len(iterator)
+                    )
+                    self.loss_tracker.track(loss)
 
                     # evaluate if test set is available
-                    if global_step % self.config.log_step == 0:
+                    if self.eval_scheduler.should_evaluate(
+                        global_step, i_batch + 1 == len(iterator)
+                    ):
                         if self.test_dataloader and epoch >= self.config.evaluate_begin:
-                            test_acc, f1 = self._evaluate_acc_f1(valid_dataloader)
+                            test_acc, f1 = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, valid_dataloader
+                            )
 
                             self.config.metrics_of_this_checkpoint["acc"] = test_acc
                             self.config.metrics_of_this_checkpoint["f1"] = f1
@@ -595,13 +525,6 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                                         self.config.model_path_to_save
                                     ):
                                         os.makedirs(self.config.model_path_to_save)
-                                    if save_path:
-                                        try:
-                                            shutil.rmtree(save_path)
-                                            # logger.info('Remove sub-optimal trained model:', save_path)
-                                        except:
-                                            # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                            pass
                                     save_path = "{0}/{1}_{2}_acc_{3}_f1_{4}/".format(
                                         self.config.model_path_to_save,
                                         self.config.model_name,
@@ -629,11 +552,8 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                                             "max_apc_test_f1"
                                         ] = f1
 
-                                    save_model(
-                                        self.config,
-                                        self.model,
-                                        self.tokenizer,
-                                        save_path,
+                                    self.checkpoint_writer.save(
+                                        self.model, self.tokenizer, save_path
                                     )
 
                             postfix = "Dev Acc:{:>.2f}(max:{:>.2f}) Dev F1:{:>.2f}(max:{:>.2f})".format(
@@ -647,26 +567,20 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                             self.config.save_mode
                             and epoch >= self.config.evaluate_begin
                         ):
-                            save_model(
-                                self.config,
+                            self.checkpoint_writer.save(
                                 self.model,
                                 self.tokenizer,
-                                save_path + "_{}/".format(loss.item()),
+                                save_path + "_{}/".format(self.loss_tracker.last_loss),
+                                prune=False,
                             )
                     else:
-                        if self.config.get("loss_display", "smooth") == "smooth":
-                            description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                                epoch, round(np.nanmean(losses), 4)
-                            )
-                        else:
-                            description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                                epoch, round(loss.item(), 4)
-                            )
+                        description = self.loss_tracker.description(epoch)
 
-                    iterator.set_description(description)
-                    iterator.refresh()
+                    self.loss_tracker.refresh(iterator, description)
                 if patience == 0:
                     break
+
+            self.checkpoint_writer.close()
             max_fold_acc, max_fold_f1 = self._evaluate_acc_f1(self.test_dataloader)
             if max_fold_acc > max_fold_acc_k_fold:
                 save_path_k_fold = save_path
@@ -736,14 +650,13 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
     def _evaluate_f1(self, data_loader, FLAG=False):
         self.model.eval()
         with torch.no_grad():
-            all_ids = []
-            all_sentences = []
             all_preds = []
             all_labels = []
+            all_goldens = []
             all_lengths = []
             all_sens_lengths = []
             all_token_ranges = []
-            for eval_batch in data_loader:
+            for index in range(len(data_loader)):
                 (
                     sentence_ids,
                     sentences,
@@ -759,7 +672,7 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                     word_pair_pos,
                     word_pair_synpost,
                     tags_symmetry,
-                ) = eval_batch
+                ) = data_loader.get_batch(index)
 
                 inputs = {
                     "token_ids": token_ids,
@@ -771,20 +684,22 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                 }
 
                 preds = self.model(inputs)[-1]
-
-                preds = nn.functional.softmax(preds, dim=-1)
-                preds = torch.argmax(preds, dim=3)
-                all_preds.append(preds)
-                all_labels.append(tags)
-                all_lengths.append(lengths)
+                preds = torch.argmax(preds, dim=3).to(torch.int8).cpu().numpy()
+                lengths = lengths.cpu().tolist()
+                # the tags are kept as small int arrays of the tokens of each example
+                all_preds.extend(
+                    pred[:length, :length] for pred, length in zip(preds, lengths)
+                )
+                if FLAG:
+                    tags = tags.to(torch.int8).cpu().numpy()
+                    all_labels.extend(
+                        tag[:length, :length] for tag, length in zip(tags, lengths)
+                    )
+                # the gold tuples are decoded once per dataset
+                all_goldens.extend(data_loader.golden_tuples(index))
+                all_lengths.extend(lengths)
                 all_sens_lengths.extend(sens_lens)
                 all_token_ranges.extend(token_ranges)
-                all_ids.extend(sentence_ids)
-                all_sentences.extend(sentences)
-
-            all_preds = torch.cat(all_preds, dim=0).cpu().tolist()
-            all_labels = torch.cat(all_labels, dim=0).cpu().tolist()
-            all_lengths = torch.cat(all_lengths, dim=0).cpu().tolist()
 
             metric = Metric(
                 self.config,
@@ -793,10 +708,9 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
                 all_lengths,
                 all_sens_lengths,
                 all_token_ranges,
+                golden_tuples=all_goldens,
             )
-            precision, recall, f1 = metric.score_uniontags()
-            aspect_results = metric.score_aspect()
-            opinion_results = metric.score_opinion()
+            (precision, recall, f1), aspect_results, opinion_results = metric.scores()
             # print('Aspect term\tP:{:.5f}\tR:{:.5f}\tF1:{:.5f}'.format(aspect_results[0], aspect_results[1],
             #                                                           aspect_results[2]))
             # print('Opinion term\tP:{:.5f}\tR:{:.5f}\tF1:{:.5f}'.format(opinion_results[0], opinion_results[1],
@@ -873,13 +787,22 @@ class ASTETrainingInstructor(BaseTrainingInstructor):
     def _train(self, criterion):
         self._prepare_dataloader()
 
+        self.model = compile_model(self.model, self.config)
+
         if self.config.warmup_step >= 0:
             self.lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(
                 self.optimizer,
-                T_max=len(self.train_dataloaders[0]) * self.config.num_epoch,
+                T_max=self._get_num_optimization_steps(self.train_dataloaders[0]),
             )
             self.warmup_scheduler = warmup.UntunedLinearWarmup(self.optimizer)
 
+        # the weights of the tags in the loss of the final prediction
+        self.tag_weight = (
+            torch.tensor([1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 2.0, 2.0, 2.0])
+            .float()
+            .to(self.config.device)
+        )
+
         if len(self.valid_dataloaders) > 1:
             return self._k_fold_train_and_evaluate(criterion)
         else:
@@ -36,20 +36,29 @@ class RefiningStrategy(nn.Module):
         self.W = nn.Linear(self.hidden_dim * 2 + self.edge_dim * 3, self.dim_e)
         # self.W = nn.Linear(self.hidden_dim * 2 + self.edge_dim * 1, self.dim_e)
 
-    def forward(self, edge, node1, node2):
-        batch, seq, seq, edge_dim = edge.shape
-        node = torch.cat([node1, node2], dim=-1)
-
-        edge_diag = (
-            torch.diagonal(edge, offset=0, dim1=1, dim2=2).permute(0, 2, 1).contiguous()
+    def forward(self, edge, node):
+        """
+        Equivalent to self.W(torch.cat([edge, edge_i, edge_j, node_j, node_i], dim=-1)) of the diagonal edges
+        and the nodes of the rows and columns, without materializing the [batch, seq, seq, 2H + 3E] concatenation:
+        the weight is split into the slices of the parts, whose row and column terms are broadcast.
+
+        :param edge: the edges, [batch, seq, seq, edge_dim]
+        :param node: the nodes, [batch, seq, hidden_dim]
+        """
+        edge_dim = edge.shape[-1]
+        W_edge, W_edge_i, W_edge_j, W_node_j, W_node_i = torch.split(
+            self.W.weight,
+            [edge_dim, edge_dim, edge_dim, self.hidden_dim, self.hidden_dim],
+            dim=1,
         )
-        edge_i = edge_diag.unsqueeze(1).expand(batch, seq, seq, edge_dim)
-        edge_j = edge_i.permute(0, 2, 1, 3).contiguous()
-        edge = self.W(torch.cat([edge, edge_i, edge_j, node], dim=-1))
 
-        # edge = self.W(torch.cat([edge, node], dim=-1))
+        edge_diag = torch.diagonal(edge, offset=0, dim1=1, dim2=2).permute(0, 2, 1)
+        # the terms of the column j, and the row i
+        col_outputs = F.linear(edge_diag, W_edge_i) + F.linear(node, W_node_j)
+        row_outputs = F.linear(edge_diag, W_edge_j) + F.linear(node, W_node_i)
 
-        return edge
+        edge = F.linear(edge, W_edge, self.W.bias)
+        return edge + col_outputs.unsqueeze(1) + row_outputs.unsqueeze(2)
 
 
 class GraphConvLayer(nn.Module):
@@ -69,29 +78,27 @@ class GraphConvLayer(nn.Module):
         )
 
     def forward(self, weight_prob_softmax, weight_adj, gcn_inputs, self_loop):
-        batch, seq, dim = gcn_inputs.shape
         weight_prob_softmax = weight_prob_softmax.permute(0, 3, 1, 2)
 
-        gcn_inputs = gcn_inputs.unsqueeze(1).expand(batch, self.edge_dim, seq, dim)
-
+        # N.B., the self loop is added to the adjacency of the caller in place
         weight_prob_softmax += self_loop
-        Ax = torch.matmul(weight_prob_softmax, gcn_inputs)
+        # the avg and sum pooling over the edge channels are linear,
+        # so they are applied to the adjacency before the matmul
         if self.pooling == "avg":
-            Ax = Ax.mean(dim=1)
-        elif self.pooling == "max":
-            Ax, _ = Ax.max(dim=1)
+            Ax = torch.matmul(weight_prob_softmax.mean(dim=1), gcn_inputs)
         elif self.pooling == "sum":
-            Ax = Ax.sum(dim=1)
+            Ax = torch.matmul(weight_prob_softmax.sum(dim=1), gcn_inputs)
+        else:
+            Ax = torch.matmul(weight_prob_softmax, gcn_inputs.unsqueeze(1))
+            if self.pooling == "max":
+                Ax, _ = Ax.max(dim=1)
         # Ax: [batch, seq, dim]
         gcn_outputs = self.W(Ax)
         gcn_outputs = self.layernorm(gcn_outputs)
         weights_gcn_outputs = F.relu(gcn_outputs)
 
         node_outputs = weights_gcn_outputs
-        weight_prob_softmax = weight_prob_softmax.permute(0, 2, 3, 1).contiguous()
-        node_outputs1 = node_outputs.unsqueeze(1).expand(batch, seq, seq, dim)
-        node_outputs2 = node_outputs1.permute(0, 2, 1, 3).contiguous()
-        edge_outputs = self.highway(weight_adj, node_outputs1, node_outputs2)
+        edge_outputs = self.highway(weight_adj, node_outputs)
 
         return node_outputs, edge_outputs
 
@@ -250,17 +257,8 @@ class EMCGCN(torch.nn.Module):
             F.softmax(word_pair_synpost_emb, dim=-1) * tensor_masks
         )
 
-        # Create identity matrix for self-loop connections
-        self_loop = []
-        for _ in range(batch):
-            self_loop.append(torch.eye(seq))
-        self_loop = (
-            torch.stack(self_loop)
-            .to(self.config.device)
-            .unsqueeze(1)
-            .expand(batch, 5 * self.config.output_dim, seq, seq)
-            * tensor_masks.permute(0, 3, 1, 2).contiguous()
-        )
+        # Create the self-loop connections of the unpadded tokens, [batch, 1, seq, seq]
+        self_loop = torch.diag_embed(masks.float()).unsqueeze(1)
 
         # Concatenate weight probabilities
         weight_prob = torch.cat(
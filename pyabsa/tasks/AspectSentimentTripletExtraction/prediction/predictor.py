@@ -258,7 +258,7 @@ class AspectSentimentTripletExtractor(InferenceModel):
                     "word_pair_synpost": word_pair_synpost,
                 }
 
-                preds = self.model(inputs)[-1]
+                preds = self._forward(inputs)[-1]
                 preds = nn.functional.softmax(preds, dim=-1)
                 preds = torch.argmax(preds, dim=3)
 
@@ -20,47 +20,42 @@ from pyabsa.utils.pyabsa_utils import fprint
 # It is hard to tokenize multilingual text, I decide to use a pretrained tokenizer, you can alter according to your demands
 # tokenizer = AutoTokenizer.from_pretrained('bert-base-multilingual-cased')
 
+_chinese_punctuation = "＃＄％＆＇（）＊＋，－／：；＜＝＞＠［＼］＾＿｀｛｜｝～｟｠｢｣､　、〃〈〉《》「」『』【】〔〕〖〗〘〙〚〛〜〝〞〟〰〾〿–—‘’‛“”„‟…‧﹏﹑﹔·！？｡。"
+_punctuation = string.punctuation + _chinese_punctuation
+
+# for non-latin Languages
+_non_latin_unicode = [
+    "\u4e00-\u9fa5",  # Chinese
+    "\u0800-\u4e00",  # Japanese
+    "\uac00-\ud7a3",  # Korean
+    "\u0e00-\u0e7f",  # Thai
+    "\u1000-\u109F",  # Myanmar
+]
+
+# the patterns are compiled once, and each text is tokenized in a single scan
+_punctuation_class = "[{}]".format(re.escape(_punctuation))
+_non_latin_class = "[{}]".format("".join(_non_latin_unicode))
+# latin text: every punctuation, or a run of characters other than whitespace and punctuation
+_latin_token_pattern = re.compile(
+    r"{}|[^\s{}]+".format(_punctuation_class, re.escape(_punctuation))
+)
+_non_latin_pattern = re.compile(_non_latin_class)
+# non-latin text: every non-latin character, a latin word (or number), or any other character except space
+_non_latin_token_pattern = re.compile(r"{}|[a-zA-Z\d]+|[^ ]".format(_non_latin_class))
+
 
 def simple_split_text(text):
     # text = ' '.join(tokenizer.tokenize(text)[1:])
     # return text
     text = text.strip()
 
-    Chinese_punctuation = "＃＄％＆＇（）＊＋，－／：；＜＝＞＠［＼］＾＿｀｛｜｝～｟｠｢｣､　、〃〈〉《》「」『』【】〔〕〖〗〘〙〚〛〜〝〞〟〰〾〿–—‘’‛“”„‟…‧﹏﹑﹔·！？｡。"
-    punctuation = string.punctuation + Chinese_punctuation
-    for p in punctuation:
-        text = text.replace("{}".format(p), " {} ".format(p))
-    # text = ' '.join(re.compile(r'\w+|[{}]'.format(re.escape(punctuation))).findall(text)).replace('$ T $', '$T$')
-
-    # for non-latin Languages
-    non_latin_unicode = [
-        "\u4e00-\u9fa5",  # Chinese
-        "\u0800-\u4e00",  # Japanese
-        "\uac00-\ud7a3",  # Korean
-        "\u0e00-\u0e7f",  # Thai
-        "\u1000-\u109F",  # Myanmar
-    ]
-    # latin_lan = ([re.match(lan, text) for lan in non_latin_unicode])
-    latin_lan = [re.findall("[{}]".format(lan), text) for lan in non_latin_unicode]
-    if not any(latin_lan):
-        return text.split()
-
-    s = text
-    word_list = []
-    while len(s) > 0:
-        match_ch = re.match("[{}]".format("".join(non_latin_unicode)), s)
-        if match_ch:
-            word = s[0:1]
-        else:
-            match_en = re.match(r"[a-zA-Z\d]+", s)
-            if match_en:
-                word = match_en.group(0)
-            else:
-                word = s[0:1]  # 若非英文单词，直接获取第一个字符
-        if word:
-            word_list.append(word)
-        #   从文本中去掉提取的 word，并去除文本收尾的空格字符
-        s = s.replace(word, "", 1).strip(" ")
+    if not _non_latin_pattern.search(text):
+        return _latin_token_pattern.findall(text)
+
+    word_list = _non_latin_token_pattern.findall(text)
+    # a leading punctuation is padded with a space, which is kept as a word
+    if text and text[0] in _punctuation:
+        word_list.insert(0, " ")
     return word_list
 
 
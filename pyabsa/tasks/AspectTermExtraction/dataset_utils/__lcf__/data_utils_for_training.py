@@ -270,6 +270,8 @@ def convert_examples_to_features(examples, max_seq_len, tokenizer, config=None):
 
     configure_spacy_model(config)
 
+    examples = examples[: config.get("data_num", None)]
+
     bos_token = tokenizer.bos_token
     eos_token = tokenizer.eos_token
     label_map = {
@@ -281,6 +283,26 @@ def convert_examples_to_features(examples, max_seq_len, tokenizer, config=None):
     config.IOB_label_to_index = label_map
     features = []
     polarities_set = set()
+
+    # a sentence is repeated for each of its aspects, so the word pieces of the words
+    # and the tokens of the sentences are memorized
+    word_pieces = {}
+    sentence_tokens = {}
+
+    def tokenize_words(words, IOB_labels):
+        tokens = []
+        labels = []
+        valid = []
+        for word, cur_iob in zip(words, IOB_labels):
+            if word not in word_pieces:
+                word_pieces[word] = tokenizer.tokenize(word)
+            token = word_pieces[word]
+            tokens.extend(token)
+            if token:
+                labels.append(cur_iob)
+                valid.extend([1] + [0] * (len(token) - 1))
+        return tokens, labels, valid
+
     for ex_index, example in enumerate(
         tqdm.tqdm(examples, desc="convert examples to features")
     ):
@@ -294,14 +316,6 @@ def convert_examples_to_features(examples, max_seq_len, tokenizer, config=None):
             or int(polarity) != LabelPaddingOption.SENTIMENT_PADDING
         ):  # bad case handle in Chinese atepc_datasets
             polarities_set.add(polarity)  # ignore samples without polarities
-        tokens = []
-        labels = []
-        valid = []
-        label_mask = []
-        enum_tokens = (
-            [bos_token] + text_tokens + [eos_token] + aspect_tokens + [eos_token]
-        )
-        IOB_label = [bos_token] + IOB_label + [eos_token] + aspect_label + [eos_token]
 
         aspect = " ".join(example.text_b)
         try:
@@ -321,43 +335,31 @@ def convert_examples_to_features(examples, max_seq_len, tokenizer, config=None):
         lcf_cdm_vec = prepared_inputs["lcf_cdm_vec"]
         lcf_cdw_vec = prepared_inputs["lcf_cdw_vec"]
 
-        for i, word in enumerate(enum_tokens):
-            token = tokenizer.tokenize(word)
-            tokens.extend(token)
-            cur_iob = IOB_label[i]
-            for m in range(len(token)):
-                if m == 0:
-                    label_mask.append(1)
-                    labels.append(cur_iob)
-                    valid.append(1)
-                else:
-                    valid.append(0)
-        tokens = tokens[0 : min(len(tokens), max_seq_len - 2)]
-        labels = labels[0 : min(len(labels), max_seq_len - 2)]
-        valid = valid[0 : min(len(valid), max_seq_len - 2)]
+        sentence_key = (tuple(text_tokens), tuple(IOB_label))
+        if sentence_key not in sentence_tokens:
+            sentence_tokens[sentence_key] = tokenize_words(
+                [bos_token] + text_tokens + [eos_token],
+                [bos_token] + IOB_label + [eos_token],
+            )
+        tokens, labels, valid = sentence_tokens[sentence_key]
+        _tokens, _labels, _valid = tokenize_words(
+            aspect_tokens + [eos_token], aspect_label + [eos_token]
+        )
+        tokens = (tokens + _tokens)[0 : max_seq_len - 2]
+        labels = (labels + _labels)[0 : max_seq_len - 2]
+        valid = (valid + _valid)[0 : max_seq_len - 2]
         # segment_ids = [0] * len(example.text_a[:]) + [1] * (max_seq_len - len([0] * len(example.text_a[:])))
         # segment_ids = segment_ids[:max_seq_len]
 
         segment_ids = [0] * max_seq_len  # simply set segment_ids to all zeros
-        label_ids = []
-
-        for i, token in enumerate(tokens):
-            if len(labels) > i:
-                label_ids.append(label_map[labels[i]])
+        label_ids = [label_map[label] for label in labels[: len(tokens)]]
 
         input_ids_spc = tokenizer.convert_tokens_to_ids(tokens)
-        input_mask = [1] * len(input_ids_spc)
-        label_mask = [1] * len(label_ids)
-        while len(input_ids_spc) < max_seq_len:
-            input_ids_spc.append(0)
-            input_mask.append(0)
-            label_ids.append(0)
-            label_mask.append(0)
-            while len(valid) < max_seq_len:
-                valid.append(1)
-        while len(label_ids) < max_seq_len:
-            label_ids.append(0)
-            label_mask.append(0)
+        input_mask = [1] * len(input_ids_spc) + [0] * (max_seq_len - len(input_ids_spc))
+        input_ids_spc += [0] * (max_seq_len - len(input_ids_spc))
+        label_mask = [1] * len(label_ids) + [0] * (max_seq_len - len(label_ids))
+        label_ids += [0] * (max_seq_len - len(label_ids))
+        valid += [1] * (max_seq_len - len(valid))
         assert len(input_ids_spc) == max_seq_len
         assert len(input_mask) == max_seq_len
         assert len(segment_ids) == max_seq_len
@@ -383,4 +385,4 @@ def convert_examples_to_features(examples, max_seq_len, tokenizer, config=None):
     check_and_fix_IOB_labels(label_map, config)
     config.output_dim = len(polarities_set)
 
-    return features[: config.get("data_num", None)]
+    return features
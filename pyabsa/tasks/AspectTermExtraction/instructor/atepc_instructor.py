@@ -9,7 +9,6 @@ import os
 import time
 
 import numpy
-import numpy as np
 import pandas
 import sklearn.metrics as metrics
 import torch
@@ -27,7 +26,6 @@ from ..dataset_utils.__lcf__.data_utils_for_training import (
     ATEPCProcessor,
     convert_examples_to_features,
 )
-from pyabsa.utils.file_utils.file_utils import save_model
 from pyabsa.utils.pyabsa_utils import print_args, init_optimizer, fprint, rprint
 
 import pytorch_warmup as warmup
@@ -247,8 +245,41 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
 
         self.model = self.config.model(self.bert_base_model, config=self.config)
 
+    def _compute_loss(self, batch, criterion):
+        (
+            input_ids_spc,
+            segment_ids,
+            input_mask,
+            label_ids,
+            polarity,
+            valid_ids,
+            l_mask,
+            lcf_cdm_vec,
+            lcf_cdw_vec,
+        ) = batch
+        loss_ate, loss_apc = self.model(
+            input_ids_spc.to(self.config.device),
+            token_type_ids=segment_ids.to(self.config.device),
+            attention_mask=input_mask.to(self.config.device),
+            labels=label_ids.to(self.config.device),
+            polarity=polarity.to(self.config.device),
+            valid_ids=valid_ids.to(self.config.device),
+            attention_mask_label=l_mask.to(self.config.device),
+            lcf_cdm_vec=lcf_cdm_vec.to(self.config.device),
+            lcf_cdw_vec=lcf_cdw_vec.to(self.config.device),
+        )
+        # for multi-gpu, average loss by gpu instance number
+        if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
+            loss_ate, loss_apc = loss_ate.mean(), loss_apc.mean()
+        ate_loss_weight = self.config.args.get("ate_loss_weight", 1.0)
+        # keep the losses of the subtasks for the progress description
+        self.loss_ate, self.loss_apc = loss_ate.detach(), loss_apc.detach()
+
+        # the optimal weight of loss may be different according to dataset
+        return loss_ate + ate_loss_weight * loss_apc
+
     def _train_and_evaluate(self, criterion):
-        losses = []
+        self.loss_tracker.reset()
 
         patience = self.config.patience + self.config.evaluate_begin
         if self.config.log_step < 0:
@@ -260,7 +291,8 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
 
         if self.config.warmup_step >= 0:
             self.lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(
-                self.optimizer, T_max=len(self.train_dataloader) * self.config.num_epoch
+                self.optimizer,
+                T_max=self._get_num_optimization_steps(self.train_dataloader),
             )
             self.warmup_scheduler = warmup.UntunedLinearWarmup(self.optimizer)
 
@@ -270,7 +302,6 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
         self.logger.info("  Num examples = %d", len(self.train_set))
         self.logger.info("  Batch size = %d", self.config.batch_size)
         self.logger.info("  Num steps = %d", self.num_train_optimization_steps)
-        sum_loss = 0
         sum_apc_test_acc = 0
         sum_apc_test_f1 = 0
         sum_ate_test_f1 = 0
@@ -297,90 +328,24 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
             patience -= 1
             for step, batch in enumerate(iterator):
                 self.model.train()
-                (
-                    input_ids_spc,
-                    segment_ids,
-                    input_mask,
-                    label_ids,
-                    polarity,
-                    valid_ids,
-                    l_mask,
-                    lcf_cdm_vec,
-                    lcf_cdw_vec,
-                ) = batch
-                input_ids_spc = input_ids_spc.to(self.config.device)
-                segment_ids = segment_ids.to(self.config.device)
-                input_mask = input_mask.to(self.config.device)
-                label_ids = label_ids.to(self.config.device)
-                polarity = polarity.to(self.config.device)
-                valid_ids = valid_ids.to(self.config.device)
-                l_mask = l_mask.to(self.config.device)
-                lcf_cdm_vec = lcf_cdm_vec.to(self.config.device)
-                lcf_cdw_vec = lcf_cdw_vec.to(self.config.device)
-                if self.config.use_amp:
-                    with torch.cuda.amp.autocast():
-                        loss_ate, loss_apc = self.model(
-                            input_ids_spc,
-                            token_type_ids=segment_ids,
-                            attention_mask=input_mask,
-                            labels=label_ids,
-                            polarity=polarity,
-                            valid_ids=valid_ids,
-                            attention_mask_label=l_mask,
-                            lcf_cdm_vec=lcf_cdm_vec,
-                            lcf_cdw_vec=lcf_cdw_vec,
-                        )
-                else:
-                    loss_ate, loss_apc = self.model(
-                        input_ids_spc,
-                        token_type_ids=segment_ids,
-                        attention_mask=input_mask,
-                        labels=label_ids,
-                        polarity=polarity,
-                        valid_ids=valid_ids,
-                        attention_mask_label=l_mask,
-                        lcf_cdm_vec=lcf_cdm_vec,
-                        lcf_cdw_vec=lcf_cdw_vec,
-                    )
-                # for multi-gpu, average loss by gpu instance number
-                if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
-                    loss_ate, loss_apc = loss_ate.mean(), loss_apc.mean()
-                ate_loss_weight = self.config.args.get("ate_loss_weight", 1.0)
+                loss = self._train_step(batch, criterion, step + 1 == len(iterator))
+                self.loss_tracker.track(loss)
 
-                loss = (
-                    loss_ate + ate_loss_weight * loss_apc
-                )  # the optimal weight of loss may be different according to dataset
-
-                sum_loss += loss.item()
-
-                losses.append(loss.item())
-
-                if self.config.use_amp and self.scaler:
-                    self.scaler.scale(loss).backward()
-                    self.scaler.step(self.optimizer)
-                    self.scaler.update()
-                else:
-                    loss.backward()
-                    self.optimizer.step()
-
-                if self.config.warmup_step >= 0:
-                    with self.warmup_scheduler.dampening():
-                        self.lr_scheduler.step()
-
-                nb_tr_examples += input_ids_spc.size(0)
+                nb_tr_examples += batch[0].size(0)
                 nb_tr_steps += 1
-                self.optimizer.zero_grad()
                 global_step += 1
                 global_step += 1
-                if global_step % self.config.log_step == 0:
+                if self.eval_scheduler.should_evaluate(
+                    global_step, step + 1 == len(iterator)
+                ):
                     if self.test_dataloader and epoch >= self.config.evaluate_begin:
                         if self.valid_set:
-                            apc_result, ate_result = self._evaluate_acc_f1(
-                                self.valid_dataloader
+                            apc_result, ate_result = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.valid_dataloader
                             )
                         else:
-                            apc_result, ate_result = self._evaluate_acc_f1(
-                                self.test_dataloader
+                            apc_result, ate_result = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.test_dataloader
                             )
                         sum_apc_test_acc += apc_result["apc_test_acc"]
                         sum_apc_test_f1 += apc_result["apc_test_f1"]
@@ -442,8 +407,8 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
                                     round(ate_result, 2),
                                 )
 
-                                save_model(
-                                    self.config, self.model, self.tokenizer, save_path
+                                self.checkpoint_writer.save(
+                                    self.model, self.tokenizer, save_path, prune=False
                                 )
 
                         current_apc_test_acc = apc_result["apc_test_acc"]
@@ -453,7 +418,7 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
                         description = "Epoch:{:>3d}| ".format(epoch)
 
                         description += "loss_apc:{:>.4f} | loss_ate:{:>.4f} |".format(
-                            loss_apc.item(), loss_ate.item()
+                            self.loss_apc.item(), self.loss_ate.item()
                         )
                         postfix = " APC_ACC: {:>.2f}(max:{:>.2f}) | APC_F1: {:>.2f}(max:{:>.2f}) | ".format(
                             current_apc_test_acc,
@@ -468,27 +433,21 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
                         iterator.set_postfix_str(postfix)
 
                     elif self.config.save_mode and epoch >= self.config.evaluate_begin:
-                        save_model(
-                            self.config,
+                        self.checkpoint_writer.save(
                             self.model,
                             self.tokenizer,
-                            save_path + "_{}/".format(loss.item()),
+                            save_path + "_{}/".format(self.loss_tracker.last_loss),
+                            prune=False,
                         )
                 else:
-                    if self.config.get("loss_display", "smooth") == "smooth":
-                        description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                            epoch, round(np.nanmean(losses), 4)
-                        )
-                    else:
-                        description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                            epoch, round(loss.item(), 4)
-                        )
-                iterator.set_description(description)
-                iterator.refresh()
+                    description = self.loss_tracker.description(epoch)
+                self.loss_tracker.refresh(iterator, description)
 
             if patience == 0:
                 break
 
+        self.checkpoint_writer.close()
+
         apc_result, ate_result = self._evaluate_acc_f1(self.test_dataloader)
 
         if self.valid_set and self.test_set:
@@ -553,7 +512,7 @@ class ATEPCTrainingInstructor(BaseTrainingInstructor):
         # self.logger.info(self.config.MV.short_summary(no_print=True))
 
         rolling_intv = 5
-        df = pandas.DataFrame(losses)
+        df = pandas.DataFrame(self.loss_tracker.losses)
         losses = list(
             numpy.hstack(df.rolling(rolling_intv, min_periods=1).mean().values)
         )
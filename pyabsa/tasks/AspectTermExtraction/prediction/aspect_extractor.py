@@ -5,13 +5,16 @@
 # github: https://github.com/yangheng95
 # Copyright (C) 2021. All Rights Reserved.
 
+import itertools
 import os
 import pickle
+import queue
+import threading
 
 import json
 from collections import OrderedDict
 from pathlib import Path
-from typing import Union, List
+from typing import Union, List, Iterable
 
 import numpy as np
 import torch
@@ -21,7 +24,7 @@ from findfile import find_file, find_cwd_dir
 from pyabsa.utils.data_utils.dataset_manager import detect_infer_dataset
 from termcolor import colored
 from torch.utils.data import DataLoader, SequentialSampler, TensorDataset
-from transformers import AutoTokenizer, AutoModel
+from transformers import AutoTokenizer
 
 from pyabsa.framework.flag_class.flag_template import (
     LabelPaddingOption,
@@ -41,6 +44,10 @@ from ..dataset_utils.__lcf__.data_utils_for_inference import (
 )
 from ..dataset_utils.__lcf__.data_utils_for_training import split_aspect
 from pyabsa.utils.data_utils.dataset_item import DatasetItem
+from pyabsa.utils.model_utils.model_utils import (
+    build_model_from_state_dict,
+    build_pretrained_skeleton,
+)
 from pyabsa.utils.pyabsa_utils import set_device, print_args, fprint
 
 
@@ -88,22 +95,14 @@ class AspectExtractor(InferenceModel):
 
                 if state_dict_path or model_path:
                     if state_dict_path:
-                        if kwargs.get("offline", False):
-                            self.bert = AutoModel.from_pretrained(
-                                find_cwd_dir(
-                                    self.config.pretrained_bert.split("/")[-1]
+                        self.model = build_model_from_state_dict(
+                            lambda: self.config.model(
+                                build_pretrained_skeleton(
+                                    self.config, offline=kwargs.get("offline", False)
                                 ),
-                            )
-                        else:
-                            self.bert = AutoModel.from_pretrained(
-                                self.config.pretrained_bert,
-                            )
-
-                        self.model = self.config.model(self.bert, self.config)
-                        self.model.load_state_dict(
-                            torch.load(
-                                state_dict_path, map_location=DeviceTypeOption.CPU
-                            )
+                                self.config,
+                            ),
+                            state_dict_path,
                         )
                     elif model_path:
                         self.model = torch.load(
@@ -141,6 +140,8 @@ class AspectExtractor(InferenceModel):
                 )
 
         self.processor = ATEPCProcessor(self.tokenizer)
+        # the tokenizer is shared by the extraction and the featurization thread of stream_predict()
+        self._featurize_lock = threading.Lock()
         self.num_labels = len(self.config.label_list) + 1
 
         if kwargs.get("verbose", False):
@@ -286,9 +287,6 @@ class AspectExtractor(InferenceModel):
         Returns:
         """
 
-        self.config.eval_batch_size = kwargs.get("eval_batch_size", 32)
-
-        results = {"extraction_res": OrderedDict(), "polarity_res": OrderedDict()}
         if isinstance(target_file, DatasetItem) or isinstance(target_file, str):
             # using integrated inference dataset
             inference_set = detect_infer_dataset(
@@ -305,13 +303,15 @@ class AspectExtractor(InferenceModel):
             )
 
         if target_file:
-            extraction_res, sentence_res = self._extract(target_file)
-            results["extraction_res"] = extraction_res
-            if pred_sentiment:
-                results["polarity_res"] = self._run_prediction(
-                    results["extraction_res"]
-                )
-            results = self.merge_result(sentence_res, results)
+            results = self._cached_predict(
+                target_file,
+                lambda examples: list(
+                    self.stream_predict(
+                        examples, pred_sentiment=pred_sentiment, **kwargs
+                    )
+                ),
+                pred_sentiment=pred_sentiment,
+            )
             if save_result:
                 save_path = os.path.join(
                     os.getcwd(),
@@ -368,20 +368,105 @@ class AspectExtractor(InferenceModel):
 
             return results
 
+    def stream_predict(
+        self,
+        target_file: Union[List[Path], list, str, Iterable],
+        pred_sentiment=True,
+        **kwargs
+    ):
+        """
+        Extract aspects and predict their sentiments chunk by chunk, and yield the result of each example as soon as
+        its chunk is done, so the inputs larger than the memory (e.g., an opened file) can be processed.
+        While a chunk is being extracted, the features of the previous chunk are built for polarity classification
+        in a worker thread, and then classified.
+        Args:
+            target_file (Iterable): an iterable of input examples or a list of files to be predicted
+            pred_sentiment (bool, optional): predict sentiment. Defaults to True.
+            chunk_size (int, optional): number of examples in each chunk. Defaults to 1024.
+            eval_batch_size (int, optional): batch size of inference. Defaults to 32.
+        Returns:
+            a generator of the results of the input examples, in the input order
+        """
+        self.config.eval_batch_size = kwargs.get("eval_batch_size", 32)
+        chunk_size = kwargs.get("chunk_size", 1024)
+
+        if isinstance(target_file, DatasetItem) or isinstance(target_file, str):
+            # using integrated inference dataset
+            inference_set = detect_infer_dataset(
+                target_file, task_code=TaskCodeOption.Aspect_Polarity_Classification
+            )
+            target_file = load_atepc_inference_datasets(inference_set)
+
+        examples = iter(target_file)
+        chunks = iter(lambda: list(itertools.islice(examples, chunk_size)), [])
+
+        if not pred_sentiment:
+            for chunk in chunks:
+                extraction_res, sentence_res = self._extract(chunk)
+                yield from self.merge_result(
+                    sentence_res,
+                    {"extraction_res": extraction_res, "polarity_res": OrderedDict()},
+                )
+            return
+
+        extraction_queue = queue.Queue(maxsize=1)
+        feature_queue = queue.Queue()
+
+        def featurize():
+            while True:
+                extraction = extraction_queue.get()
+                if extraction is None:
+                    return
+                try:
+                    features = self._prepare_classification_features(extraction[0])
+                except Exception as e:
+                    features = e
+                feature_queue.put((extraction, features))
+
+        def classify_and_merge():
+            (extraction_res, sentence_res), features = feature_queue.get()
+            if isinstance(features, Exception):
+                raise features
+            return self.merge_result(
+                sentence_res,
+                {
+                    "extraction_res": extraction_res,
+                    "polarity_res": self._classify(features),
+                },
+            )
+
+        worker = threading.Thread(target=featurize, daemon=True)
+        worker.start()
+        num_pending = 0
+        try:
+            for chunk in chunks:
+                extraction_queue.put(self._extract(chunk))
+                num_pending += 1
+                # classify the previous chunk after the current chunk is extracted
+                if num_pending > 1:
+                    num_pending -= 1
+                    yield from classify_and_merge()
+            while num_pending:
+                num_pending -= 1
+                yield from classify_and_merge()
+        finally:
+            extraction_queue.put(None)
+
     # Temporal code, pending configimization
     def _extract(self, examples):
         sentence_res = []  # extraction result by sentence
         extraction_res = []  # extraction result flatten by aspect
 
         self.infer_dataloader = None
-        examples = self.processor.get_examples_for_aspect_extraction(examples)
-        infer_features = convert_ate_examples_to_features(
-            examples,
-            self.config.label_list,
-            self.config.max_seq_len,
-            self.tokenizer,
-            self.config,
-        )
+        with self._featurize_lock:
+            examples = self.processor.get_examples_for_aspect_extraction(examples)
+            infer_features = convert_ate_examples_to_features(
+                examples,
+                self.config.label_list,
+                self.config.max_seq_len,
+                self.tokenizer,
+                self.config,
+            )
         all_spc_input_ids = torch.tensor(
             [f.input_ids_spc for f in infer_features], dtype=torch.long
         )
@@ -450,7 +535,7 @@ class AspectExtractor(InferenceModel):
             valid_ids = valid_ids.to(self.config.device)
             l_mask = l_mask.to(self.config.device)
             with torch.no_grad():
-                ate_logits, apc_logits = self.model(
+                ate_logits, apc_logits = self._forward(
                     input_ids_spc,
                     token_type_ids=segment_ids,
                     attention_mask=input_mask,
@@ -533,19 +618,23 @@ class AspectExtractor(InferenceModel):
         return extraction_res, sentence_res
 
     def _run_prediction(self, examples):
-        res = []  # sentiment classification result
+        return self._classify(self._prepare_classification_features(examples))
+
+    def _prepare_classification_features(self, examples):
         # ate example id map to apc example id
         example_id_map = dict([(apc_id, ex[3]) for apc_id, ex in enumerate(examples)])
 
-        self.infer_dataloader = None
-        examples = self.processor.get_examples_for_sentiment_classification(examples)
-        infer_features = convert_apc_examples_to_features(
-            examples,
-            self.config.label_list,
-            self.config.max_seq_len,
-            self.tokenizer,
-            self.config,
-        )
+        with self._featurize_lock:
+            examples = self.processor.get_examples_for_sentiment_classification(
+                examples
+            )
+            infer_features = convert_apc_examples_to_features(
+                examples,
+                self.config.label_list,
+                self.config.max_seq_len,
+                self.tokenizer,
+                self.config,
+            )
         all_spc_input_ids = torch.tensor(
             [f.input_ids_spc for f in infer_features], dtype=torch.long
         )
@@ -583,6 +672,13 @@ class AspectExtractor(InferenceModel):
             lcf_cdm_vec,
             lcf_cdw_vec,
         )
+        return infer_data, all_tokens, all_aspects, all_positions, example_id_map
+
+    def _classify(self, features):
+        res = []  # sentiment classification result
+        infer_data, all_tokens, all_aspects, all_positions, example_id_map = features
+
+        self.infer_dataloader = None
         # Run prediction for full raw_data
         self.model.config.use_bert_spc = True
 
@@ -622,7 +718,7 @@ class AspectExtractor(InferenceModel):
             lcf_cdm_vec = lcf_cdm_vec.to(self.config.device)
             lcf_cdw_vec = lcf_cdw_vec.to(self.config.device)
             with torch.no_grad():
-                ate_logits, apc_logits = self.model(
+                ate_logits, apc_logits = self._forward(
                     input_ids_spc,
                     token_type_ids=segment_ids,
                     attention_mask=input_mask,
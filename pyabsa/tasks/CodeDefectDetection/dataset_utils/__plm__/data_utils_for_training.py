@@ -7,7 +7,9 @@
 # ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
 # Copyright (C) 2022. All Rights Reserved.
 import random
+from collections import Counter
 
+import torch
 import tqdm
 from pyabsa.framework.tokenizer_class.tokenizer_class import pad_and_truncate
 
@@ -18,6 +20,19 @@ from pyabsa.utils.pyabsa_utils import check_and_fix_labels, fprint
 
 
 class BERTCDDDataset(PyABSADataset):
+    """
+    The dataset keeps the unique windows of the natural examples only. In the training set, the windows of
+    the defective examples are over-sampled by their sampling weights (the over_sampling option, see
+    get_sample_weights()), and the noise_instance_num corrupted copies of them are generated on the fly
+    in __getitem__(), so the memory does not grow with these options and the corruptions are fresh at each epoch.
+    """
+
+    # the (ex_id, window) of the windows to corrupt, and the code of their examples
+    corrupt_windows = []
+    corrupt_sources = {}
+    noise_instance_num = 0
+    sample_weights = []
+
     def load_data_from_dict(self, dataset_dict, **kwargs):
         pass
 
@@ -31,89 +46,76 @@ class BERTCDDDataset(PyABSADataset):
             self.config.get("remove_comments", True),
             tokenizer=self.tokenizer,
         )
+        # the examples are parsed once, and shared by the natural and the corrupted examples
+        parsed_examples = []
+        for line in natural_examples:
+            code_src, label = line.strip().split("$LABEL$")
+            if "$FEATURE$" in code_src:
+                code_src, feature = code_src.split("$FEATURE$")
+            parsed_examples.append((code_src, label))
 
         all_data = []
+        sample_weights = []
+        corrupt_windows = []
+        corrupt_sources = {}
+        if self.dataset_type == "train":
+            noise_instance_num = self.config.get("noise_instance_num", 0)
+        else:
+            noise_instance_num = 0
 
         label_set = set()
         c_label_set = set()
+        code_len_sum = 0
 
-        for ex_id, line in enumerate(
-            tqdm.tqdm(natural_examples, desc="preparing dataloader")
+        for ex_id, (code_src, label) in enumerate(
+            tqdm.tqdm(parsed_examples, desc="preparing dataloader")
         ):
-            code_src, label = line.strip().split("$LABEL$")
-            if "$FEATURE$" in code_src:
-                code_src, feature = code_src.split("$FEATURE$")
-            # print(len(self.tokenizer.tokenize(code_src.replace('\n', ''))))
-
             code_ids = self.tokenizer.text_to_sequence(
                 code_src,
                 max_length=self.config.max_seq_len,
                 padding="do_not_pad",
                 truncation=False,
             )
+            # the length of the code without the special tokens
+            code_len_sum += len(code_ids) - 2
             if self.dataset_type == "train" and label == "1":
                 over_sampling = self.config.get("over_sampling", 2)
             else:
                 over_sampling = 1
 
-            for _ in range(over_sampling):
-                code_ids = self.prepare_token_ids(
-                    code_ids, self.config.get("sliding_window", False)
+            code_ids = self.prepare_token_ids(
+                code_ids, self.config.get("sliding_window", False)
+            )
+            for window, ids in enumerate(code_ids):
+                all_data.append(
+                    {
+                        "ex_id": ex_id,
+                        # "code": code_src,
+                        "source_ids": ids,
+                        "label": label,
+                        "corrupt_label": 0,
+                    }
                 )
-                for ids in code_ids:
-                    all_data.append(
-                        {
-                            "ex_id": ex_id,
-                            # "code": code_src,
-                            "source_ids": ids,
-                            "label": label,
-                            "corrupt_label": 0,
-                        }
-                    )
-                    label_set.add(label)
-                    c_label_set.add(0)
-
-        if self.dataset_type == "train":
-            corrupt_examples = read_defect_examples(
-                lines,
-                self.config.get("data_num", None),
-                self.config.get("remove_comments", True),
+                sample_weights.append(over_sampling)
+                label_set.add(label)
+                c_label_set.add(0)
+                if noise_instance_num and label != "0":
+                    corrupt_windows.append((ex_id, window))
+                    corrupt_sources[ex_id] = code_src
+
+        if parsed_examples:
+            fprint(
+                "Average code length: {}".format(code_len_sum / len(parsed_examples))
             )
 
-            for _ in range(self.config.get("noise_instance_num", 0)):
-                for ex_id, line in enumerate(
-                    tqdm.tqdm(
-                        corrupt_examples,
-                        desc="preparing corrupted code dataloader for training set",
-                    )
-                ):
-                    code_src, label = line.strip().split("$LABEL$")
-                    if label == "0":
-                        continue
-                    if "$FEATURE$" in code_src:
-                        code_src, feature = code_src.split("$FEATURE$")
-                    code_src = _prepare_corrupt_code(code_src)
-                    corrupt_code_ids = self.tokenizer.text_to_sequence(
-                        code_src,
-                        max_length=self.config.max_seq_len,
-                        padding="do_not_pad",
-                        truncation=False,
-                    )
-                    corrupt_code_ids = self.prepare_token_ids(
-                        corrupt_code_ids, self.config.get("sliding_window", False)
-                    )
-                    for ids in corrupt_code_ids:
-                        all_data.append(
-                            {
-                                "ex_id": ex_id,
-                                # "code": code_src,
-                                "source_ids": ids,
-                                "label": "-100",
-                                "corrupt_label": 1,
-                            }
-                        )
-                        label_set.add("-100")
-                        c_label_set.add(1)
+        if corrupt_windows:
+            label_set.add("-100")
+            c_label_set.add(1)
+
+        self.sample_weights = sample_weights
+        self.corrupt_windows = corrupt_windows
+        self.corrupt_sources = corrupt_sources
+        self.noise_instance_num = noise_instance_num
 
         check_and_fix_labels(label_set, "label", all_data, self.config)
         self.config.output_dim = len(label_set)
@@ -170,9 +172,53 @@ class BERTCDDDataset(PyABSADataset):
 
     def __init__(self, config, tokenizer, dataset_type="train", **kwargs):
         super().__init__(config, tokenizer, dataset_type, **kwargs)
+        # the data may be truncated by the data_num option, so are the sampling weights
+        # and the windows to corrupt of the data
+        self.sample_weights = self.sample_weights[: len(self.data)]
+        num_windows = Counter(int(data["ex_id"]) for data in self.data)
+        self.corrupt_windows = [
+            (ex_id, window)
+            for ex_id, window in self.corrupt_windows
+            if window < num_windows[ex_id]
+        ]
+
+    def _corrupt_item(self, index):
+        ex_id, window = self.corrupt_windows[index % len(self.corrupt_windows)]
+        # the seed is drawn from the torch random state, which is seeded by the trainer and,
+        # in the DataLoader workers, by the DataLoader, so the corruptions differ at each epoch
+        rng = random.Random(torch.randint(0, 2**31, (1,)).item())
+        code_src = _prepare_corrupt_code(self.corrupt_sources[ex_id], rng)
+        code_ids = self.tokenizer.text_to_sequence(
+            code_src,
+            max_length=self.config.max_seq_len,
+            padding="do_not_pad",
+            truncation=False,
+        )
+        code_ids = self.prepare_token_ids(
+            code_ids, self.config.get("sliding_window", False)
+        )
+        return {
+            "ex_id": torch.tensor(ex_id),
+            "source_ids": torch.tensor(code_ids[min(window, len(code_ids) - 1)]),
+            "label": torch.tensor(self.config.label_to_index["-100"]),
+            "corrupt_label": torch.tensor(1),
+        }
+
+    def get_labels(self):
+        return super().get_labels() + [self.config.label_to_index["-100"]] * (
+            len(self) - len(self.data)
+        )
+
+    def get_sample_weights(self):
+        if all(weight == 1 for weight in self.sample_weights):
+            return None
+        # the corrupted windows are sampled once per epoch
+        return self.sample_weights + [1] * (len(self) - len(self.data))
 
     def __getitem__(self, index):
-        return self.data[index]
+        if index < len(self.data):
+            return self.data[index]
+        return self._corrupt_item(index - len(self.data))
 
     def __len__(self):
-        return len(self.data)
+        return len(self.data) + len(self.corrupt_windows) * self.noise_instance_num
@@ -42,18 +42,20 @@ class CodeLineIterator(list):
         return "\n".join(self.lines)
 
 
-def random_indices(source, percentage):
+def random_indices(source, percentage, rng=random):
+    """
+    Sample the indices of the whitespace-separated tokens of the source.
+
+    :param source: the code string
+    :param percentage: the percentage of the tokens to sample
+    :param rng: the random number generator, e.g., a seeded random.Random
+    :return: the set of the sampled indices
+    """
     assert 0 <= percentage <= 1
     tokens = source.split()
-    ids = list(
-        set(
-            [
-                random.randint(0, len(tokens) - 1)
-                for _ in range(int(len(tokens) * percentage))
-            ]
-        )
-    )
-    return ids
+    return {
+        rng.randint(0, len(tokens) - 1) for _ in range(int(len(tokens) * percentage))
+    }
 
 
 def _switch_token(tokens: list, ids: list):
@@ -63,44 +65,46 @@ def _switch_token(tokens: list, ids: list):
     return tokens
 
 
-def _replace_token(tokens: list, ids: list):
+def _replace_token(tokens: list, ids: set, rng=random):
     for idx in ids:
-        tokens[idx] = tokens[random.randint(0, len(tokens) - 1)]
+        tokens[idx] = tokens[rng.randint(0, len(tokens) - 1)]
     return tokens
 
 
-def _delete_token(tokens: list, ids: list):
-    _tokens = []
-    for idx, token in enumerate(tokens):
-        if idx in ids:
-            continue
-        _tokens.append(tokens[idx])
-    return tokens
+def _delete_token(tokens: list, ids: set):
+    return [token for idx, token in enumerate(tokens) if idx not in ids]
 
 
-def _add_token(tokens: list, ids: list):
+def _add_token(tokens: list, ids: set, rng=random):
     _tokens = []
     for idx, token in enumerate(tokens):
         if idx in ids:
-            _tokens.append(tokens[random.randint(0, len(tokens) - 1)])
-        _tokens.append(tokens[idx])
-    return tokens
+            _tokens.append(tokens[rng.randint(0, len(tokens) - 1)])
+        _tokens.append(token)
+    return _tokens
 
 
-def _prepare_corrupt_code(code_src):
+def _prepare_corrupt_code(code_src, rng=random):
+    """
+    Corrupt the code by replacing, deleting and adding random tokens.
+
+    :param code_src: the code string
+    :param rng: the random number generator, e.g., a seeded random.Random, so that the corruption is reproducible
+    :return: the corrupted code string
+    """
     # perform obfuscation
 
     # perform noising
     code_tokens = code_src.split()
 
-    replace_ids = random_indices(code_src, random.random() / 10)
-    code_tokens = _replace_token(code_tokens, replace_ids)
+    replace_ids = random_indices(code_src, rng.random() / 10, rng)
+    code_tokens = _replace_token(code_tokens, replace_ids, rng)
 
-    deletion_ids = random_indices(code_src, random.random() / 10)
+    deletion_ids = random_indices(code_src, rng.random() / 10, rng)
     code_tokens = _delete_token(code_tokens, deletion_ids)
 
-    addition_ids = random_indices(code_src, random.random() / 10)
-    code_tokens = _add_token(code_tokens, addition_ids)
+    addition_ids = random_indices(code_src, rng.random() / 10, rng)
+    code_tokens = _add_token(code_tokens, addition_ids, rng)
 
     corrupt_code_src = "\n".join(code_tokens)
 
@@ -111,6 +115,14 @@ def _prepare_corrupt_code(code_src):
     return corrupt_code_src
 
 
+# the string and char literals, the block comments and the line comments (with their line breaks)
+_COMMENT_PATTERN = re.compile(
+    r"""("(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')|/\*.*?\*/\n?|//[^\n]*\n?""",
+    re.DOTALL,
+)
+_BLANK_LINES_PATTERN = re.compile(r"\n\s*\n")
+
+
 def remove_comment(code_str, tokenizer=None):
     """
     Remove comments from code string,
@@ -118,29 +130,9 @@ def remove_comment(code_str, tokenizer=None):
     :param tokenizer: tokenizer if passed, will add <mask> token to the code
     """
 
-    code = code_str
-
-    # # Regular expression pattern to match single-line comments
-    # single_line_comment_pattern = r"(?m)//.*$"
-    #
-    # # Regular expression pattern to match multi-line comments
-    # multi_line_comment_pattern = r"(?s)/\*.*?\*/"
-    #
-    # # Replace single-line and multi-line comments with an empty string
-    # no_comments = re.sub(single_line_comment_pattern, "", code)
-    # no_comments = re.sub(multi_line_comment_pattern, "", no_comments)
-    # for s in re.findall(r"\n[\s]*\n", no_comments, re.DOTALL):
-    #     no_comments = no_comments.replace(s, "\n")
-    # return no_comments
-
-    for s in re.findall(r"/\*.*?\*/\n", code, re.DOTALL):
-        code = code.replace(s, "")
-    for s in re.findall(r"//.*\n", code):
-        code = code.replace(s, "")
-    for s in re.findall(r"/\n", code):
-        code = code.replace(s, "")
-    for s in re.findall(r"\n[\s]*\n", code, re.DOTALL):
-        code = code.replace(s, "\n")
+    # the literals are matched before the comments, so that the comment markers in the literals are kept
+    code = _COMMENT_PATTERN.sub(lambda match: match.group(1) or "", code_str)
+    code = _BLANK_LINES_PATTERN.sub("\n", code)
 
     if tokenizer:
         # add <mask> noise
@@ -159,16 +151,21 @@ def remove_comment(code_str, tokenizer=None):
 
 
 def read_defect_examples(lines, data_num, remove_comments=True, tokenizer=None):
-    """Read examples from filename."""
+    """
+    Read examples from the lines of a dataset file, the examples are not tokenized.
+
+    :param lines: the json lines, each line has the "func" and "target" (and optionally "feature") fields
+    :param data_num: the maximum number of the examples, None for all
+    :param remove_comments: whether to remove the comments of the code
+    :param tokenizer: the tokenizer passed to remove_comment()
+    :return: the list of the examples, i.e., code$FEATURE$feature$LABEL$target (or code$LABEL$target)
+    """
     examples = []
-    token_len_sum = 0
     for idx, line in enumerate(lines):
         js = json.loads(line)
         code = js["func"]
         if remove_comments:
             code = remove_comment(code, tokenizer)
-        if tokenizer:
-            token_len_sum += len(tokenizer.tokenize(code))
         try:
             examples.append(
                 code + "$FEATURE$" + str(js["feature"]) + "$LABEL$" + str(js["target"])
@@ -177,8 +174,6 @@ def read_defect_examples(lines, data_num, remove_comments=True, tokenizer=None):
             examples.append(code + "$LABEL$" + str(js["target"]))
         if idx + 1 == data_num:
             break
-    if tokenizer:
-        print("Average code length: ", token_len_sum / len(examples))
     return examples
 
 
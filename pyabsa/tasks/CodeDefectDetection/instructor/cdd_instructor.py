@@ -7,7 +7,6 @@
 
 import os
 import random
-import shutil
 import time
 
 import numpy as np
@@ -20,6 +19,7 @@ from tqdm import tqdm
 
 from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
 from pyabsa.framework.instructor_class.instructor_template import BaseTrainingInstructor
+from pyabsa.utils.model_utils.model_utils import unwrap_compiled_model
 from ..dataset_utils.__classic__.data_utils_for_training import GloVeCDDDataset
 from ..dataset_utils.__plm__.data_utils_for_training import BERTCDDDataset
 from ..models import GloVeCDDModelList, BERTCDDModelList
@@ -147,10 +147,27 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
 
     def reload_model(self, ckpt="./init_state_dict.bin"):
         if os.path.exists(ckpt):
-            self.model.load_state_dict(
+            unwrap_compiled_model(self.model).load_state_dict(
                 torch.load(find_file(ckpt, or_key=[".bin", "state_dict"]))
             )
 
+    def _compute_loss(self, sample_batched, criterion):
+        inputs = [
+            sample_batched[col].to(self.config.device)
+            for col in self.config.inputs_cols
+        ]
+        outputs = self.model(inputs)
+        targets = sample_batched["label"].to(self.config.device)
+
+        if isinstance(outputs, dict) and "loss" in outputs:
+            loss = outputs["loss"]
+        else:
+            loss = criterion(outputs, targets)
+
+        if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
+            loss = loss.mean()
+        return loss
+
     def _train_and_evaluate(self, criterion):
         global_step = 0
         max_fold_acc = 0
@@ -162,7 +179,7 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
             self.config.dataset_name,
         )
 
-        losses = []
+        self.loss_tracker.reset()
 
         self.config.metrics_of_this_checkpoint = {"acc": 0, "f1": 0}
         self.config.max_test_metrics = {"max_test_acc": 0, "max_test_f1": 0}
@@ -198,53 +215,25 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
             iterator = tqdm(self.train_dataloaders[0], desc=description)
             for i_batch, sample_batched in enumerate(iterator):
                 global_step += 1
-                # switch model to train mode, clear gradient accumulators
+                # switch model to train mode
                 self.model.train()
-                self.optimizer.zero_grad()
-                inputs = [
-                    sample_batched[col].to(self.config.device)
-                    for col in self.config.inputs_cols
-                ]
-                if self.config.use_amp:
-                    with torch.cuda.amp.autocast():
-                        outputs = self.model(inputs)
-                else:
-                    outputs = self.model(inputs)
-
-                targets = sample_batched["label"].to(self.config.device)
-
-                if isinstance(outputs, dict) and "loss" in outputs:
-                    loss = outputs["loss"]
-                else:
-                    loss = criterion(outputs, targets)
-
-                if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
-                    loss = loss.mean()
-
-                losses.append(loss.item())
-
-                if self.scaler:
-                    self.scaler.scale(loss).backward()
-                    self.scaler.step(self.optimizer)
-                    self.scaler.update()
-                else:
-                    loss.backward()
-                    self.optimizer.step()
-
-                if self.config.warmup_step >= 0:
-                    with self.warmup_scheduler.dampening():
-                        self.lr_scheduler.step()
+                loss = self._train_step(
+                    sample_batched, criterion, i_batch + 1 == len(iterator)
+                )
+                self.loss_tracker.track(loss)
 
                 # evaluate if test set is available
-                if global_step % self.config.log_step == 0:
+                if self.eval_scheduler.should_evaluate(
+                    global_step, i_batch + 1 == len(iterator)
+                ):
                     if self.test_dataloader and epoch >= self.config.evaluate_begin:
                         if self.valid_dataloader:
-                            test_acc, f1, auc = self._evaluate_acc_f1(
-                                self.valid_dataloader
+                            test_acc, f1, auc = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.valid_dataloader
                             )
                         else:
-                            test_acc, f1, auc = self._evaluate_acc_f1(
-                                self.test_dataloader
+                            test_acc, f1, auc = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.test_dataloader
                             )
 
                         self.config.metrics_of_this_checkpoint["acc"] = test_acc
@@ -262,13 +251,6 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
                             if self.config.model_path_to_save:
                                 if not os.path.exists(self.config.model_path_to_save):
                                     os.makedirs(self.config.model_path_to_save)
-                                if save_path:
-                                    try:
-                                        shutil.rmtree(save_path)
-                                        # logger.info('Remove sub-optimal trained model:', save_path)
-                                    except:
-                                        # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                        pass
                                 save_path = "{0}/{1}_{2}_{3}_acc_{4}_f1_{5}/".format(
                                     self.config.model_path_to_save,
                                     self.config.model_name,
@@ -288,8 +270,8 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
                                 if f1 > self.config.max_test_metrics["max_test_f1"]:
                                     self.config.max_test_metrics["max_test_f1"] = f1
 
-                                save_model(
-                                    self.config, self.model, self.tokenizer, save_path
+                                self.checkpoint_writer.save(
+                                    self.model, self.tokenizer, save_path
                                 )
 
                         postfix = "Dev Acc:{:>.2f}(max:{:>.2f}) Dev F1:{:>.2f}(max:{:>.2f})".format(
@@ -300,27 +282,21 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
                         )
                         iterator.set_postfix_str(postfix)
                     elif self.config.save_mode and epoch >= self.config.evaluate_begin:
-                        save_model(
-                            self.config,
+                        self.checkpoint_writer.save(
                             self.model,
                             self.tokenizer,
-                            save_path + "_{}/".format(loss.item()),
+                            save_path + "_{}/".format(self.loss_tracker.last_loss),
+                            prune=False,
                         )
                 else:
-                    if self.config.get("loss_display", "smooth") == "smooth":
-                        description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                            epoch, round(np.nanmean(losses), 4)
-                        )
-                    else:
-                        description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                            epoch, round(loss.item(), 4)
-                        )
+                    description = self.loss_tracker.description(epoch)
 
-                iterator.set_description(description)
-                iterator.refresh()
+                self.loss_tracker.refresh(iterator, description)
             if patience == 0:
                 break
 
+        self.checkpoint_writer.close()
+
         if not self.valid_dataloader:
             self.config.MV.log_metric(
                 self.config.model_name
@@ -414,7 +390,7 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
         self.config.metrics_of_this_checkpoint = {"acc": 0, "f1": 0}
         self.config.max_test_metrics = {"max_test_acc": 0, "max_test_f1": 0}
 
-        losses = []
+        self.loss_tracker.reset()
 
         for f, (train_dataloader, valid_dataloader) in enumerate(
             zip(self.train_dataloaders, self.valid_dataloaders)
@@ -456,53 +432,29 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
                 self.config.model_name,
                 self.config.dataset_name,
             )
+            # the best checkpoints of each fold are retained, see CheckpointWriter.reset()
+            self.checkpoint_writer.reset()
             for epoch in range(self.config.num_epoch):
                 patience -= 1
                 description = "Epoch:{} | Loss:{}".format(epoch, 0)
                 iterator = tqdm(train_dataloader, desc=description)
                 for i_batch, sample_batched in enumerate(iterator):
                     global_step += 1
-                    # switch model to train mode, clear gradient accumulators
+                    # switch model to train mode
                     self.model.train()
-                    self.optimizer.zero_grad()
-                    inputs = [
-                        sample_batched[col].to(self.config.device)
-                        for col in self.config.inputs_cols
-                    ]
-                    with torch.cuda.amp.autocast():
-                        if self.config.use_amp:
-                            with torch.cuda.amp.autocast():
-                                outputs = self.model(inputs)
-                        else:
-                            outputs = self.model(inputs)
-
-                    targets = sample_batched["label"].to(self.config.device)
-
-                    if isinstance(outputs, dict) and "loss" in outputs:
-                        loss = outputs["loss"]
-                    else:
-                        loss = criterion(outputs, targets)
-                    if self.config.auto_device == DeviceTypeOption.ALL_CUDA:
-                        loss = loss.mean()
-
-                    losses.append(loss.item())
-
-                    if self.config.use_amp and self.scaler:
-                        self.scaler.scale(loss).backward()
-                        self.scaler.step(self.optimizer)
-                        self.scaler.update()
-                    else:
-                        loss.backward()
-                        self.optimizer.step()
-
-                    if self.config.warmup_step >= 0:
-                        with self.warmup_scheduler.dampening():
-                            self.lr_scheduler.step()
+                    loss = self._train_step(
+                        sample_batched, criterion, i_batch + 1 == len(iterator)
+                    )
+                    self.loss_tracker.track(loss)
 
                     # evaluate if test set is available
-                    if global_step % self.config.log_step == 0:
+                    if self.eval_scheduler.should_evaluate(
+                        global_step, i_batch + 1 == len(iterator)
+                    ):
                         if self.test_dataloader and epoch >= self.config.evaluate_begin:
-                            test_acc, f1, auc = self._evaluate_acc_f1(valid_dataloader)
+                            test_acc, f1, auc = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, valid_dataloader
+                            )
 
                             self.config.metrics_of_this_checkpoint["acc"] = test_acc
                             self.config.metrics_of_this_checkpoint["f1"] = f1
@@ -521,13 +473,6 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
                                         self.config.model_path_to_save
                                     ):
                                         os.makedirs(self.config.model_path_to_save)
-                                    if save_path:
-                                        try:
-                                            shutil.rmtree(save_path)
-                                            # logger.info('Remove sub-optimal trained model:', save_path)
-                                        except:
-                                            # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                            pass
                                     save_path = (
                                         "{0}/{1}_{2}_{3}_acc_{4}_f1_{5}/".format(
                                             self.config.model_path_to_save,
@@ -549,11 +494,8 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
                                     if f1 > self.config.max_test_metrics["max_test_f1"]:
                                         self.config.max_test_metrics["max_test_f1"] = f1
 
-                                    save_model(
-                                        self.config,
-                                        self.model,
-                                        self.tokenizer,
-                                        save_path,
+                                    self.checkpoint_writer.save(
+                                        self.model, self.tokenizer, save_path
                                     )
 
                             postfix = "Dev Acc:{:>.2f}(max:{:>.2f}) Dev F1:{:>.2f}(max:{:>.2f})".format(
@@ -567,27 +509,21 @@ class CDDTrainingInstructor(BaseTrainingInstructor):
                             self.config.save_mode
                             and epoch >= self.config.evaluate_begin
                         ):
-                            save_model(
-                                self.config,
+                            self.checkpoint_writer.save(
                                 self.model,
                                 self.tokenizer,
-                                save_path + "_{}/".format(loss.item()),
+                                save_path + "_{}/".format(self.loss_tracker.last_loss),
+                                prune=False,
                             )
                     else:
-                        if self.config.get("loss_display", "smooth") == "smooth":
-                            description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                                epoch, round(np.nanmean(losses), 4)
-                            )
-                        else:
-                            description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                                epoch, round(loss.item(), 4)
-                            )
+                        description = self.loss_tracker.description(epoch)
 
-                    iterator.set_description(description)
-                    iterator.refresh()
+                    self.loss_tracker.refresh(iterator, description)
                 if patience == 0:
                     break
 
+            self.checkpoint_writer.close()
+
             max_fold_acc, max_fold_f1, auc = self._evaluate_acc_f1(self.test_dataloader)
             if max_fold_acc > max_fold_acc_k_fold:
                 save_path_k_fold = save_path
@@ -10,6 +10,7 @@ from transformers import (
     BartForConditionalGeneration,
     AutoTokenizer,
     AutoModel,
+    PretrainedConfig,
 )
 
 from pyabsa.networks.losses.ClassImblanceCE import ClassBalanceCrossEntropyLoss
@@ -31,9 +32,16 @@ class BERT_MLP(nn.Module):
     def __init__(self, bert, config):
         super(BERT_MLP, self).__init__()
         self.config = config
-        self.encoder = self.MODEL_CLASSES.get(
-            self.config.pretrained_bert, AutoModel
-        ).from_pretrained(self.config.pretrained_bert)
+        encoder_class = self.MODEL_CLASSES.get(self.config.pretrained_bert, AutoModel)
+        if isinstance(bert, PretrainedConfig):
+            # build the encoder skeleton only, the weights will be loaded from a checkpoint
+            self.encoder = (
+                AutoModel.from_config(bert)
+                if encoder_class is AutoModel
+                else encoder_class(bert)
+            )
+        else:
+            self.encoder = encoder_class.from_pretrained(self.config.pretrained_bert)
         self.tokenizer = AutoTokenizer.from_pretrained(self.config.pretrained_bert)
         self.classifier1 = nn.Linear(config.hidden_dim, 2)
         self.classifier2 = nn.Linear(config.hidden_dim, 2)
@@ -6,10 +6,9 @@ from typing import Union
 import numpy as np
 import torch
 import tqdm
-from findfile import find_file, find_cwd_dir
+from findfile import find_file
 from termcolor import colored
 from torch.utils.data import DataLoader
-from transformers import AutoModel
 
 from sklearn import metrics
 
@@ -21,6 +20,10 @@ from ..dataset_utils.__classic__.data_utils_for_inference import (
     GloVeCDDInferenceDataset,
 )
 from pyabsa.utils.data_utils.dataset_manager import detect_infer_dataset
+from pyabsa.utils.model_utils.model_utils import (
+    build_model_from_state_dict,
+    load_pretrained_config,
+)
 from pyabsa.utils.pyabsa_utils import set_device, print_args, fprint, rprint
 from pyabsa.framework.tokenizer_class.tokenizer_class import PretrainedTokenizer
 
@@ -74,21 +77,15 @@ class CodeDefectDetector(InferenceModel):
                 if state_dict_path or model_path:
                     if hasattr(BERTCDDModelList, self.config.model.__name__):
                         if state_dict_path:
-                            if kwargs.get("offline", False):
-                                self.bert = AutoModel.from_pretrained(
-                                    find_cwd_dir(
-                                        self.config.pretrained_bert.split("/")[-1]
-                                    )
-                                )
-                            else:
-                                self.bert = AutoModel.from_pretrained(
-                                    self.config.pretrained_bert
-                                )
-                            self.model = self.config.model(self.bert, self.config)
-                            self.model.load_state_dict(
-                                torch.load(
-                                    state_dict_path, map_location=DeviceTypeOption.CPU
-                                )
+                            # the CDD models build their encoders from the pretrained config
+                            self.model = build_model_from_state_dict(
+                                lambda: self.config.model(
+                                    load_pretrained_config(
+                                        self.config, offline=kwargs.get("offline", False)
+                                    ),
+                                    self.config,
+                                ),
+                                state_dict_path,
                             )
                         elif model_path:
                             self.model = torch.load(
@@ -244,6 +241,15 @@ class CodeDefectDetector(InferenceModel):
         if not target_file:
             raise FileNotFoundError("Can not find inference datasets!")
 
+        if self.result_cache is not None:
+            return self._cached_batch_predict(
+                target_file,
+                lambda samples: self._predict_samples(
+                    samples, print_result, ignore_error
+                ),
+                save_path if save_result else None,
+            )
+
         self.dataset.prepare_infer_dataset(target_file, ignore_error=ignore_error)
         self.infer_dataloader = DataLoader(
             dataset=self.dataset,
@@ -270,17 +276,23 @@ class CodeDefectDetector(InferenceModel):
         param: kwargs: other parameters.
         """
         self.config.eval_batch_size = kwargs.get("eval_batch_size", 32)
+        if not text:
+            raise RuntimeError("Please specify your datasets path!")
+        results = self._cached_predict(
+            [text] if isinstance(text, str) else text,
+            lambda samples: self._predict_samples(samples, print_result, ignore_error),
+        )
+        return results[0] if isinstance(text, str) else results
+
+    def _predict_samples(self, samples, print_result=True, ignore_error=True):
+        """
+        Predict a list of samples, i.e., the input texts or the lines of the inference files.
+        """
         self.infer_dataloader = DataLoader(
             dataset=self.dataset, batch_size=self.config.eval_batch_size, shuffle=False
         )
-        if text:
-            self.dataset.prepare_infer_sample(text, ignore_error=ignore_error)
-        else:
-            raise RuntimeError("Please specify your datasets path!")
-        if isinstance(text, str):
-            return self._run_prediction(print_result=print_result)[0]
-        else:
-            return self._run_prediction(print_result=print_result)
+        self.dataset.process_data(samples, ignore_error=ignore_error)
+        return self._run_prediction(print_result=print_result)
 
     def _run_prediction(self, save_path=None, print_result=True):
         _params = filter(lambda p: p.requires_grad, self.model.parameters())
@@ -312,7 +324,7 @@ class CodeDefectDetector(InferenceModel):
                     ]
                 targets = sample["label"].to(self.config.device)
                 c_targets = sample["corrupt_label"].to(self.config.device)
-                outputs = self.model(inputs)
+                outputs = self._forward(inputs)
                 logits, c_logits = outputs["logits"], outputs["c_logits"]
 
                 valid_index = targets != -100
@@ -10,10 +10,9 @@ from typing import Union
 import numpy as np
 import torch
 import tqdm
-from findfile import find_file, find_cwd_dir
+from findfile import find_file
 from termcolor import colored
 from torch.utils.data import DataLoader
-from transformers import AutoModel
 from sklearn import metrics
 
 from pyabsa import TaskCodeOption, LabelPaddingOption, DeviceTypeOption
@@ -22,6 +21,10 @@ from ..models import BERTRNACModelList, GloVeRNACModelList
 from ..dataset_utils.data_utils_for_inference import GloVeRNACInferenceDataset
 from ..dataset_utils.data_utils_for_inference import BERTRNACInferenceDataset
 from pyabsa.utils.data_utils.dataset_manager import detect_infer_dataset
+from pyabsa.utils.model_utils.model_utils import (
+    build_model_from_state_dict,
+    build_pretrained_skeleton,
+)
 from pyabsa.utils.pyabsa_utils import set_device, print_args, fprint, rprint
 
 
@@ -74,21 +77,14 @@ class RNAClassifier(InferenceModel):
                 if state_dict_path or model_path:
                     if hasattr(BERTRNACModelList, self.config.model.__name__):
                         if state_dict_path:
-                            if kwargs.get("offline", False):
-                                self.bert = AutoModel.from_pretrained(
-                                    find_cwd_dir(
-                                        self.config.pretrained_bert.split("/")[-1]
-                                    )
-                                )
-                            else:
-                                self.bert = AutoModel.from_pretrained(
-                                    self.config.pretrained_bert
-                                )
-                            self.model = self.config.model(self.bert, self.config)
-                            self.model.load_state_dict(
-                                torch.load(
-                                    state_dict_path, map_location=DeviceTypeOption.CPU
-                                )
+                            self.model = build_model_from_state_dict(
+                                lambda: self.config.model(
+                                    build_pretrained_skeleton(
+                                        self.config, offline=kwargs.get("offline", False)
+                                    ),
+                                    self.config,
+                                ),
+                                state_dict_path,
                             )
                         elif model_path:
                             self.model = torch.load(
@@ -253,7 +249,7 @@ class RNAClassifier(InferenceModel):
                     if col != "label"
                 ]
 
-                outputs = self.model(inputs)
+                outputs = self._forward(inputs)
                 sen_logits = outputs
                 t_probs = torch.softmax(sen_logits, dim=-1)
 
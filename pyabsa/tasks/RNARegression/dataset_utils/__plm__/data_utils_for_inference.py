@@ -14,6 +14,7 @@ from torch.utils.data import Dataset
 from pyabsa.framework.dataset_class.dataset_template import PyABSADataset
 from pyabsa.utils.file_utils.file_utils import load_dataset_from_file
 from pyabsa.framework.tokenizer_class.tokenizer_class import pad_and_truncate
+from .rna_featurizer import RNAWindowFeaturizer
 from pyabsa.utils.pyabsa_utils import fprint
 
 
@@ -21,6 +22,7 @@ class BERTRNARDataset(Dataset):
     def __init__(self, config, tokenizer):
         self.tokenizer = tokenizer
         self.config = config
+        self.featurizer = None
         self.data = []
 
     def parse_sample(self, text):
@@ -39,6 +41,8 @@ class BERTRNARDataset(Dataset):
 
     def process_data(self, samples, ignore_error=True):
         all_data = []
+        if self.featurizer is None:
+            self.featurizer = RNAWindowFeaturizer(self.config, self.tokenizer)
         if len(samples) > 100:
             it = tqdm.tqdm(samples, desc="preparing text classification dataloader")
         else:
@@ -70,22 +74,13 @@ class BERTRNARDataset(Dataset):
                     # r2r3_label = float(r2r3_label.strip())
                     # if len(seq) > 2 * self.config.max_seq_len:
                     #     continue
-                    for x in range(len(seq) // (self.config.max_seq_len * 2) + 1):
-                        _seq = seq[
-                            x
-                            * (self.config.max_seq_len * 2) : (x + 1)
-                            * (self.config.max_seq_len * 2)
-                        ]
-                        rna_indices = self.tokenizer.text_to_sequence(_seq)
-
+                    # the sequence is tokenized once, and sliced into the windows of max_seq_len tokens
+                    for rna_indices in torch.from_numpy(self.featurizer.windows(seq)):
                         data = {
                             "ex_id": torch.tensor(ex_id, dtype=torch.long),
-                            "text_indices": torch.tensor(rna_indices, dtype=torch.long),
+                            "text_indices": rna_indices,
                             "text_raw": seq,
                             "label": torch.tensor(label, dtype=torch.float32),
-                            # 'r1r2_label': torch.tensor(r1r2_label, dtype=torch.float32),
-                            # 'r1r3_label': torch.tensor(r1r3_label, dtype=torch.float32),
-                            # 'r2r3_label': torch.tensor(r2r3_label, dtype=torch.float32),
                         }
                         all_data.append(data)
 
@@ -13,6 +13,7 @@ import tqdm
 from pyabsa.framework.dataset_class.dataset_template import PyABSADataset
 from pyabsa.utils.file_utils.file_utils import load_dataset_from_file
 from pyabsa.framework.tokenizer_class.tokenizer_class import pad_and_truncate
+from .rna_featurizer import RNAWindowFeaturizer
 
 
 class BERTRNARDataset(PyABSADataset):
@@ -25,6 +26,7 @@ class BERTRNARDataset(PyABSADataset):
         )
 
         all_data = []
+        self.featurizer = RNAWindowFeaturizer(self.config, self.tokenizer)
 
         for ex_id, i in enumerate(
             tqdm.tqdm(range(len(lines)), desc="preparing dataloader")
@@ -50,27 +52,13 @@ class BERTRNARDataset(PyABSADataset):
                 # r2r3_label = float(r2r3_label.strip())
                 # if len(seq) > 2 * config.max_seq_len:
                 #     continue
-                for x in range(len(seq) // (self.config.max_seq_len * 2) + 1):
-                    _seq = seq[
-                        x
-                        * (self.config.max_seq_len * 2) : (x + 1)
-                        * (self.config.max_seq_len * 2)
-                    ]
-                    rna_indices = self.tokenizer.text_to_sequence(_seq)
-                    rna_indices = pad_and_truncate(
-                        rna_indices,
-                        self.config.max_seq_len,
-                        value=self.tokenizer.pad_token_id,
-                    )
+                # the sequence is tokenized once, and sliced into the windows of max_seq_len tokens
+                for rna_indices in torch.from_numpy(self.featurizer.windows(seq)):
                     data = {
                         "ex_id": torch.tensor(ex_id, dtype=torch.long),
-                        "text_indices": torch.tensor(rna_indices, dtype=torch.long),
+                        "text_indices": rna_indices,
                         "label": torch.tensor(label, dtype=torch.float32),
-                        # 'r1r2_label': torch.tensor(r1r2_label, dtype=torch.float32),
-                        # 'r1r3_label': torch.tensor(r1r3_label, dtype=torch.float32),
-                        # 'r2r3_label': torch.tensor(r2r3_label, dtype=torch.float32),
                     }
-
                     all_data.append(data)
 
             except Exception as e:
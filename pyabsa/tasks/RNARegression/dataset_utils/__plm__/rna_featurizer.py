@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# file: rna_featurizer.py
+# time: 19/10/2026 18:40
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import itertools
+
+import numpy as np
+
+from pyabsa.utils.pyabsa_utils import fprint
+
+
+class RNAWindowFeaturizer:
+    """
+    Tokenize an RNA sequence once, and slice the tokens into windows of exactly max_seq_len tokens
+    (including the special tokens), which are returned as a single int array.
+    If the tokenizer encodes the nucleotides (or the overlapping k-mers) as single tokens, the sequence is
+    tokenized by a lookup table from the bytes of the sequence, otherwise it is tokenized once by the tokenizer.
+    The following config options are used:
+        rna_alphabet: the nucleotide alphabet of the lookup table, default "ACGUTN"
+        kmer: the length of the overlapping k-mers of the tokenizer vocabulary, default 1 (single nucleotides)
+        window_overlap: the number of tokens shared by two adjacent windows, default 0
+    """
+
+    def __init__(self, config, tokenizer):
+        self.config = config
+        self.tokenizer = getattr(tokenizer, "tokenizer", tokenizer)
+        self.max_seq_len = config.max_seq_len
+        self.alphabet = config.get("rna_alphabet", "ACGUTN")
+        self.kmer = config.get("kmer", 1)
+        self.pad_token_id = self.tokenizer.pad_token_id
+        self.unk_token_id = self.tokenizer.unk_token_id
+
+        # the special tokens around a window, e.g., [CLS] and [SEP] for BERT
+        token_ids = self.tokenizer.encode(self.alphabet[0], add_special_tokens=False)
+        special_ids = self.tokenizer.encode(self.alphabet[0])
+        split = next(
+            i
+            for i in range(len(special_ids))
+            if special_ids[i : i + len(token_ids)] == token_ids
+        )
+        self.prefix_ids = special_ids[:split]
+        self.suffix_ids = special_ids[split + len(token_ids) :]
+        self.window_len = self.max_seq_len - len(self.prefix_ids) - len(self.suffix_ids)
+        self.window_overlap = config.get("window_overlap", 0)
+        if not 0 <= self.window_overlap < self.window_len:
+            raise ValueError(
+                "window_overlap should be in [0, {}), got {}".format(
+                    self.window_len, self.window_overlap
+                )
+            )
+
+        self.byte_to_code, self.lookup_table = self._build_lookup_table()
+
+    def _build_lookup_table(self):
+        byte_to_code = np.full(256, -1, dtype=np.int64)
+        for code, nucleotide in enumerate(self.alphabet):
+            byte_to_code[ord(nucleotide.upper())] = code
+            byte_to_code[ord(nucleotide.lower())] = code
+
+        kmers = [
+            "".join(kmer) for kmer in itertools.product(self.alphabet, repeat=self.kmer)
+        ]
+        lookup_table = np.asarray(
+            self.tokenizer.convert_tokens_to_ids(kmers), dtype=np.int64
+        )
+
+        # the lookup table is only used if it reproduces the tokenizer
+        probe = (self.alphabet + self.alphabet[::-1]) * 2
+        expected = self.tokenizer.encode(
+            self._split_kmers(probe), add_special_tokens=False
+        )
+        if self._lookup(probe, byte_to_code, lookup_table).tolist() != expected:
+            fprint(
+                "The tokenizer does not encode the nucleotides as single tokens, "
+                "the RNA sequences are tokenized by the tokenizer"
+            )
+            return byte_to_code, None
+        return byte_to_code, lookup_table
+
+    def _split_kmers(self, seq):
+        if self.kmer == 1:
+            return seq
+        return " ".join(seq[i : i + self.kmer] for i in range(len(seq) - self.kmer + 1))
+
+    def _lookup(self, seq, byte_to_code, lookup_table):
+        codes = byte_to_code[np.frombuffer(seq.encode("utf8"), dtype=np.uint8)]
+        if len(codes) < self.kmer:
+            return np.zeros(0, dtype=np.int64)
+        # the code of a k-mer is its base-len(alphabet) number
+        kmer_codes = np.zeros(len(codes) - self.kmer + 1, dtype=np.int64)
+        unknown = np.zeros(len(kmer_codes), dtype=bool)
+        for i in range(self.kmer):
+            kmer_codes = (
+                kmer_codes * len(self.alphabet) + codes[i : i + len(kmer_codes)]
+            )
+            unknown |= codes[i : i + len(kmer_codes)] < 0
+        ids = lookup_table[np.where(unknown, 0, kmer_codes)]
+        ids[unknown] = self.unk_token_id
+        return ids
+
+    def tokenize(self, seq):
+        """
+        Tokenize a sequence without the special tokens.
+
+        :param seq: the RNA sequence
+        :return: the token ids, as an int array
+        """
+        if self.lookup_table is not None:
+            return self._lookup(seq, self.byte_to_code, self.lookup_table)
+        return np.asarray(
+            self.tokenizer.encode(self._split_kmers(seq), add_special_tokens=False),
+            dtype=np.int64,
+        )
+
+    def windows(self, seq):
+        """
+        Slice the tokens of a sequence into windows, the last window ends at the last token, so that
+        only the sequences shorter than a window are padded.
+
+        :param seq: the RNA sequence
+        :return: the int array of the windows, of shape (num_windows, max_seq_len)
+        """
+        ids = self.tokenize(seq)
+        length = min(len(ids), self.window_len)
+        stride = self.window_len - self.window_overlap
+        starts = np.append(
+            np.arange(0, len(ids) - self.window_len, stride, dtype=np.int64),
+            max(0, len(ids) - self.window_len),
+        )
+
+        windows = np.full(
+            (len(starts), self.max_seq_len), self.pad_token_id, dtype=np.int64
+        )
+        begin = len(self.prefix_ids)
+        windows[:, :begin] = self.prefix_ids
+        windows[:, begin : begin + length] = ids[starts[:, None] + np.arange(length)]
+        windows[:, begin + length : begin + length + len(self.suffix_ids)] = (
+            self.suffix_ids
+        )
+        return windows
@@ -6,11 +6,9 @@
 # Copyright (C) 2021. All Rights Reserved.
 
 import os
-import shutil
 import time
 
 import numpy
-import numpy as np
 import torch
 import torch.nn as nn
 from findfile import find_file
@@ -28,6 +26,7 @@ from transformers import AutoModel, AutoTokenizer
 
 from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
 from pyabsa.framework.instructor_class.instructor_template import BaseTrainingInstructor
+from pyabsa.utils.model_utils.model_utils import compile_model, unwrap_compiled_model
 from pyabsa.utils.file_utils.file_utils import save_model
 from ..dataset_utils.__classic__.data_utils_for_training import GloVeRNARDataset
 from ..dataset_utils.__plm__.data_utils_for_training import BERTRNARDataset
@@ -155,7 +154,7 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
 
     def reload_model(self, ckpt="./init_state_dict.bin"):
         if os.path.exists(ckpt):
-            self.model.load_state_dict(
+            unwrap_compiled_model(self.model).load_state_dict(
                 torch.load(find_file(ckpt, or_key=[".bin", "state_dict"]))
             )
 
@@ -230,10 +229,12 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
     def _train(self, criterion):
         self._prepare_dataloader()
 
+        self.model = compile_model(self.model, self.config)
+
         if self.config.warmup_step >= 0:
             self.lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(
                 self.optimizer,
-                T_max=len(self.train_dataloaders[0]) * self.config.num_epoch,
+                T_max=self._get_num_optimization_steps(self.train_dataloaders[0]),
             )
             self.warmup_scheduler = warmup.UntunedLinearWarmup(self.optimizer)
 
@@ -242,6 +243,20 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
         else:
             return self._train_and_evaluate(criterion)
 
+    def _compute_loss(self, sample_batched, criterion):
+        inputs = [
+            sample_batched[col].to(self.config.device)
+            for col in self.config.inputs_cols
+        ]
+        outputs = self.model(inputs)
+        targets = sample_batched["label"].to(self.config.device)
+
+        if isinstance(outputs, dict) and "loss" in outputs:
+            loss = outputs["loss"]
+        else:
+            loss = criterion(outputs.view(-1), targets)
+        return loss
+
     def _train_and_evaluate(self, criterion):
         global_step = 0
         max_fold_r2 = -torch.inf
@@ -251,7 +266,7 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
             self.config.dataset_name,
         )
 
-        losses = []
+        self.loss_tracker.reset()
 
         self.config.metrics_of_this_checkpoint = {"r2": 0}
         self.config.max_test_metrics = {"max_test_r2": 0}
@@ -285,48 +300,26 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
             iterator = tqdm(self.train_dataloaders[0], desc=description)
             for i_batch, sample_batched in enumerate(iterator):
                 global_step += 1
-                # switch model to train mode, clear gradient accumulators
+                # switch model to train mode
                 self.model.train()
-                self.optimizer.zero_grad()
-                inputs = [
-                    sample_batched[col].to(self.config.device)
-                    for col in self.config.inputs_cols
-                ]
-                if self.config.use_amp:
-                    with torch.cuda.amp.autocast():
-                        outputs = self.model(inputs)
-                else:
-                    outputs = self.model(inputs)
-
-                targets = sample_batched["label"].to(self.config.device)
-
-                if isinstance(outputs, dict) and "loss" in outputs:
-                    loss = outputs["r2"]
-                else:
-                    loss = criterion(outputs.view(-1), targets)
-
-                losses.append(loss.item())
-                if self.config.use_amp and self.scaler:
-                    self.scaler.scale(loss).backward()
-                    self.scaler.step(self.optimizer)
-                    self.scaler.update()
-                else:
-                    loss.backward()
-                    self.optimizer.step()
-
-                if self.config.warmup_step >= 0:
-                    with self.warmup_scheduler.dampening():
-                        self.lr_scheduler.step()
+                loss = self._train_step(
+                    sample_batched, criterion, i_batch + 1 == len(iterator)
+                )
+                self.loss_tracker.track(loss)
 
                 # evaluate if test set is available
-                if global_step % self.config.log_step == 0:
+                if self.eval_scheduler.should_evaluate(
+                    global_step, i_batch + 1 == len(iterator)
+                ):
                     if self.test_dataloader and epoch >= self.config.evaluate_begin:
                         if self.valid_dataloader:
-                            test_r2 = self._evaluate_r2(
-                                self.valid_dataloader, criterion
+                            test_r2 = self.eval_scheduler.evaluate(
+                                self._evaluate_r2, self.valid_dataloader, criterion
                             )
                         else:
-                            test_r2 = self._evaluate_r2(self.test_dataloader, criterion)
+                            test_r2 = self.eval_scheduler.evaluate(
+                                self._evaluate_r2, self.test_dataloader, criterion
+                            )
 
                         self.config.metrics_of_this_checkpoint["r2"] = test_r2
 
@@ -338,13 +331,6 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
                             if self.config.model_path_to_save:
                                 if not os.path.exists(self.config.model_path_to_save):
                                     os.makedirs(self.config.model_path_to_save)
-                                if save_path and self.config.save_last_ckpt_only:
-                                    try:
-                                        shutil.rmtree(save_path)
-                                        # logger.info('Remove sub-optimal trained model:', save_path)
-                                    except:
-                                        # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                        pass
                                 save_path = "{0}/{1}_{2}_r2_{3}/".format(
                                     self.config.model_path_to_save,
                                     self.config.model_name,
@@ -360,34 +346,31 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
                                         "max_test_r2"
                                     ] = test_r2
 
-                                save_model(
-                                    self.config, self.model, self.tokenizer, save_path
+                                self.checkpoint_writer.save(
+                                    self.model,
+                                    self.tokenizer,
+                                    save_path,
+                                    prune=self.config.save_last_ckpt_only,
                                 )
 
                         description = "Epoch:{} | Loss:{:.4f} | Dev R2 Score:{:.4f}(max:{:.4f})".format(
-                            epoch, loss.item(), test_r2, max_fold_r2
+                            epoch, self.loss_tracker.last_loss, test_r2, max_fold_r2
                         )
                     elif self.config.save_mode and epoch >= self.config.evaluate_begin:
-                        save_model(
-                            self.config,
+                        self.checkpoint_writer.save(
                             self.model,
                             self.tokenizer,
-                            save_path + "_{}/".format(loss.item()),
+                            save_path + "_{}/".format(self.loss_tracker.last_loss),
+                            prune=False,
                         )
                 else:
-                    if self.config.get("loss_display", "smooth") == "smooth":
-                        description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                            epoch, round(np.nanmean(losses), 4)
-                        )
-                    else:
-                        description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                            epoch, round(loss.item(), 4)
-                        )
-                iterator.set_description(description)
-                iterator.refresh()
+                    description = self.loss_tracker.description(epoch)
+                self.loss_tracker.refresh(iterator, description)
             if patience == 0:
                 break
 
+        self.checkpoint_writer.close()
+
         if not self.valid_dataloader:
             self.config.MV.log_metric(
                 self.config.model_name
@@ -441,7 +424,7 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
         save_path_k_fold = ""
         max_fold_r2_k_fold = 0
 
-        losses = []
+        self.loss_tracker.reset()
 
         self.config.metrics_of_this_checkpoint = {"r2": 0}
         self.config.max_test_metrics = {"max_test_r2": 0}
@@ -483,49 +466,29 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
                 self.config.model_name,
                 self.config.dataset_name,
             )
+            # the best checkpoints of each fold are retained, see CheckpointWriter.reset()
+            self.checkpoint_writer.reset()
             for epoch in range(self.config.num_epoch):
                 patience -= 1
                 description = "Epoch:{} | Loss:{}".format(epoch, 0)
                 iterator = tqdm(train_dataloader, desc=description)
                 for i_batch, sample_batched in enumerate(iterator):
                     global_step += 1
-                    # switch model to train mode, clear gradient accumulators
+                    # switch model to train mode
                     self.model.train()
-                    self.optimizer.zero_grad()
-                    inputs = [
-                        sample_batched[col].to(self.config.device)
-                        for col in self.config.inputs_cols
-                    ]
-                    with torch.cuda.amp.autocast():
-                        if self.config.use_amp:
-                            with torch.cuda.amp.autocast():
-                                outputs = self.model(inputs)
-                        else:
-                            outputs = self.model(inputs)
-
-                    targets = sample_batched["label"].to(self.config.device)
-
-                    if isinstance(outputs, dict) and "loss" in outputs:
-                        loss = outputs["loss"]
-                    else:
-                        loss = criterion(outputs.view(-1), targets)
-
-                    if self.config.use_amp and self.scaler:
-                        self.scaler.scale(loss).backward()
-                        self.scaler.step(self.optimizer)
-                        self.scaler.update()
-                    else:
-                        loss.backward()
-                        self.optimizer.step()
-
-                    if self.config.warmup_step >= 0:
-                        with self.warmup_scheduler.dampening():
-                            self.lr_scheduler.step()
+                    loss = self._train_step(
+                        sample_batched, criterion, i_batch + 1 == len(iterator)
+                    )
+                    self.loss_tracker.track(loss)
 
                     # evaluate if test set is available
-                    if global_step % self.config.log_step == 0:
+                    if self.eval_scheduler.should_evaluate(
+                        global_step, i_batch + 1 == len(iterator)
+                    ):
                         if self.test_dataloader and epoch >= self.config.evaluate_begin:
-                            test_r2 = self._evaluate_r2(valid_dataloader, criterion)
+                            test_r2 = self.eval_scheduler.evaluate(
+                                self._evaluate_r2, valid_dataloader, criterion
+                            )
 
                             self.config.metrics_of_this_checkpoint["r2"] = test_r2
                             if test_r2 > max_fold_r2:
@@ -538,13 +501,6 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
                                         self.config.model_path_to_save
                                     ):
                                         os.makedirs(self.config.model_path_to_save)
-                                    if save_path:
-                                        try:
-                                            shutil.rmtree(save_path)
-                                            # logger.info('Remove sub-optimal trained model:', save_path)
-                                        except:
-                                            # logger.info('Can not remove sub-optimal trained model:', save_path)
-                                            pass
                                     save_path = "{0}/{1}_{2}_r2_{3}/".format(
                                         self.config.model_path_to_save,
                                         self.config.model_name,
@@ -560,41 +516,35 @@ class RNARTrainingInstructor(BaseTrainingInstructor):
                                             "max_test_r2"
                                         ] = test_r2
 
-                                    save_model(
-                                        self.config,
+                                    self.checkpoint_writer.save(
                                         self.model,
                                         self.tokenizer,
                                         save_path,
+                                        prune=self.config.save_last_ckpt_only,
                                     )
 
                             description = "Epoch:{} | Loss:{:.4f} | Dev R2 Score:{:>.2f}(max:{:>.2f})".format(
-                                epoch, loss.item(), test_r2, max_fold_r2
+                                epoch, self.loss_tracker.last_loss, test_r2, max_fold_r2
                             )
                         if (
                             self.config.save_mode
                             and epoch >= self.config.evaluate_begin
                         ):
-                            save_model(
-                                self.config,
+                            self.checkpoint_writer.save(
                                 self.model,
                                 self.tokenizer,
-                                save_path + "_{}/".format(loss.item()),
+                                save_path + "_{}/".format(self.loss_tracker.last_loss),
+                                prune=False,
                             )
                     else:
-                        if self.config.get("loss_display", "smooth") == "smooth":
-                            description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                                epoch, round(np.nanmean(losses), 4)
-                            )
-                        else:
-                            description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                                epoch, round(loss.item(), 4)
-                            )
+                        description = self.loss_tracker.description(epoch)
 
-                    iterator.set_description(description)
-                    iterator.refresh()
+                    self.loss_tracker.refresh(iterator, description)
                 if patience == 0:
                     break
 
+            self.checkpoint_writer.close()
+
             max_fold_r2 = self._evaluate_r2(self.test_dataloader, criterion)
             if max_fold_r2 > max_fold_r2_k_fold:
                 save_path_k_fold = save_path
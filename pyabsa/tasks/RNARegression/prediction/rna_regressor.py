@@ -10,10 +10,9 @@ from typing import Union
 import numpy as np
 import torch
 import tqdm
-from findfile import find_file, find_cwd_dir
+from findfile import find_file
 from termcolor import colored
 from torch.utils.data import DataLoader
-from transformers import AutoModel
 
 from sklearn import metrics
 
@@ -23,6 +22,10 @@ from ..dataset_utils.__classic__.data_utils_for_inference import GloVeRNARDatase
 from ..dataset_utils.__plm__.data_utils_for_inference import BERTRNARDataset
 from ..models import BERTRNARModelList, GloVeRNARModelList
 from pyabsa.utils.data_utils.dataset_manager import detect_infer_dataset
+from pyabsa.utils.model_utils.model_utils import (
+    build_model_from_state_dict,
+    build_pretrained_skeleton,
+)
 from pyabsa.utils.pyabsa_utils import set_device, print_args, fprint
 from pyabsa.framework.tokenizer_class.tokenizer_class import (
     PretrainedTokenizer,
@@ -78,21 +81,15 @@ class RNARegressor(InferenceModel):
                 if state_dict_path or model_path:
                     if hasattr(BERTRNARModelList, self.config.model.__name__):
                         if state_dict_path:
-                            if kwargs.get("offline", False):
-                                self.bert = AutoModel.from_pretrained(
-                                    find_cwd_dir(
-                                        self.config.pretrained_bert.split("/")[-1]
-                                    )
-                                )
-                            else:
-                                self.bert = AutoModel.from_pretrained(
-                                    self.config.pretrained_bert
-                                )
-                            self.model = self.config.model(self.bert, self.config)
-                            self.model.load_state_dict(
-                                torch.load(
-                                    state_dict_path, map_location=DeviceTypeOption.CPU
-                                )
+                            self.model = build_model_from_state_dict(
+                                lambda: self.config.model(
+                                    build_pretrained_skeleton(
+                                        self.config,
+                                        offline=kwargs.get("offline", False),
+                                    ),
+                                    self.config,
+                                ),
+                                state_dict_path,
                             )
                         elif model_path:
                             self.model = torch.load(
@@ -202,6 +199,15 @@ class RNARegressor(InferenceModel):
         if not target_file:
             raise FileNotFoundError("Can not find inference datasets!")
 
+        if self.result_cache is not None:
+            return self._cached_batch_predict(
+                target_file,
+                lambda samples: self._predict_samples(
+                    samples, print_result, ignore_error
+                ),
+                save_path if save_result else None,
+            )
+
         self.dataset.prepare_infer_dataset(target_file, ignore_error=ignore_error)
         self.infer_dataloader = DataLoader(
             dataset=self.dataset,
@@ -228,37 +234,40 @@ class RNARegressor(InferenceModel):
         param: kwargs: other parameters.
         """
         self.config.eval_batch_size = kwargs.get("eval_batch_size", 32)
+        if not text:
+            raise RuntimeError("Please specify your datasets path!")
+        results = self._cached_predict(
+            [text] if isinstance(text, str) else text,
+            lambda samples: self._predict_samples(samples, print_result, ignore_error),
+        )
+        return results[0] if isinstance(text, str) else results
+
+    def _predict_samples(self, samples, print_result=True, ignore_error=True):
+        """
+        Predict a list of samples, i.e., the input texts or the lines of the inference files.
+        """
         self.infer_dataloader = DataLoader(
             dataset=self.dataset, batch_size=self.config.eval_batch_size, shuffle=False
         )
-        if text:
-            self.dataset.prepare_infer_sample(text, ignore_error=ignore_error)
-        else:
-            raise RuntimeError("Please specify your datasets path!")
-        if isinstance(text, str):
-            return self._run_prediction(print_result=print_result)[0]
-        else:
-            return self._run_prediction(print_result=print_result)
+        self.dataset.process_data(samples, ignore_error=ignore_error)
+        return self._run_prediction(print_result=print_result)
 
     def _run_prediction(self, save_path=None, print_result=True):
         _params = filter(lambda p: p.requires_grad, self.model.parameters())
 
-        correct = {True: "Correct", False: "Wrong"}
         results = []
-        perplexity = "N.A."
+        # the windows of the sequences are collected over all batches, and reduced per example at the end,
+        # so that the windows of an example split by a batch boundary are reduced together
+        all_ex_ids, all_outputs, all_labels = [], [], []
+        all_texts, all_perplexities = [], []
         with torch.no_grad():
             self.model.eval()
-            n_total = 0
-            t_targets_all, t_outputs_all = None, None
 
             if len(self.infer_dataloader.dataset) >= 100:
                 it = tqdm.tqdm(self.infer_dataloader, desc="run inference")
             else:
                 it = self.infer_dataloader
 
-            pre_ex_id = 0
-            sum_val = []
-            cat_text = ""
             for i_batch, sample in enumerate(it):
                 inputs = [
                     sample[col].to(self.config.device)
@@ -266,16 +275,14 @@ class RNARegressor(InferenceModel):
                     if col != "label"
                 ]
 
-                outputs = self.model(inputs)
-                sen_logits = outputs
-
-                for i, i_probs in enumerate(sen_logits):
-                    pred_val = float(i_probs)
-                    real_val = float(sample["label"][i])
+                outputs = self._forward(inputs)
+                all_outputs.append(outputs.detach().float().reshape(-1).cpu())
+                all_ex_ids.append(sample["ex_id"].reshape(-1))
+                all_labels.append(sample["label"].float().reshape(-1))
+                all_texts.extend(sample["text_raw"])
 
-                    text_raw = sample["text_raw"][i]
-                    ex_id = int(sample["ex_id"][i])
-                    if self.cal_perplexity:
+                if self.cal_perplexity:
+                    for text_raw in sample["text_raw"]:
                         ids = self.MLM_tokenizer(
                             text_raw,
                             truncation=True,
@@ -286,66 +293,37 @@ class RNARegressor(InferenceModel):
                         ids["labels"] = ids["input_ids"].clone()
                         ids = ids.to(self.config.device)
                         loss = self.MLM(**ids)["loss"]
-                        perplexity = float(torch.exp(loss / ids["input_ids"].size(1)))
-                    else:
-                        perplexity = "N.A."
-
-                    if ex_id == pre_ex_id:
-                        sum_val.append(pred_val)
-                        cat_text += text_raw
-                    elif len(it) != 1:
-                        results.append(
-                            {
-                                "ex_id": pre_ex_id,
-                                "text": cat_text,
-                                "label": np.median(sum_val),
-                                "ref_label": real_val,
-                                "perplexity": perplexity,
-                            }
-                        )
-                        n_total += 1
-                        pre_ex_id = ex_id
-                        sum_val = [pred_val]
-                        cat_text = text_raw
-
-                        t_targets_all = (
-                            torch.cat(
-                                (t_targets_all, torch.tensor([sample["label"][i]]))
-                            )
-                            if t_targets_all is not None
-                            else torch.tensor([sample["label"][i]])
-                        )
-                        t_outputs_all = (
-                            torch.cat(
-                                (t_outputs_all, torch.tensor([np.median(sum_val)]))
-                            )
-                            if t_outputs_all is not None
-                            else torch.tensor([np.median(sum_val)])
+                        all_perplexities.append(
+                            float(torch.exp(loss / ids["input_ids"].size(1)))
                         )
 
+        if all_outputs:
+            ex_ids, first_windows, reduced_outputs = reduce_windows(
+                torch.cat(all_ex_ids).numpy(),
+                torch.cat(all_outputs).numpy(),
+                self.config.get("window_reduction", "median"),
+            )
+            ref_labels = torch.cat(all_labels).numpy()[first_windows]
+            if all_perplexities:
+                perplexities = reduce_windows(
+                    torch.cat(all_ex_ids).numpy(), np.array(all_perplexities), "mean"
+                )[2]
+            else:
+                perplexities = ["N.A."] * len(ex_ids)
+
+            for ex_id, first_window, label, ref_label, perplexity in zip(
+                ex_ids, first_windows, reduced_outputs, ref_labels, perplexities
+            ):
                 results.append(
                     {
-                        "ex_id": pre_ex_id,
-                        "text": cat_text,
-                        "label": np.median(sum_val),
-                        "ref_label": real_val,
+                        "ex_id": int(ex_id),
+                        # all the windows of an example share the raw text of the example
+                        "text": all_texts[first_window],
+                        "label": float(label),
+                        "ref_label": float(ref_label),
                         "perplexity": perplexity,
                     }
                 )
-                pre_ex_id = ex_id
-                sum_val = [pred_val]
-                cat_text = text_raw
-                n_total += 1
-                t_targets_all = (
-                    torch.cat((t_targets_all, torch.tensor([sample["label"][i]])))
-                    if t_targets_all is not None
-                    else torch.tensor([sample["label"][i]])
-                )
-                t_outputs_all = (
-                    torch.cat((t_outputs_all, torch.tensor([np.median(sum_val)])))
-                    if t_outputs_all is not None
-                    else torch.tensor([np.median(sum_val)])
-                )
 
         try:
             if print_result:
@@ -391,7 +369,7 @@ class RNARegressor(InferenceModel):
                     json.dump(str(results), fout, ensure_ascii=False)
                     fprint("inference result saved in: {}".format(save_path))
         except Exception as e:
-            fprint("Can not save result: {}, Exception: {}".format(text_raw, e))
+            fprint("Can not save result: {}, Exception: {}".format(save_path, e))
 
         if len(results) > 1:
             fprint(
@@ -399,14 +377,10 @@ class RNARegressor(InferenceModel):
             )
             fprint(
                 "MSE: {}".format(
-                    metrics.mean_squared_error(t_targets_all.cpu(), t_outputs_all.cpu())
-                )
-            )
-            fprint(
-                "R2: {}".format(
-                    metrics.r2_score(t_targets_all.cpu(), t_outputs_all.cpu())
+                    metrics.mean_squared_error(ref_labels, reduced_outputs)
                 )
             )
+            fprint("R2: {}".format(metrics.r2_score(ref_labels, reduced_outputs)))
             fprint(
                 "\n---------------------------- Regression Result ----------------------------\n"
             )
@@ -417,5 +391,40 @@ class RNARegressor(InferenceModel):
         self.dataset.all_data = []
 
 
+def reduce_windows(ex_ids, values, reduction="median"):
+    """
+    Reduce the predictions of the windows of each example by a vectorized segment reduction.
+
+    :param ex_ids: the example id of each window
+    :param values: the prediction of each window
+    :param reduction: the reduction of the windows of an example, "median", "mean" or "max"
+    :return: the sorted example ids, the index of the first window of each example, and the reduced predictions
+    """
+    ex_ids = np.asarray(ex_ids)
+    values = np.asarray(values, dtype=np.float64)
+    unique_ids, first_windows = np.unique(ex_ids, return_index=True)
+
+    # sort the windows by example, and by value within an example (for the median)
+    order = np.lexsort((values, ex_ids))
+    sorted_values = values[order]
+    starts, counts = np.unique(ex_ids[order], return_index=True, return_counts=True)[1:]
+    if reduction == "median":
+        reduced = (
+            sorted_values[starts + (counts - 1) // 2]
+            + sorted_values[starts + counts // 2]
+        ) / 2
+    elif reduction == "mean":
+        reduced = np.add.reduceat(sorted_values, starts) / counts
+    elif reduction == "max":
+        reduced = np.maximum.reduceat(sorted_values, starts)
+    else:
+        raise ValueError(
+            "Unknown window reduction: {}, available: median, mean, max".format(
+                reduction
+            )
+        )
+    return unique_ids, first_windows, reduced
+
+
 class Predictor(RNARegressor):
     pass
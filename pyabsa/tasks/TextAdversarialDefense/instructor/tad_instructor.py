@@ -6,7 +6,6 @@
 # Copyright (C) 2021. All Rights Reserved.
 import os
 import random
-import shutil
 import time
 
 import numpy as np
@@ -30,10 +29,10 @@ import pytorch_warmup as warmup
 
 from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
 from pyabsa.framework.instructor_class.instructor_template import BaseTrainingInstructor
+from pyabsa.utils.model_utils.model_utils import compile_model, unwrap_compiled_model
 from ..dataset_utils.__classic__.data_utils_for_training import GloVeTADDataset
 from ..dataset_utils.__plm__.data_utils_for_training import BERTTADDataset
 from ..models import BERTTADModelList, GloVeTADModelList
-from pyabsa.utils.file_utils.file_utils import save_model
 from pyabsa.utils.pyabsa_utils import init_optimizer, fprint
 from pyabsa.framework.tokenizer_class.tokenizer_class import (
     PretrainedTokenizer,
@@ -154,7 +153,7 @@ class TADTrainingInstructor(BaseTrainingInstructor):
 
     def reload_model_state_dict(self, ckpt="./init_state_dict.bin"):
         if os.path.exists(ckpt):
-            self.model.load_state_dict(
+            unwrap_compiled_model(self.model).load_state_dict(
                 torch.load(find_file(ckpt, or_key=[".bin", "state_dict"]))
             )
 
@@ -229,10 +228,12 @@ class TADTrainingInstructor(BaseTrainingInstructor):
     def _train(self, criterion):
         self._prepare_dataloader()
 
+        self.model = compile_model(self.model, self.config)
+
         if self.config.warmup_step >= 0:
             self.lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(
                 self.optimizer,
-                T_max=len(self.train_dataloaders[0]) * self.config.num_epoch,
+                T_max=self._get_num_optimization_steps(self.train_dataloaders[0]),
             )
             self.warmup_scheduler = warmup.UntunedLinearWarmup(self.optimizer)
 
@@ -241,6 +242,31 @@ class TADTrainingInstructor(BaseTrainingInstructor):
         else:
             return self._train_and_evaluate(criterion)
 
+    def _compute_loss(self, sample_batched, criterion):
+        inputs = [
+            sample_batched[col].to(self.config.device)
+            for col in self.config.inputs_cols
+        ]
+        outputs = self.model(inputs)
+        label_targets = sample_batched["label"].to(self.config.device)
+        adv_tr_targets = sample_batched["adv_train_label"].to(self.config.device)
+        adv_det_targets = sample_batched["is_adv"].to(self.config.device)
+
+        sen_logits, advdet_logits, adv_tr_logits = (
+            outputs["sent_logits"],
+            outputs["advdet_logits"],
+            outputs["adv_tr_logits"],
+        )
+        sen_loss = criterion(sen_logits, label_targets)
+        adv_det_loss = criterion(advdet_logits, adv_det_targets)
+        adv_train_loss = criterion(adv_tr_logits, adv_tr_targets)
+        loss = (
+            sen_loss
+            + self.config.args.get("adv_det_weight", 5) * adv_det_loss
+            + self.config.args.get("adv_train_weight", 5) * adv_train_loss
+        )
+        return loss
+
     def _train_and_evaluate(self, criterion):
         global_step = 0
         max_label_fold_acc = 0
@@ -250,7 +276,7 @@ class TADTrainingInstructor(BaseTrainingInstructor):
         max_adv_tr_fold_acc = 0
         max_adv_tr_fold_f1 = 0
 
-        losses = []
+        self.loss_tracker.reset()
 
         save_path = "{0}/{1}_{2}".format(
             self.config.model_path_to_save,
@@ -294,50 +320,17 @@ class TADTrainingInstructor(BaseTrainingInstructor):
             iterator = tqdm(self.train_dataloaders[0], desc=description)
             for i_batch, sample_batched in enumerate(iterator):
                 global_step += 1
-                # switch model to train mode, clear gradient accumulators
+                # switch model to train mode
                 self.model.train()
-                self.optimizer.zero_grad()
-                inputs = [
-                    sample_batched[col].to(self.config.device)
-                    for col in self.config.inputs_cols
-                ]
-                with torch.cuda.amp.autocast():
-                    outputs = self.model(inputs)
-                    label_targets = sample_batched["label"].to(self.config.device)
-                    adv_tr_targets = sample_batched["adv_train_label"].to(
-                        self.config.device
-                    )
-                    adv_det_targets = sample_batched["is_adv"].to(self.config.device)
-
-                    sen_logits, advdet_logits, adv_tr_logits = (
-                        outputs["sent_logits"],
-                        outputs["advdet_logits"],
-                        outputs["adv_tr_logits"],
-                    )
-                    sen_loss = criterion(sen_logits, label_targets)
-                    adv_det_loss = criterion(advdet_logits, adv_det_targets)
-                    adv_train_loss = criterion(adv_tr_logits, adv_tr_targets)
-                    loss = (
-                        sen_loss
-                        + self.config.args.get("adv_det_weight", 5) * adv_det_loss
-                        + self.config.args.get("adv_train_weight", 5) * adv_train_loss
-                    )
-                    losses.append(loss.item())
-
-                if self.scaler:
-                    self.scaler.scale(loss).backward()
-                    self.scaler.step(self.optimizer)
-                    self.scaler.update()
-                else:
-                    loss.backward()
-                    self.optimizer.step()
-
-                if self.config.warmup_step >= 0:
-                    with self.warmup_scheduler.dampening():
-                        self.lr_scheduler.step()
+                loss = self._train_step(
+                    sample_batched, criterion, i_batch + 1 == len(iterator)
+                )
+                self.loss_tracker.track(loss)
 
                 # evaluate if test set is available
-                if global_step % self.config.log_step == 0:
+                if self.eval_scheduler.should_evaluate(
+                    global_step, i_batch + 1 == len(iterator)
+                ):
                     if self.test_dataloader and epoch >= self.config.evaluate_begin:
                         if self.valid_dataloader:
                             (
@@ -347,7 +340,9 @@ class TADTrainingInstructor(BaseTrainingInstructor):
                                 test_adv_det_f1,
                                 test_adv_tr_acc,
                                 test_adv_tr_f1,
-                            ) = self._evaluate_acc_f1(self.valid_dataloader)
+                            ) = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.valid_dataloader
+                            )
                         else:
                             (
                                 test_label_acc,
@@ -356,14 +351,16 @@ class TADTrainingInstructor(BaseTrainingInstructor):
                                 test_adv_det_f1,
                                 test_adv_tr_acc,
                                 test_adv_tr_f1,
-                            ) = self._evaluate_acc_f1(self.test_dataloader)
+                            ) = self.eval_scheduler.evaluate(
+                                self._evaluate_acc_f1, self.test_dataloader
+                            )
 
-                        self.config.metrics_of_this_checkpoint[
-                            "max_cls_test_acc"
-                        ] = test_label_acc
-                        self.config.metrics_of_this_checkpoint[
-                            "max_cls_test_f1"
-                        ] = test_label_f1
+                        self.config.metrics_of_this_checkpoint["max_cls_test_acc"] = (
+                            test_label_acc
+                        )
+                        self.config.metrics_of_this_checkpoint["max_cls_test_f1"] = (
+                            test_label_f1
+                        )
                         self.config.metrics_of_this_checkpoint[
                             "max_adv_det_test_acc"
                         ] = test_adv_det_acc
@@ -373,9 +370,9 @@ class TADTrainingInstructor(BaseTrainingInstructor):
                         self.config.metrics_of_this_checkpoint[
                             "max_adv_tr_test_acc"
                         ] = test_adv_tr_acc
-                        self.config.metrics_of_this_checkpoint[
-                            "max_adv_tr_test_f1"
-                        ] = test_adv_tr_f1
+                        self.config.metrics_of_this_checkpoint["max_adv_tr_test_f1"] = (
+                            test_adv_tr_f1
+                        )
 
                         if (
                             test_label_acc > max_label_fold_acc
@@ -412,13 +409,6 @@ class TADTrainingInstructor(BaseTrainingInstructor):
                             if self.config.model_path_to_save:
                                 if not os.path.exists(self.config.model_path_to_save):
                                     os.makedirs(self.config.model_path_to_save)
-                                if save_path:
-                                    try:
-                                        shutil.rmtree(save_path)
-                                        # logger.info('Remove sub-configimal trained model:', save_path)
-                                    except:
-                                        # logger.info('Can not remove sub-configimal trained model:', save_path)
-                                        pass
                                 save_path = (
                                     "{0}/{1}_{2}_cls_acc_{3}_cls_f1_{4}_adv_det_acc_{5}_adv_det_f1_{6}"
                                     "_adv_training_acc_{7}_adv_training_f1_{8}/".format(
@@ -485,8 +475,8 @@ class TADTrainingInstructor(BaseTrainingInstructor):
                                         "max_adv_tr_test_f1"
                                     ] = test_adv_tr_f1
 
-                                save_model(
-                                    self.config, self.model, self.tokenizer, save_path
+                                self.checkpoint_writer.save(
+                                    self.model, self.tokenizer, save_path
                                 )
 
                         postfix = (
@@ -502,26 +492,20 @@ class TADTrainingInstructor(BaseTrainingInstructor):
                         )
                         iterator.set_postfix_str(postfix)
                     elif self.config.save_mode and epoch >= self.config.evaluate_begin:
-                        save_model(
-                            self.config,
+                        self.checkpoint_writer.save(
                             self.model,
                             self.tokenizer,
-                            save_path + "_{}/".format(loss.item()),
+                            save_path + "_{}/".format(self.loss_tracker.last_loss),
+                            prune=False,
                         )
                 else:
-                    if self.config.get("loss_display", "smooth") == "smooth":
-                        description = "Epoch:{:>3d} | Smooth Loss: {:>.4f}".format(
-                            epoch, round(np.nanmean(losses), 4)
-                        )
-                    else:
-                        description = "Epoch:{:>3d} | Batch Loss: {:>.4f}".format(
-                            epoch, round(loss.item(), 4)
-                        )
-                iterator.set_description(description)
-                iterator.refresh()
+                    description = self.loss_tracker.description(epoch)
+                self.loss_tracker.refresh(iterator, description)
             if patience == 0:
                 break
 
+        self.checkpoint_writer.close()
+
         if not self.valid_dataloader:
             self.config.MV.log_metric(
                 self.config.model_name,
@@ -615,7 +599,7 @@ class TADTrainingInstructor(BaseTrainingInstructor):
         self.config.logger.info(self.config.MV.summary(no_print=True))
 
         rolling_intv = 5
-        df = pandas.DataFrame(losses)
+        df = pandas.DataFrame(self.loss_tracker.losses)
         losses = list(np.hstack(df.rolling(rolling_intv, min_periods=1).mean().values))
         self.config.loss = losses[-1]
         # self.config.loss = np.average(losses)
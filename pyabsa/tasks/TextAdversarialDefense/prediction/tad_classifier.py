@@ -10,11 +10,10 @@ from typing import Union
 
 import torch
 import tqdm
-from findfile import find_file, find_cwd_dir
+from findfile import find_file
 from termcolor import colored
 
 from torch.utils.data import DataLoader
-from transformers import AutoModel
 
 from pyabsa import TaskCodeOption, DeviceTypeOption
 from pyabsa.framework.prediction_class.predictor_template import InferenceModel
@@ -24,6 +23,10 @@ from ..dataset_utils.__classic__.data_utils_for_inference import (
 from ..dataset_utils.__plm__.data_utils_for_inference import BERTTADInferenceDataset
 from ..models import BERTTADModelList, GloVeTADModelList
 from pyabsa.utils.data_utils.dataset_manager import detect_infer_dataset
+from pyabsa.utils.model_utils.model_utils import (
+    build_model_from_state_dict,
+    build_pretrained_skeleton,
+)
 from pyabsa.utils.pyabsa_utils import set_device, print_args, fprint
 
 
@@ -157,21 +160,14 @@ class TADTextClassifier(InferenceModel):
                 if state_dict_path or model_path:
                     if hasattr(BERTTADModelList, self.config.model.__name__):
                         if state_dict_path:
-                            if kwargs.get("offline", False):
-                                self.bert = AutoModel.from_pretrained(
-                                    find_cwd_dir(
-                                        self.config.pretrained_bert.split("/")[-1]
-                                    )
-                                )
-                            else:
-                                self.bert = AutoModel.from_pretrained(
-                                    self.config.pretrained_bert
-                                )
-                            self.model = self.config.model(self.bert, self.config)
-                            self.model.load_state_dict(
-                                torch.load(
-                                    state_dict_path, map_location=DeviceTypeOption.CPU
-                                )
+                            self.model = build_model_from_state_dict(
+                                lambda: self.config.model(
+                                    build_pretrained_skeleton(
+                                        self.config, offline=kwargs.get("offline", False)
+                                    ),
+                                    self.config,
+                                ),
+                                state_dict_path,
                             )
                         elif model_path:
                             self.model = torch.load(
@@ -324,6 +320,16 @@ class TADTextClassifier(InferenceModel):
         if not target_file:
             raise FileNotFoundError("Can not find inference datasets!")
 
+        if self.result_cache is not None:
+            return self._cached_batch_predict(
+                target_file,
+                lambda samples: self._predict_samples(
+                    samples, print_result, ignore_error, defense
+                ),
+                save_path if save_result else None,
+                defense=defense,
+            )
+
         self.dataset.prepare_infer_dataset(target_file, ignore_error=ignore_error)
         self.infer_dataloader = DataLoader(
             dataset=self.dataset,
@@ -353,17 +359,28 @@ class TADTextClassifier(InferenceModel):
         param: kwargs: other parameters.
         """
         self.config.eval_batch_size = kwargs.get("eval_batch_size", 32)
+        if not text:
+            raise RuntimeError("Please specify your datasets path!")
+        results = self._cached_predict(
+            [text] if isinstance(text, str) else text,
+            lambda samples: self._predict_samples(
+                samples, print_result, ignore_error, defense
+            ),
+            defense=defense,
+        )
+        return results[0] if isinstance(text, str) else results
+
+    def _predict_samples(
+        self, samples, print_result=True, ignore_error=True, defense=None
+    ):
+        """
+        Predict a list of samples, i.e., the input texts or the lines of the inference files.
+        """
         self.infer_dataloader = DataLoader(
             dataset=self.dataset, batch_size=self.config.eval_batch_size, shuffle=False
         )
-        if text:
-            self.dataset.prepare_infer_sample(text, ignore_error=ignore_error)
-        else:
-            raise RuntimeError("Please specify your datasets path!")
-        if isinstance(text, str):
-            return self._run_prediction(print_result=print_result, defense=defense)[0]
-        else:
-            return self._run_prediction(print_result=print_result, defense=defense)
+        self.dataset.process_data(samples, ignore_error=ignore_error)
+        return self._run_prediction(print_result=print_result, defense=defense)
 
     def _run_prediction(self, save_path=None, print_result=True, defense=None):
         _params = filter(lambda p: p.requires_grad, self.model.parameters())
@@ -387,7 +404,7 @@ class TADTextClassifier(InferenceModel):
                     sample[col].to(self.config.device)
                     for col in self.config.inputs_cols
                 ]
-                outputs = self.model(inputs)
+                outputs = self._forward(inputs)
                 logits, advdet_logits, adv_tr_logits = (
                     outputs["sent_logits"],
                     outputs["advdet_logits"],
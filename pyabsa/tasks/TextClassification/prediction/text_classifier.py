@@ -10,10 +10,9 @@ from typing import Union
 import numpy as np
 import torch
 import tqdm
-from findfile import find_file, find_cwd_dir
+from findfile import find_file
 from termcolor import colored
 from torch.utils.data import DataLoader
-from transformers import AutoModel
 
 from sklearn import metrics
 
@@ -23,6 +22,11 @@ from ..dataset_utils.__plm__.data_utils_for_inference import BERTTCInferenceData
 from ..models import BERTTCModelList, GloVeTCModelList
 from ..dataset_utils.__classic__.data_utils_for_inference import GloVeTCInferenceDataset
 from pyabsa.utils.data_utils.dataset_manager import detect_infer_dataset
+from pyabsa.utils.model_utils.model_export import ExportedModel
+from pyabsa.utils.model_utils.model_utils import (
+    build_model_from_state_dict,
+    build_pretrained_skeleton,
+)
 from pyabsa.utils.pyabsa_utils import set_device, print_args, fprint, rprint
 
 
@@ -72,24 +76,22 @@ class TextClassifier(InferenceModel):
                     self.config.auto_device = kwargs.get("auto_device", True)
                     set_device(self.config, self.config.auto_device)
 
-                if state_dict_path or model_path:
+                if kwargs.get("exported_model", None):
+                    # the model exported by export(), the model code is not run
+                    self.model = ExportedModel(
+                        kwargs["exported_model"], self.config.device
+                    )
+                elif state_dict_path or model_path:
                     if hasattr(BERTTCModelList, self.config.model.__name__):
                         if state_dict_path:
-                            if kwargs.get("offline", False):
-                                self.bert = AutoModel.from_pretrained(
-                                    find_cwd_dir(
-                                        self.config.pretrained_bert.split("/")[-1]
-                                    )
-                                )
-                            else:
-                                self.bert = AutoModel.from_pretrained(
-                                    self.config.pretrained_bert
-                                )
-                            self.model = self.config.model(self.bert, self.config)
-                            self.model.load_state_dict(
-                                torch.load(
-                                    state_dict_path, map_location=DeviceTypeOption.CPU
-                                )
+                            self.model = build_model_from_state_dict(
+                                lambda: self.config.model(
+                                    build_pretrained_skeleton(
+                                        self.config, offline=kwargs.get("offline", False)
+                                    ),
+                                    self.config,
+                                ),
+                                state_dict_path,
                             )
                         elif model_path:
                             self.model = torch.load(
@@ -246,6 +248,15 @@ class TextClassifier(InferenceModel):
         if not target_file:
             raise FileNotFoundError("Can not find inference datasets!")
 
+        if self.result_cache is not None:
+            return self._cached_batch_predict(
+                target_file,
+                lambda samples: self._predict_samples(
+                    samples, print_result, ignore_error
+                ),
+                save_path if save_result else None,
+            )
+
         self.dataset.prepare_infer_dataset(target_file, ignore_error=ignore_error)
         self.infer_dataloader = DataLoader(
             dataset=self.dataset,
@@ -272,17 +283,33 @@ class TextClassifier(InferenceModel):
         param: kwargs: other parameters.
         """
         self.config.eval_batch_size = kwargs.get("eval_batch_size", 32)
+        if not text:
+            raise RuntimeError("Please specify your datasets path!")
+        results = self._cached_predict(
+            [text] if isinstance(text, str) else text,
+            lambda samples: self._predict_samples(samples, print_result, ignore_error),
+        )
+        return results[0] if isinstance(text, str) else results
+
+    def _predict_samples(self, samples, print_result=True, ignore_error=True):
+        """
+        Predict a list of samples, i.e., the input texts or the lines of the inference files.
+        """
         self.infer_dataloader = DataLoader(
             dataset=self.dataset, batch_size=self.config.eval_batch_size, shuffle=False
         )
-        if text:
-            self.dataset.prepare_infer_sample(text, ignore_error=ignore_error)
-        else:
-            raise RuntimeError("Please specify your datasets path!")
-        if isinstance(text, str):
-            return self._run_prediction(print_result=print_result)[0]
-        else:
-            return self._run_prediction(print_result=print_result)
+        self.dataset.process_data(samples, ignore_error=ignore_error)
+        return self._run_prediction(print_result=print_result)
+
+    def _export_inputs(self, samples=None):
+        if not samples:
+            samples = ["The food is good .", "The service is bad ."]
+        self.dataset.process_data(samples, ignore_error=False)
+        sample = next(
+            iter(DataLoader(self.dataset, batch_size=len(self.dataset), shuffle=False))
+        )
+        inputs_cols = [col for col in self.config.inputs_cols if col != "label"]
+        return inputs_cols, [sample[col] for col in inputs_cols], "list"
 
     def _run_prediction(self, save_path=None, print_result=True):
         _params = filter(lambda p: p.requires_grad, self.model.parameters())
@@ -307,7 +334,7 @@ class TextClassifier(InferenceModel):
                     if col != "label"
                 ]
 
-                outputs = self.model(inputs)
+                outputs = self._forward(inputs)
                 sen_logits = outputs
                 t_probs = torch.softmax(sen_logits, dim=-1)
 
@@ -21,6 +21,9 @@ class APCTrainingInstructor(BaseTrainingInstructor):
 
         self._init_misc()
 
+    def _compute_loss(self, sample_batched, criterion):
+        raise NotImplementedError("Please implement this method in your subclass!")
+
     def _train_and_evaluate(self, criterion):
         raise NotImplementedError("Please implement this method in your subclass!")
 
@@ -62,53 +62,57 @@ def make_ABSA_dataset(dataset_name_or_path, checkpoint="english"):
     fprint("Start processing dataset: " + colored(dataset_name_or_path, "green"))
     for f in fs:
         with open(f, mode="r", encoding="utf8") as f_in:
-            lines = f_in.readlines()
-        results = aspect_extractor.batch_predict(lines)
-        with open(
-            f.replace(".ignore", "") + ".apc", mode="w", encoding="utf-8"
-        ) as f_apc_out:
+            # stream the results, so that the file is not loaded into the memory at once
+            results = aspect_extractor.stream_predict(f_in)
             with open(
-                f.replace(".ignore", "") + ".atepc", mode="w", encoding="utf-8"
-            ) as f_atepc_out:
-                for result in results:
-                    for aspect, position, sentiment in zip(
-                        result["aspect"], result["position"], result["sentiment"]
-                    ):
-                        f_apc_out.write(
-                            " ".join(
-                                result["tokens"][: position[0]]
-                                + ["$T$"]
-                                + result["tokens"][position[-1] + 1 :]
-                            )
-                            + "\n"
-                        )
-                        f_apc_out.write("{}\n".format(aspect))
-                        f_apc_out.write("{}\n".format(sentiment))
-
-                    for j, pos in enumerate(result["position"]):
-                        for i, (token, IOB) in enumerate(
-                            zip(result["tokens"], result["IOB"])
+                f.replace(".ignore", "") + ".apc", mode="w", encoding="utf-8"
+            ) as f_apc_out:
+                with open(
+                    f.replace(".ignore", "") + ".atepc", mode="w", encoding="utf-8"
+                ) as f_atepc_out:
+                    for result in results:
+                        for aspect, position, sentiment in zip(
+                            result["aspect"], result["position"], result["sentiment"]
                         ):
-                            if i + 1 in pos:
-                                f_atepc_out.write(
-                                    token
-                                    + " "
-                                    + IOB.replace("[CLS]", "O").replace("[SEP]", "O")
-                                    + " "
-                                    + result["sentiment"][j - 1]
-                                    + "\n"
-                                )
-                                result["position"][j].pop(0)
-                            else:
-                                f_atepc_out.write(
-                                    token
-                                    + " "
-                                    + IOB.replace("[CLS]", "O").replace("[SEP]", "O")
-                                    + " "
-                                    + str(LabelPaddingOption.LABEL_PADDING)
-                                    + "\n"
+                            f_apc_out.write(
+                                " ".join(
+                                    result["tokens"][: position[0]]
+                                    + ["$T$"]
+                                    + result["tokens"][position[-1] + 1 :]
                                 )
-                        f_atepc_out.write("\n")
+                                + "\n"
+                            )
+                            f_apc_out.write("{}\n".format(aspect))
+                            f_apc_out.write("{}\n".format(sentiment))
+
+                        for j, pos in enumerate(result["position"]):
+                            for i, (token, IOB) in enumerate(
+                                zip(result["tokens"], result["IOB"])
+                            ):
+                                if i + 1 in pos:
+                                    f_atepc_out.write(
+                                        token
+                                        + " "
+                                        + IOB.replace("[CLS]", "O").replace(
+                                            "[SEP]", "O"
+                                        )
+                                        + " "
+                                        + result["sentiment"][j - 1]
+                                        + "\n"
+                                    )
+                                    result["position"][j].pop(0)
+                                else:
+                                    f_atepc_out.write(
+                                        token
+                                        + " "
+                                        + IOB.replace("[CLS]", "O").replace(
+                                            "[SEP]", "O"
+                                        )
+                                        + " "
+                                        + str(LabelPaddingOption.LABEL_PADDING)
+                                        + "\n"
+                                    )
+                            f_atepc_out.write("\n")
 
     fprint("APC and ATEPC Datasets built for {}!".format(" ".join(fs)))
     fprint(
@@ -6,12 +6,37 @@
 # huggingface: https://huggingface.co/yangheng
 # google scholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
 # Copyright (C) 2021. All Rights Reserved.
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 import numpy as np
+import torch
 from pyabsa.tasks.AspectPolarityClassification import SentimentClassifier
 
 
+def _weighted_sum(x, weights):
+    return np.einsum("m,m...->...", weights, x)
+
+
+def _weighted_average(x, weights):
+    return _weighted_sum(x, weights) / weights.sum()
+
+
+def _weighted_median(x, weights):
+    order = np.argsort(x, axis=0)
+    sorted_x = np.take_along_axis(x, order, axis=0)
+    cum_weights = np.cumsum(weights[order], axis=0)
+    median_index = (cum_weights >= weights.sum() / 2).argmax(axis=0)
+    return np.take_along_axis(sorted_x, median_index[None], axis=0)[0]
+
+
+def _weighted_vote(x, weights, select=max):
+    votes = {}
+    for value, weight in zip(x, weights):
+        votes[value] = votes.get(value, 0) + weight
+    return select(votes, key=votes.get)
+
+
 class VoteEnsemblePredictor:
     def __init__(
         self,
@@ -19,15 +44,29 @@ class VoteEnsemblePredictor:
         weights: [List, dict] = None,
         numeric_agg="average",
         str_agg="max_vote",
+        concurrent=False,
+        devices=None,
+        num_threads=None,
     ):
         """
-        Initialize the VoteEnsemblePredictor.
+        Initialize the VoteEnsemblePredictor. If the predictors output the probabilities ("probs"), the labels
+        are predicted by weighted soft voting, i.e., the argmax of the weighted average of the probabilities
+        of the members. The other fields are aggregated by numeric_agg or str_agg, also weighted.
 
         :param predictors: A list of checkpoints, or a dictionary of initialized predictors.
         :param weights: A list of weights for each predictor, or a dictionary of weights for each predictor.
+                        The weights can be real numbers, e.g., the validation accuracy of each predictor.
         :param numeric_agg: The aggregation method for numeric data. Options are 'average', 'mean', 'max', 'min',
                             'median', 'mode', and 'sum'.
         :param str_agg: The aggregation method for string data. Options are 'max_vote', 'min_vote', 'vote', and 'mode'.
+        :param concurrent: Whether to run the members concurrently, each member runs in its own worker thread,
+                           so the ensemble latency approaches that of the slowest member.
+        :param devices: The devices to place the members on, e.g., "cuda:0", a list of devices which are assigned
+                        to the members in turn, or a dictionary of the device for each predictor.
+        :param num_threads: The number of intra-op CPU threads of torch when the members run concurrently, e.g.,
+                            the number of CPU cores divided by the number of members, so that the concurrent
+                            members do not oversubscribe the cores. N.B., it is set by torch.set_num_threads(),
+                            which is process-wide, i.e., it is shared by the members and the rest of the process.
         """
         if weights is not None:
             assert len(predictors) == len(
@@ -39,20 +78,21 @@ class VoteEnsemblePredictor:
 
         assert len(predictors) > 0, "Checkpoints should not be empty"
 
+        # all the methods take the values of the members (the first axis) and the weights of the members
         numeric_agg_methods = {
-            "average": np.mean,
-            "mean": np.mean,
-            "max": np.max,
-            "min": np.min,
-            "median": np.median,
-            "mode": lambda x: max(set(x), key=x.count),
-            "sum": np.sum,
+            "average": _weighted_average,
+            "mean": _weighted_average,
+            "max": lambda x, w: np.max(x, axis=0),
+            "min": lambda x, w: np.min(x, axis=0),
+            "median": _weighted_median,
+            "mode": None,  # voted as the string data
+            "sum": _weighted_sum,
         }
         str_agg_methods = {
-            "max_vote": lambda x: max(set(x), key=x.count),
-            "min_vote": lambda x: min(set(x), key=x.count),
-            "vote": lambda x: max(set(x), key=x.count),
-            "mode": lambda x: max(set(x), key=x.count),
+            "max_vote": lambda x, w: _weighted_vote(x, w, max),
+            "min_vote": lambda x, w: _weighted_vote(x, w, min),
+            "vote": lambda x, w: _weighted_vote(x, w, max),
+            "mode": lambda x, w: _weighted_vote(x, w, max),
         }
         assert (
             numeric_agg in numeric_agg_methods
@@ -67,81 +107,182 @@ class VoteEnsemblePredictor:
         if isinstance(predictors, dict):
             self.checkpoints = list(predictors.keys())
             self.predictors = predictors
-            self.weights = (
-                list(weights.values()) if weights else [1] * len(self.checkpoints)
+            self.weights = np.asarray(
+                (
+                    [weights[ckpt] for ckpt in self.checkpoints]
+                    if weights
+                    else [1] * len(self.checkpoints)
+                ),
+                dtype=float,
             )
         else:
             raise NotImplementedError(
                 "Only support dict type for checkpoints and weights"
             )
+        assert self.weights.sum() > 0, "The sum of weights should be positive"
+
+        if devices:
+            self.__place_members(devices)
+        self.concurrent = concurrent
+        self.num_threads = num_threads
+        self._executors = None
+
+    def __place_members(self, devices):
+        if isinstance(devices, str):
+            devices = [devices]
+        if not isinstance(devices, dict):
+            devices = {
+                ckpt: devices[i % len(devices)]
+                for i, ckpt in enumerate(self.checkpoints)
+            }
+        for ckpt, device in devices.items():
+            self.predictors[ckpt].to(device)
 
-    def __ensemble(self, result: dict):
+    def _get_executors(self):
+        if self._executors is None:
+            if self.num_threads:
+                # process-wide, the intra-op thread pool is shared by the worker threads
+                torch.set_num_threads(self.num_threads)
+            # one worker thread for each member, so a member never predicts two chunks at the same time
+            self._executors = [
+                ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="ensemble_member_{}".format(i)
+                )
+                for i in range(len(self.checkpoints))
+            ]
+        return self._executors
+
+    def close(self):
+        """
+        Shut down the worker threads of the members.
         """
-        Aggregate prediction results by calling the appropriate aggregation method.
+        if self._executors is not None:
+            for executor in self._executors:
+                executor.shutdown(wait=True)
+            self._executors = None
 
-        :param result: a dictionary containing the prediction results
-        :return: the aggregated prediction result
+    @staticmethod
+    def __get_labels(predictor, num_classes):
+        config = getattr(predictor, "config", None)
+        index_to_label = (
+            config.get("index_to_label", None) if config is not None else None
+        )
+        if not index_to_label:
+            return None
+        # the padding label (e.g., -100) is not a class
+        return [index_to_label.get(i) for i in range(num_classes)]
+
+    def __stack_probs(self, member_results):
         """
-        if isinstance(result, dict):
-            return self.__dict_aggregate(result)
-        elif isinstance(result, list):
-            return self.__list_aggregate(result)
-        else:
-            return result
+        Stack the probabilities of the members into a [members, samples, classes] array, the classes of
+        each member are reordered to the label order of the first member.
 
-    def __dict_aggregate(self, result: dict):
+        :param member_results: the per-sample results of each member
+        :return: the stacked probabilities and the labels of the classes
         """
-        Recursively aggregate a dictionary of prediction results.
+        probs = np.stack(
+            [np.stack([r["probs"] for r in results]) for results in member_results]
+        )
+        num_classes = probs.shape[-1]
+        labels = self.__get_labels(self.predictors[self.checkpoints[0]], num_classes)
+        for m, ckpt in enumerate(self.checkpoints[1:], start=1):
+            member_labels = self.__get_labels(self.predictors[ckpt], num_classes)
+            if labels and member_labels and member_labels != labels:
+                probs[m] = probs[m][:, [member_labels.index(l) for l in labels]]
+        return probs, labels
 
-        :param result: a dictionary containing the prediction results
-        :return: the aggregated prediction result
+    def __aggregate_column(self, column):
         """
-        ensemble_result = {}
-        for k, v in result.items():
-            if isinstance(result[k], list):
-                ensemble_result[k] = self.__list_aggregate(result[k])
-            elif isinstance(result[k], dict):
-                ensemble_result[k] = self.__dict_aggregate(result[k])
-            else:
-                ensemble_result[k] = result[k]
-        return ensemble_result
-
-    def __list_aggregate(self, result: list):
-        if not isinstance(result, list):
-            result = [result]
+        Aggregate the values of a field, column[m][s] is the value of member m on sample s.
 
-        assert all(
-            isinstance(x, (type(result[0]))) for x in result
-        ), "all type of result should be the same"
+        :param column: the values of the members
+        :return: the aggregated values of the samples
+        """
+        first = column[0]
+        try:
+            if all(values == first for values in column[1:]):
+                return first
+        except ValueError:
+            # the truth value of arrays is ambiguous
+            pass
 
-        if isinstance(result[0], list):
-            for i, k in enumerate(result):
-                result[i] = self.__list_aggregate(k)
-            # start to aggregate
+        if self.numeric_agg is not None:
             try:
-                new_result = self.numeric_agg(result)
-            except Exception as e:
-                try:
-                    new_result = self.str_agg(result)
-                except Exception as e:
-                    new_result = result
-            return [new_result]
-
-        elif isinstance(result[0], dict):
-            for k in result:
-                result[k] = self.__dict_aggregate(result[k])
-            return result
-
-        # start to aggregate
-        try:
-            new_result = self.numeric_agg(result)
-        except Exception as e:
+                values = np.asarray(column, dtype=float)
+                if values.ndim >= 2:
+                    return self.numeric_agg(values, self.weights).tolist()
+            except (TypeError, ValueError):
+                pass
+
+        aggregated = []
+        for values in zip(*column):
             try:
-                new_result = self.str_agg(result)
-            except Exception as e:
-                new_result = result
+                aggregated.append(self.str_agg(values, self.weights))
+            except TypeError:
+                # unhashable values are not aggregated
+                aggregated.append(list(values))
+        return aggregated
 
-        return new_result
+    def __ensemble(self, member_results: list):
+        """
+        Aggregate the prediction results of the members.
+
+        :param member_results: a list of the per-sample results of each member, the members should
+                               predict on the same samples in the same order
+        :return: the aggregated results of the samples
+        """
+        num_samples = len(member_results[0])
+        assert all(
+            len(results) == num_samples for results in member_results
+        ), "The members should predict the same number of samples"
+        if not num_samples:
+            return []
+
+        keys = list(member_results[0][0].keys())
+        columns = {}
+        if "probs" in keys:
+            probs, labels = self.__stack_probs(member_results)
+            ensemble_probs = np.einsum("m,msc->sc", self.weights, probs)
+            ensemble_probs /= self.weights.sum()
+            columns["probs"] = list(ensemble_probs)
+            if "confidence" in keys:
+                columns["confidence"] = ensemble_probs.max(axis=-1).tolist()
+        else:
+            labels = None
+
+        label_key = "sentiment" if "sentiment" in keys else "label"
+        if labels and label_key in keys:
+            columns[label_key] = [labels[i] for i in ensemble_probs.argmax(axis=-1)]
+
+            ref_key = "ref_" + label_key
+            if ref_key in keys and "ref_check" in keys:
+                correct = {True: "Correct", False: "Wrong"}
+                columns["ref_check"] = [
+                    correct[label == r[ref_key]] if r["ref_check"] else ""
+                    for label, r in zip(columns[label_key], member_results[0])
+                ]
+
+        for key in keys:
+            if key not in columns:
+                columns[key] = self.__aggregate_column(
+                    [[r[key] for r in results] for results in member_results]
+                )
+
+        return [dict(zip(keys, values)) for values in zip(*[columns[k] for k in keys])]
+
+    def _predict_member(self, predictor, texts, ignore_error=False, print_result=False):
+        if isinstance(predictor, SentimentClassifier):
+            # do not merge the aspects of the same sentence, so that the results of members are aligned
+            return predictor.predict(
+                texts,
+                ignore_error=ignore_error,
+                print_result=print_result,
+                merge_results=False,
+            )
+        else:
+            return predictor.predict(
+                texts, ignore_error=ignore_error, print_result=print_result
+            )
 
     def predict(self, text, ignore_error=False, print_result=False):
         """
@@ -156,63 +297,73 @@ class VoteEnsemblePredictor:
         :return: The ensemble prediction result
         :rtype: dict
         """
-        # Initialize an empty dictionary to store the prediction result
-        result = {}
-        # Loop through each checkpoint and predictor in the ensemble
-        for ckpt, predictor in self.predictors.items():
-            # Perform prediction on the text using the predictor
-            raw_result = predictor.predict(
-                text, ignore_error=ignore_error, print_result=print_result
-            )
-            # For each key-value pair in the raw result dictionary
-            for key, value in raw_result.items():
-                # If the key is not already in the result dictionary
-                if key not in result:
-                    # Initialize an empty list for the key
-                    result[key] = []
-                # Append the value to the list the number of times specified by the corresponding weight
-                for _ in range(self.weights[self.checkpoints.index(ckpt)]):
-                    result[key].append(value)
-        # Return the ensemble result by aggregating the values in the result dictionary
-        return self.__ensemble(result)
-
-    def batch_predict(self, texts, ignore_error=False, print_result=False):
+        results = self.batch_predict(
+            [text], ignore_error=ignore_error, print_result=print_result
+        )
+        predictor = self.predictors[self.checkpoints[0]]
+        if isinstance(predictor, SentimentClassifier):
+            # merge the results of the aspects in the text
+            return predictor.merge_results(results)[0]
+        return results[0]
+
+    def batch_predict(
+        self, texts, ignore_error=False, print_result=False, chunk_size=None
+    ):
         """
         Predicts on a batch of texts using the ensemble of predictors.
         :param texts: a list of strings to predict on.
         :param ignore_error: boolean indicating whether to ignore errors or raise exceptions when prediction fails.
         :param print_result: boolean indicating whether to print the raw results for each predictor.
+        :param chunk_size: the number of texts predicted by the members at a time, all the texts by default.
+                           In the concurrent mode, the members go on to the next chunk while the results of
+                           the previous chunk are aggregated.
         :return: a list of dictionaries, each dictionary containing the aggregated results of the corresponding text in the input list.
         """
-        batch_raw_results = []
-        for ckpt, predictor in self.predictors.items():
-            if isinstance(predictor, SentimentClassifier):
-                raw_results = predictor.predict(
-                    texts,
+        if chunk_size:
+            chunks = [
+                texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)
+            ]
+        else:
+            chunks = [texts]
+
+        ensemble_results = []
+        if not self.concurrent:
+            for chunk in chunks:
+                member_results = [
+                    self._predict_member(
+                        self.predictors[ckpt],
+                        chunk,
+                        ignore_error=ignore_error,
+                        print_result=print_result,
+                    )
+                    for ckpt in self.checkpoints
+                ]
+                ensemble_results.extend(self.__ensemble(member_results))
+            return ensemble_results
+
+        futures = [
+            [
+                executor.submit(
+                    self._predict_member,
+                    self.predictors[ckpt],
+                    chunk,
                     ignore_error=ignore_error,
                     print_result=print_result,
-                    merge_results=False,
-                )
-            else:
-                raw_results = predictor.predict(
-                    texts, ignore_error=ignore_error, print_result=print_result
                 )
-            batch_raw_results.append(raw_results)
-
-        batch_results = []
-        for raw_result in batch_raw_results:
-            for i, result in enumerate(raw_result):
-                if i >= len(batch_results):
-                    batch_results.append({})
-                for key, value in result.items():
-                    if key not in batch_results[i]:
-                        batch_results[i][key] = []
-                    for _ in range(self.weights[self.checkpoints.index(ckpt)]):
-                        batch_results[i][key].append(value)
-
-        ensemble_results = []
-        for result in batch_results:
-            ensemble_results.append(self.__ensemble(result))
+                for ckpt, executor in zip(self.checkpoints, self._get_executors())
+            ]
+            for chunk in chunks
+        ]
+        try:
+            for chunk_futures in futures:
+                # join the outputs of all the members on the chunk before the aggregation
+                member_results = [future.result() for future in chunk_futures]
+                ensemble_results.extend(self.__ensemble(member_results))
+        except Exception:
+            for chunk_futures in futures:
+                for future in chunk_futures:
+                    future.cancel()
+            raise
         return ensemble_results
 
     # def batch_predict(self, texts, ignore_error=False, print_result=False):
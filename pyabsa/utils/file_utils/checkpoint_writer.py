@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# file: checkpoint_writer.py
+# time: 19/10/2026 11:05
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import copy
+import itertools
+import os
+import pickle
+import queue
+import shutil
+import threading
+from collections import OrderedDict
+
+import torch
+from torch import nn
+
+from pyabsa.utils.pyabsa_utils import fprint
+
+
+def _unwrap_model(model):
+    if hasattr(model, "module"):
+        return model.module
+    if hasattr(model, "_orig_mod"):
+        return model._orig_mod
+    return model
+
+
+def _snapshot_tensors(tensors):
+    """
+    Copy the tensors to CPU memory, the copies from CUDA are issued asynchronously into pinned memory.
+    Tensors sharing the same storage (e.g., the shared PLM in ensemble models) are copied only once.
+
+    :param tensors: an iterable of (key, tensor)
+    :return: an OrderedDict of the CPU copies and a CUDA event to wait for (None if there is no CUDA tensor)
+    """
+    pin_memory = torch.cuda.is_available()
+    copies = OrderedDict()
+    copied = {}
+    event = None
+    for key, tensor in tensors:
+        tensor = tensor.detach()
+        tag = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape), tensor.stride())
+        if tag not in copied:
+            if tensor.device.type == "cuda":
+                copied[tag] = torch.empty(
+                    tensor.size(), dtype=tensor.dtype, pin_memory=pin_memory
+                )
+                copied[tag].copy_(tensor, non_blocking=True)
+                event = torch.cuda.Event()
+                event.record(torch.cuda.current_stream(tensor.device))
+            else:
+                copied[tag] = tensor.cpu().clone()
+        copies[key] = copied[tag]
+    return copies, event
+
+
+def _collect_tensors(tensors):
+    """
+    Collect the tensors without copying them, the checkpoint is written before the training goes on.
+
+    :param tensors: an iterable of (key, tensor)
+    :return: an OrderedDict of the tensors and None, as there is no CUDA event to wait for
+    """
+    return OrderedDict((key, tensor.detach()) for key, tensor in tensors), None
+
+
+def collect_checkpoint(config, model, tokenizer, snapshot=False):
+    """
+    Collect everything save_model() writes, which can be written by write_checkpoint().
+
+    :param config: the configuration of the model
+    :param model: the model to save
+    :param tokenizer: the tokenizer of the model
+    :param snapshot: copy the model to CPU memory, so that the training can go on while the checkpoint is written,
+                     otherwise the checkpoint refers to the model and must be written before the model changes
+    :return: the collected checkpoint
+    """
+    collect_tensors = _snapshot_tensors if snapshot else _collect_tensors
+    model_to_save = _unwrap_model(model)
+    checkpoint = {"save_mode": config.save_mode, "model_name": config.model_name}
+    if config.save_mode == 1 or config.save_mode == 2:
+        checkpoint["config"] = pickle.dumps(config)
+        checkpoint["tokenizer"] = pickle.dumps(tokenizer)
+        checkpoint["args"] = "".join(
+            "{}: {}\n".format(arg, config.args[arg])
+            for arg in config.args
+            if config.args_call_count[arg]
+        )
+        if config.save_mode == 1:
+            checkpoint["state_dict"], checkpoint["event"] = collect_tensors(
+                model_to_save.state_dict().items()
+            )
+        else:
+            # the compiled model can not be pickled, save the original model instead
+            model = getattr(model, "_orig_mod", model)
+            checkpoint["event"] = None
+            if snapshot:
+                # copy the model structure with its parameters and buffers replaced by the CPU copies
+                named_tensors = [
+                    (id(t), t)
+                    for t in itertools.chain(model.parameters(), model.buffers())
+                ]
+                copies, checkpoint["event"] = _snapshot_tensors(named_tensors)
+                memo = {}
+                for t_id, t in named_tensors:
+                    if isinstance(t, nn.Parameter):
+                        memo[t_id] = nn.Parameter(
+                            copies[t_id], requires_grad=t.requires_grad
+                        )
+                    else:
+                        memo[t_id] = copies[t_id]
+                model = copy.deepcopy(model, memo)
+            checkpoint["model"] = model
+
+    elif config.save_mode == 3:
+        if hasattr(model_to_save, "bert4global"):
+            model_to_save = model_to_save.bert4global
+        elif hasattr(model_to_save, "bert"):
+            model_to_save = model_to_save.bert
+        checkpoint["state_dict"], checkpoint["event"] = collect_tensors(
+            model_to_save.state_dict().items()
+        )
+        checkpoint["plm_config"] = model_to_save.config.to_json_string()
+        checkpoint["tokenizer"] = (
+            tokenizer.tokenizer if hasattr(tokenizer, "tokenizer") else tokenizer
+        )
+    else:
+        raise ValueError("Invalid save_mode: {}".format(config.save_mode))
+    return checkpoint
+
+
+def snapshot_checkpoint(config, model, tokenizer):
+    """
+    Take a snapshot of everything save_model() writes, so that the training can go on while the snapshot is written.
+
+    :param config: the configuration of the model
+    :param model: the model to save
+    :param tokenizer: the tokenizer of the model
+    :return: a snapshot which can be written by write_checkpoint()
+    """
+    return collect_checkpoint(config, model, tokenizer, snapshot=True)
+
+
+def write_checkpoint(snapshot, save_path):
+    """
+    Write a checkpoint collected by collect_checkpoint() or snapshot_checkpoint() to a temporary directory,
+    and then rename it to save_path, so a checkpoint directory is either complete or absent.
+
+    :param snapshot: the collected checkpoint
+    :param save_path: the checkpoint directory, which is replaced if exists
+    """
+    save_dir = save_path.rstrip("/\\")
+    tmp_dir = save_dir + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    if snapshot["event"] is not None:
+        snapshot["event"].synchronize()
+
+    model_name = snapshot["model_name"]
+    if snapshot["save_mode"] == 1 or snapshot["save_mode"] == 2:
+        with open(os.path.join(tmp_dir, model_name + ".config"), mode="wb") as f:
+            f.write(snapshot["config"])
+        with open(os.path.join(tmp_dir, model_name + ".tokenizer"), mode="wb") as f:
+            f.write(snapshot["tokenizer"])
+        with open(
+            os.path.join(tmp_dir, model_name + ".args.txt"), mode="w", encoding="utf8"
+        ) as f:
+            f.write(snapshot["args"])
+        if snapshot["save_mode"] == 1:
+            torch.save(
+                snapshot["state_dict"],
+                os.path.join(tmp_dir, model_name + ".state_dict"),
+            )
+        else:
+            torch.save(snapshot["model"], os.path.join(tmp_dir, model_name + ".model"))
+    else:
+        model_output_dir = os.path.join(tmp_dir, "fine-tuned-pretrained-model")
+        os.makedirs(model_output_dir)
+        torch.save(
+            snapshot["state_dict"], os.path.join(model_output_dir, "pytorch_model.bin")
+        )
+        with open(
+            os.path.join(model_output_dir, "config.json"), mode="w", encoding="utf8"
+        ) as f:
+            f.write(snapshot["plm_config"])
+        snapshot["tokenizer"].save_pretrained(model_output_dir)
+
+    if os.path.exists(save_dir):
+        shutil.rmtree(save_dir)
+    os.replace(tmp_dir, save_dir)
+
+
+class CheckpointWriter:
+    """
+    Save the checkpoints in a background thread, so that the training is not blocked by the disk.
+    The model is snapshotted to (pinned) CPU memory in save(), then written to a temporary directory
+    and atomically renamed to the checkpoint path. Only the latest keep_best_k checkpoints are retained,
+    as a checkpoint is saved only if the evaluation metric improves. The retention is restarted by reset(),
+    e.g., the best checkpoints of every fold are retained in the k-fold training.
+
+    The behaviours are controlled by the following config options:
+        async_checkpoint: write the checkpoints in a background thread, default True
+        keep_best_k: the number of best checkpoints to retain, default 1
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.asynchronous = config.get("async_checkpoint", True)
+        self.keep_best_k = max(1, config.get("keep_best_k", 1))
+
+        self.saved_paths = []
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+        self._exception = None
+
+    def save(self, model, tokenizer, save_path, prune=True):
+        """
+        Save the model to save_path without waiting for the disk.
+
+        :param model: the model to save
+        :param tokenizer: the tokenizer of the model
+        :param save_path: the path of the checkpoint directory
+        :param prune: whether the checkpoint is subject to the keep_best_k retention
+        """
+        try:
+            snapshot = snapshot_checkpoint(self.config, model, tokenizer)
+        except Exception as e:
+            # some objects in the model can not be copied, save it synchronously without the snapshot
+            fprint("Can not snapshot the model: {}, save it synchronously.".format(e))
+            self.wait()
+            from pyabsa.utils.file_utils.file_utils import save_model
+
+            save_model(self.config, model, tokenizer, save_path)
+            self._retain(save_path, prune)
+            return
+
+        if not self.asynchronous:
+            write_checkpoint(snapshot, save_path)
+            self._retain(save_path, prune)
+            return
+
+        self._raise_exception()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._queue.put((snapshot, save_path, prune))
+
+    def reset(self):
+        """
+        Start a new retention of the best checkpoints, e.g., for the next fold of the k-fold training,
+        so the best checkpoints saved before are not removed by the keep_best_k retention.
+        """
+        self.wait()
+        self.saved_paths = []
+
+    def wait(self):
+        """
+        Block until all the pending checkpoints are written.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+        self._raise_exception()
+
+    def close(self):
+        """
+        Write all the pending checkpoints and stop the background thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._thread = None
+        self._raise_exception()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                snapshot, save_path, prune = job
+                write_checkpoint(snapshot, save_path)
+                self._retain(save_path, prune)
+            except Exception as e:
+                self._exception = e
+            finally:
+                self._queue.task_done()
+
+    def _retain(self, save_path, prune):
+        if not prune:
+            return
+        save_dir = save_path.rstrip("/\\")
+        if save_dir in self.saved_paths:
+            self.saved_paths.remove(save_dir)
+        self.saved_paths.append(save_dir)
+        while len(self.saved_paths) > self.keep_best_k:
+            sub_optimal_path = self.saved_paths.pop(0)
+            if os.path.exists(sub_optimal_path):
+                shutil.rmtree(sub_optimal_path, ignore_errors=True)
+
+    def _raise_exception(self):
+        if self._exception is not None:
+            e, self._exception = self._exception, None
+            raise RuntimeError("Fail to save checkpoint, exception: {}".format(e))
@@ -6,8 +6,10 @@
 # Copyright (C) 2021. All Rights Reserved.
 
 import json
+import mmap
 import os
 import pickle
+import struct
 import sys
 import zipfile
 from typing import Union, List
@@ -19,7 +21,11 @@ import tqdm
 from findfile import find_files, find_cwd_file
 from termcolor import colored
 
-from pyabsa.utils.pyabsa_utils import save_args, fprint
+from pyabsa.utils.file_utils.checkpoint_writer import (
+    collect_checkpoint,
+    write_checkpoint,
+)
+from pyabsa.utils.pyabsa_utils import fprint
 
 
 def meta_load(path, **kwargs):
@@ -203,6 +209,63 @@ def load_pickle(file_path, **kwargs):
     return data
 
 
+MMAP_CACHE_MAGIC = b"PYABSA-MMAP-CACHE\n"
+
+
+def save_mmap_cache(data, file_path):
+    """
+    Save data to a cache file whose numpy arrays can be memory-mapped by load_mmap_cache(),
+    so that the processes loading the same cache share the arrays in the page cache.
+    The arrays are pickled out-of-band (pickle protocol 5) and stored after the pickle stream.
+    The file is written to a temporary file and then renamed, so the readers never see a partial cache.
+    """
+    buffers = []
+    stream = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+    buffers = [buffer.raw() for buffer in buffers]
+
+    header_size = len(MMAP_CACHE_MAGIC) + 16 + 16 * len(buffers)
+    offset = header_size + len(stream)
+    table = []
+    for buffer in buffers:
+        offset += -offset % 8  # align the arrays to 8 bytes
+        table.append((offset, buffer.nbytes))
+        offset += buffer.nbytes
+
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MMAP_CACHE_MAGIC)
+        f.write(struct.pack("<QQ", len(stream), len(buffers)))
+        for buffer_offset, buffer_size in table:
+            f.write(struct.pack("<QQ", buffer_offset, buffer_size))
+        f.write(stream)
+        for (buffer_offset, _), buffer in zip(table, buffers):
+            f.write(b"\0" * (buffer_offset - f.tell()))
+            f.write(buffer)
+    os.replace(tmp_path, file_path)
+
+
+def load_mmap_cache(file_path):
+    """
+    Load a cache file saved by save_mmap_cache(), the numpy arrays are memory-mapped copy-on-write.
+    The plain pickle files are loaded as usual.
+    """
+    with open(file_path, "rb") as f:
+        if f.read(len(MMAP_CACHE_MAGIC)) != MMAP_CACHE_MAGIC:
+            f.seek(0)
+            return pickle.load(f)
+        stream_size, num_buffers = struct.unpack("<QQ", f.read(16))
+        table = [struct.unpack("<QQ", f.read(16)) for _ in range(num_buffers)]
+        stream = f.read(stream_size)
+        if not num_buffers:
+            return pickle.loads(stream)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(mm)
+    return pickle.loads(
+        stream,
+        buffers=[view[offset : offset + size] for offset, size in table],
+    )
+
+
 def load_txt(file_path):
     """
     Load a plain text file and return a list of strings.
@@ -436,6 +499,7 @@ def unzip_checkpoint(zip_path):
 def save_model(config, model, tokenizer, save_path, **kwargs):
     """
     Save a trained model, configuration, and tokenizer to the specified path.
+    Use pyabsa.utils.file_utils.checkpoint_writer.CheckpointWriter to save checkpoints without blocking the training.
 
     Args:
         config (Config): Configuration for the model.
@@ -444,57 +508,5 @@ def save_model(config, model, tokenizer, save_path, **kwargs):
         save_path (str): The path where to save the model, config, and tokenizer.
         **kwargs: Additional keyword arguments.
     """
-    if (
-        hasattr(model, "module")
-        or hasattr(model, "core")
-        or hasattr(model, "_orig_mod")
-    ):
-        model_to_save = model.module
-    else:
-        model_to_save = model
-    # Check the specified save mode.
-    if config.save_mode == 1 or config.save_mode == 2:
-        # Create save_path directory if it doesn't exist.
-        if not os.path.exists(save_path):
-            os.makedirs(save_path)
-        # Save the configuration and tokenizer to the save_path directory.
-        f_config = open(save_path + config.model_name + ".config", mode="wb")
-        f_tokenizer = open(save_path + config.model_name + ".tokenizer", mode="wb")
-        pickle.dump(config, f_config)
-        pickle.dump(tokenizer, f_tokenizer)
-        f_config.close()
-        f_tokenizer.close()
-        # Save the arguments used to create the configuration.
-        save_args(config, save_path + config.model_name + ".args.txt")
-        # Save the model state dict or the entire model depending on the save mode.
-        if config.save_mode == 1:
-            torch.save(
-                model_to_save.state_dict(),
-                save_path + config.model_name + ".state_dict",
-            )
-        elif config.save_mode == 2:
-            torch.save(model.cpu(), save_path + config.model_name + ".model")
-
-    elif config.save_mode == 3:
-        # Save the fine-tuned BERT model.
-        model_output_dir = save_path + "fine-tuned-pretrained-model"
-        if not os.path.exists(model_output_dir):
-            os.makedirs(model_output_dir)
-        output_model_file = os.path.join(model_output_dir, "pytorch_model.bin")
-        output_config_file = os.path.join(model_output_dir, "config.json")
-
-        if hasattr(model_to_save, "bert4global"):
-            model_to_save = model_to_save.bert4global
-        elif hasattr(model_to_save, "bert"):
-            model_to_save = model_to_save.bert
-
-        torch.save(model_to_save.state_dict(), output_model_file)
-        model_to_save.config.to_json_file(output_config_file)
-        if hasattr(tokenizer, "tokenizer"):
-            tokenizer.tokenizer.save_pretrained(model_output_dir)
-        else:
-            tokenizer.save_pretrained(model_output_dir)
-
-    else:
-        raise ValueError("Invalid save_mode: {}".format(config.save_mode))
-    model.to(config.device)
+    # save_mode 1: save the state dict, save_mode 2: save the whole model, save_mode 3: save the fine-tuned PLM
+    write_checkpoint(collect_checkpoint(config, model, tokenizer), save_path)
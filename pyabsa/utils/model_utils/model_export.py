@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# file: model_export.py
+# time: 19/10/2026 20:05
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import inspect
+import json
+import os
+
+import torch
+from torch import nn
+
+from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
+from pyabsa.utils.model_utils.model_utils import unwrap_compiled_model
+from pyabsa.utils.pyabsa_utils import fprint
+
+EXPORT_FORMATS = ["onnx", "torchscript"]
+
+
+class PositionalModel(nn.Module):
+    """
+    Wrap a model which takes a dict (or a list) of the input columns into a model which takes the columns
+    as positional tensors and returns the logits tensor, i.e., the fixed signature of the exported graph.
+    The branches of the model on the config are frozen when the model is exported.
+    """
+
+    def __init__(self, model, inputs_cols, input_format="dict"):
+        """
+        :param model: the model to wrap
+        :param inputs_cols: the names of the input columns, in the order of the positional inputs
+        :param input_format: "dict" if the model takes a dict of the columns, or "list" if it takes a list
+        """
+        super().__init__()
+        self.model = model
+        self.inputs_cols = list(inputs_cols)
+        self.input_format = input_format
+
+    def forward(self, *inputs):
+        if self.input_format == "dict":
+            outputs = self.model(dict(zip(self.inputs_cols, inputs)))
+        else:
+            outputs = self.model(list(inputs))
+        if isinstance(outputs, dict):
+            outputs = outputs["logits"]
+        return outputs
+
+
+class ExportedModel:
+    """
+    Run an exported model (see export_model()) with the same interface as the model it is exported from,
+    i.e., it takes a dict (or a list) of the input tensors, and returns {"logits": logits} (or the logits),
+    so it can replace the model of a predictor without changing the pre- and post-processing.
+    The ONNX graphs are run by onnxruntime, which should be installed by `pip install onnxruntime`.
+    """
+
+    def __init__(self, path, device=DeviceTypeOption.CPU):
+        """
+        :param path: the path of the exported model, the metadata is read from path + ".json"
+        :param device: the device of the outputs
+        """
+        with open(path + ".json", mode="r", encoding="utf8") as f:
+            self.metadata = json.load(f)
+        self.path = path
+        self.export_format = self.metadata["export_format"]
+        self.inputs_cols = self.metadata["inputs_cols"]
+        self.input_format = self.metadata["input_format"]
+        self.device = device
+
+        if self.export_format == "onnx":
+            import onnxruntime
+
+            self.session = onnxruntime.InferenceSession(
+                path, providers=["CPUExecutionProvider"]
+            )
+            # the inputs not used by the model are removed from the graph
+            self.session_inputs = {i.name for i in self.session.get_inputs()}
+            self.module = None
+        else:
+            self.session = None
+            self.module = torch.jit.load(path, map_location=device)
+            self.module.eval()
+
+    def __call__(self, inputs):
+        if self.input_format == "dict":
+            tensors = [inputs[col] for col in self.inputs_cols]
+        else:
+            tensors = list(inputs)
+
+        if self.session is not None:
+            logits = self.session.run(
+                ["logits"],
+                {
+                    col: tensor.cpu().numpy()
+                    for col, tensor in zip(self.inputs_cols, tensors)
+                    if col in self.session_inputs
+                },
+            )[0]
+            logits = torch.from_numpy(logits).to(self.device)
+        else:
+            logits = self.module(*[tensor.to(self.device) for tensor in tensors])
+
+        return {"logits": logits} if self.input_format == "dict" else logits
+
+    def to(self, device):
+        self.device = device
+        if self.module is not None:
+            self.module.to(device)
+        return self
+
+    def eval(self):
+        return self
+
+    def parameters(self):
+        return iter(())
+
+
+def export_model(
+    model,
+    inputs_cols,
+    example_inputs,
+    path,
+    export_format="onnx",
+    input_format="dict",
+    atol=1e-4,
+    seq_len=None,
+):
+    """
+    Export a model to an ONNX graph or a TorchScript module with a fixed positional input signature,
+    the batch axis and the sequence axes (the axes of size seq_len, e.g., both axes of a [L, L] dependency graph)
+    of the inputs are dynamic, while the other axes (e.g., of a [2] aspect boundary) are static. The metadata
+    of the inputs is saved in path + ".json", and the outputs of the exported model are checked against the eager model.
+
+    :param model: the model to export, which takes a dict (or a list) of the input columns
+    :param inputs_cols: the names of the input columns
+    :param example_inputs: the example input tensors, in the order of inputs_cols
+    :param path: the path of the exported model
+    :param export_format: "onnx" or "torchscript"
+    :param input_format: "dict" if the model takes a dict of the columns, or "list" if it takes a list
+    :param atol: the maximum absolute difference between the exported and eager logits
+    :param seq_len: the length of the sequence axes, e.g., max_seq_len, only the batch axis is dynamic if it is None
+    :return: the exported model, see ExportedModel
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(
+            "Unsupported export format: {}, the available formats: {}".format(
+                export_format, EXPORT_FORMATS
+            )
+        )
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    wrapped_model = PositionalModel(
+        unwrap_compiled_model(model), inputs_cols, input_format
+    ).eval()
+    example_inputs = tuple(tensor.to(DeviceTypeOption.CPU) for tensor in example_inputs)
+    wrapped_model.to(DeviceTypeOption.CPU)
+
+    with torch.no_grad():
+        if export_format == "onnx":
+            dynamic_axes = {}
+            for col, tensor in zip(inputs_cols, example_inputs):
+                dynamic_axes[col] = {0: "batch"}
+                for axis in range(1, tensor.dim()):
+                    if seq_len is not None and tensor.size(axis) == seq_len:
+                        dynamic_axes[col][axis] = "sequence"
+            dynamic_axes["logits"] = {0: "batch"}
+            kwargs = {}
+            if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+                # the TorchScript based exporter, which does not depend on onnxscript
+                kwargs["dynamo"] = False
+            torch.onnx.export(
+                wrapped_model,
+                example_inputs,
+                path,
+                input_names=list(inputs_cols),
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=17,
+                **kwargs
+            )
+        else:
+            traced_model = torch.jit.trace(wrapped_model, example_inputs)
+            torch.jit.save(traced_model, path)
+
+    with open(path + ".json", mode="w", encoding="utf8") as f:
+        json.dump(
+            {
+                "export_format": export_format,
+                "inputs_cols": list(inputs_cols),
+                "input_format": input_format,
+            },
+            f,
+        )
+
+    exported_model = ExportedModel(path)
+    check_exported_model(exported_model, wrapped_model, example_inputs, atol)
+    fprint("Export the model to {}, format: {}".format(path, export_format))
+    return exported_model
+
+
+def check_exported_model(exported_model, wrapped_model, example_inputs, atol=1e-4):
+    """
+    Check the logits of the exported model against the eager model, on the example inputs and
+    on the first example only, so that the dynamic batch axis is checked as well.
+
+    :param exported_model: the exported model
+    :param wrapped_model: the eager model, wrapped by PositionalModel
+    :param example_inputs: the example input tensors
+    :param atol: the maximum absolute difference between the exported and eager logits
+    """
+    for inputs in [example_inputs, tuple(tensor[:1] for tensor in example_inputs)]:
+        with torch.no_grad():
+            reference = wrapped_model(*inputs).float()
+        if exported_model.input_format == "dict":
+            outputs = exported_model(dict(zip(exported_model.inputs_cols, inputs)))
+            outputs = outputs["logits"]
+        else:
+            outputs = exported_model(list(inputs))
+        error = (outputs.float().cpu() - reference).abs().max().item()
+        if error > atol:
+            raise RuntimeError(
+                "The outputs of the exported model differ from the eager model by {} (> {})".format(
+                    error, atol
+                )
+            )
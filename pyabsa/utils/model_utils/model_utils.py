@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+# file: model_utils.py
+# time: 19/10/2026 10:12
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+import inspect
+import itertools
+from contextlib import contextmanager
+
+import torch
+from findfile import find_cwd_dir
+from torch import nn
+from transformers import AutoConfig, AutoModel
+
+from pyabsa.framework.flag_class.flag_template import DeviceTypeOption
+from pyabsa.utils.pyabsa_utils import fprint
+
+
+@contextmanager
+def init_empty_weights():
+    """
+    A context manager in which the parameters of all created modules are allocated on the meta device,
+    i.e., they have shapes but no storage. The buffers are still allocated on CPU as they are usually
+    non-persistent (e.g., position_ids) and will not be found in the state dict.
+    """
+    old_register_parameter = nn.Module.register_parameter
+
+    def register_empty_parameter(module, name, param):
+        old_register_parameter(module, name, param)
+        if param is not None and param.device.type != "meta":
+            param_cls = type(module._parameters[name])
+            kwargs = module._parameters[name].__dict__
+            kwargs["requires_grad"] = param.requires_grad
+            module._parameters[name] = param_cls(
+                module._parameters[name].to("meta"), **kwargs
+            )
+
+    try:
+        nn.Module.register_parameter = register_empty_parameter
+        yield
+    finally:
+        nn.Module.register_parameter = old_register_parameter
+
+
+def load_pretrained_config(config, offline=False):
+    """
+    Load the configuration of the pretrained model (e.g., config.json) without loading its weights.
+
+    :param config: the PyABSA configuration which contains the pretrained_bert
+    :param offline: whether to search the pretrained model in the current working directory
+    :return: the transformers configuration of the pretrained model
+    """
+    if offline:
+        return AutoConfig.from_pretrained(
+            find_cwd_dir(config.pretrained_bert.split("/")[-1])
+        )
+    return AutoConfig.from_pretrained(config.pretrained_bert)
+
+
+def build_pretrained_skeleton(config, offline=False):
+    """
+    Build the pretrained model from its configuration only, the pretrained weights are not loaded,
+    so this should be only used when the weights will be overwritten by a checkpoint.
+
+    :param config: the PyABSA configuration which contains the pretrained_bert
+    :param offline: whether to search the pretrained model in the current working directory
+    :return: the skeleton of the pretrained model
+    """
+    return AutoModel.from_config(load_pretrained_config(config, offline=offline))
+
+
+def _load_state_dict_file(state_dict_path):
+    try:
+        # memory-map the checkpoint, so the tensors are paged in while they are assigned to the model
+        return torch.load(state_dict_path, map_location=DeviceTypeOption.CPU, mmap=True)
+    except (TypeError, RuntimeError):
+        # torch < 2.1 or legacy (non-zip) checkpoint format
+        return torch.load(state_dict_path, map_location=DeviceTypeOption.CPU)
+
+
+def build_model_from_state_dict(model_builder, state_dict_path):
+    """
+    Build a model skeleton on the meta device and stream the checkpoint weights into it, which avoids
+    materializing the random (or pretrained) weights that would be overwritten by load_state_dict immediately.
+    Falls back to the eager construction if the skeleton cannot be fully materialized from the checkpoint,
+    e.g., a buffer which is not saved in the checkpoint, or the keys of the checkpoint do not match the model
+    (then the error is raised by the strict load_state_dict of the eager model).
+
+    :param model_builder: a callable which takes no arguments and returns the model, the pretrained backbone
+        should be built by build_pretrained_skeleton() in the callable
+    :param state_dict_path: the path of the .state_dict checkpoint
+    :return: the model loaded with the checkpoint weights on CPU
+    """
+    state_dict = _load_state_dict_file(state_dict_path)
+
+    if "assign" in inspect.signature(nn.Module.load_state_dict).parameters:
+        with init_empty_weights():
+            model = model_builder()
+        # not strict, the tensors missing in the checkpoint are left on the meta device and checked below
+        incompatible_keys = model.load_state_dict(state_dict, strict=False, assign=True)
+        meta_tensors = [
+            name
+            for name, t in itertools.chain(
+                model.named_parameters(), model.named_buffers()
+            )
+            if t.is_meta
+        ]
+        if not meta_tensors and not incompatible_keys.unexpected_keys:
+            return model
+        fprint(
+            "The weights in {} do not match the model (e.g., {}), fall back to eager model construction.".format(
+                state_dict_path, (meta_tensors or incompatible_keys.unexpected_keys)[0]
+            )
+        )
+
+    model = model_builder()
+    model.load_state_dict(state_dict)
+    return model
+
+
+def compile_model(model, config):
+    """
+    Wrap the model with torch.compile if config.compile_model (or the legacy use_torch_compile) is set,
+    the inductor backend works on both CPU and CUDA. The model runs in eager mode if it can not be compiled,
+    either here or at its first call (see compile_fallback). The following config options are used:
+        compile_model: whether to compile the model, default False
+        compile_backend: the backend of torch.compile, default "inductor"
+        compile_mode: the mode of torch.compile, e.g., "max-autotune", default None
+        compile_fallback: whether to fall back to eager mode if the model fails to compile at its first call,
+            default True. N.B., the fallback sets torch._dynamo.config.suppress_errors, which is process-wide,
+            i.e., the compilation errors of the other compiled models and functions in the process are suppressed too.
+    The shapes are compiled statically, so the batches should be padded to a few sizes. The inference batches are
+    padded by pad_batch_to_bucket(). The training batches are not padded, as the padding samples would change the
+    loss and the batch statistics, and the datasets pad the sequences to max_seq_len, so the last smaller batch of
+    an epoch is the only extra shape to compile (the ASTE batches are padded to a multiple of seq_len_bucket).
+
+    :param model: the model to compile
+    :param config: the configuration of the model
+    :return: the compiled model, whose original model is model._orig_mod, or the model itself
+    """
+    if not config.get("compile_model", False) and not config.get(
+        "use_torch_compile", False
+    ):
+        return model
+    if is_compiled_model(model):
+        return model
+    backend = config.get("compile_backend", "inductor")
+    try:
+        import torch._dynamo
+
+        if config.get("compile_fallback", True):
+            # fall back to eager mode if the model fails to compile at its first call (process-wide)
+            torch._dynamo.config.suppress_errors = True
+        compiled_model = torch.compile(
+            model, backend=backend, mode=config.get("compile_mode", None), dynamic=False
+        )
+        fprint("Compile the model with torch.compile, backend: {}".format(backend))
+        return compiled_model
+    except Exception as e:
+        fprint("Can not compile the model: {}, run in eager mode.".format(e))
+        return model
+
+
+# the quantization modes supported by quantize_model(), and the dtypes of the quantized weights
+QUANTIZE_MODES = {"dynamic_int8": torch.qint8}
+
+
+def quantize_model(model, config, state_dict=None):
+    """
+    Quantize the nn.Linear layers of the model if config.quantize is set, with the dynamic quantization of torch,
+    i.e., the weights are stored in int8 and the activations are quantized on the fly, which speeds up the
+    inference of the PLM models on CPU. The model is returned as is on the other devices, or if it can not be
+    quantized. The following config options are used:
+        quantize: the quantization mode, only "dynamic_int8" is supported, default None
+
+    :param model: the float model on CPU, which is not changed
+    :param config: the configuration of the model
+    :param state_dict: the state dict of the quantized model, e.g., a cached one, which is loaded into the quantized model
+    :return: the quantized copy of the model, or the model itself
+    """
+    mode = config.get("quantize", None)
+    if not mode:
+        return model
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(
+            "Unsupported quantize mode: {}, the available modes: {}".format(
+                mode, list(QUANTIZE_MODES)
+            )
+        )
+    if torch.device(config.device).type != DeviceTypeOption.CPU:
+        fprint(
+            "The dynamic quantization only runs on CPU, the model is not quantized on {}.".format(
+                config.device
+            )
+        )
+        return model
+    try:
+        try:
+            from torch.ao.quantization import quantize_dynamic
+        except ImportError:
+            from torch.quantization import quantize_dynamic
+
+        quantized_model = quantize_dynamic(
+            model, {nn.Linear}, dtype=QUANTIZE_MODES[mode], inplace=False
+        )
+        if state_dict is not None:
+            quantized_model.load_state_dict(state_dict)
+        fprint("Quantize the nn.Linear layers of the model, mode: {}".format(mode))
+        return quantized_model
+    except Exception as e:
+        fprint("Can not quantize the model: {}, run in float32.".format(e))
+        return model
+
+
+def is_compiled_model(model):
+    return hasattr(model, "_orig_mod")
+
+
+def unwrap_compiled_model(model):
+    """
+    Get the original model of a compiled model, e.g., to load a state dict without the "_orig_mod." prefix.
+
+    :param model: the model, compiled or not
+    :return: the original model
+    """
+    return model._orig_mod if is_compiled_model(model) else model
+
+
+def get_bucket_size(size):
+    """
+    Round up the batch size to the next power of 2, so that a compiled model only sees a few batch sizes.
+    """
+    return 1 << max(0, int(size) - 1).bit_length()
+
+
+def _get_batch_size(inputs):
+    if isinstance(inputs, torch.Tensor):
+        return inputs.size(0) if inputs.dim() > 0 else None
+    if isinstance(inputs, dict):
+        inputs = list(inputs.values())
+    if isinstance(inputs, (list, tuple)):
+        for value in inputs:
+            batch_size = _get_batch_size(value)
+            if batch_size is not None:
+                return batch_size
+    return None
+
+
+def _resize_batch(inputs, batch_size, new_size):
+    if isinstance(inputs, torch.Tensor):
+        if inputs.dim() == 0 or inputs.size(0) != batch_size:
+            return inputs
+        if new_size < batch_size:
+            return inputs[:new_size]
+        # repeat the last sample, so the padding samples are valid inputs
+        padding = inputs[-1:].expand(new_size - batch_size, *inputs.shape[1:])
+        return torch.cat([inputs, padding])
+    if isinstance(inputs, dict):
+        return inputs.__class__(
+            (k, _resize_batch(v, batch_size, new_size)) for k, v in inputs.items()
+        )
+    if isinstance(inputs, (list, tuple)):
+        return inputs.__class__(_resize_batch(v, batch_size, new_size) for v in inputs)
+    return inputs
+
+
+def pad_batch_to_bucket(inputs):
+    """
+    Pad the batch dimension of the tensors in the inputs to the bucket size (see get_bucket_size()).
+    The sequences are already padded to max_seq_len by the datasets, so the batch size is the only varying shape.
+
+    :param inputs: a tensor, or a (nested) dict/list/tuple of tensors
+    :return: the padded inputs and the original batch size
+    """
+    batch_size = _get_batch_size(inputs)
+    if batch_size is None or batch_size == get_bucket_size(batch_size):
+        return inputs, batch_size
+    return _resize_batch(inputs, batch_size, get_bucket_size(batch_size)), batch_size
+
+
+def unpad_batch(outputs, batch_size):
+    """
+    Remove the padding samples added by pad_batch_to_bucket() from the outputs.
+
+    :param outputs: the outputs of the model on the padded inputs
+    :param batch_size: the original batch size
+    :return: the outputs of the original batch
+    """
+    if batch_size is None:
+        return outputs
+    return _resize_batch(outputs, get_bucket_size(batch_size), batch_size)
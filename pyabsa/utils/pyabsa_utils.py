@@ -4,6 +4,7 @@
 # author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
 # github: https://github.com/yangheng95
 # Copyright (C) 2021. All Rights Reserved.
+import contextlib
 import os
 import sys
 import time
@@ -269,6 +270,39 @@ def set_device(config, auto_device):
     return device, device_name
 
 
+def get_device_type(device):
+    """
+    Get the type of the device, e.g., "cuda" for "cuda:0".
+
+    :param device: the device, e.g., "cpu", "cuda:0", "allcuda" or a torch.device
+    :return: the device type
+    """
+    if isinstance(device, str) and device == DeviceTypeOption.ALL_CUDA:
+        return DeviceTypeOption.CUDA
+    try:
+        return torch.device(device).type
+    except (RuntimeError, TypeError):
+        return str(device)
+
+
+def autocast(device, enabled=True):
+    """
+    Get the automatic mixed precision context of the device, which runs in float16 on CUDA
+    (i.e., torch.cuda.amp.autocast()) and in bfloat16 on CPU.
+
+    :param device: the device of the model
+    :param enabled: whether to use the mixed precision, a null context is returned if False
+    :return: the autocast context, or a null context if the device is not supported
+    """
+    if enabled:
+        device_type = get_device_type(device)
+        if device_type == DeviceTypeOption.CUDA:
+            return torch.cuda.amp.autocast()
+        if device_type == DeviceTypeOption.CPU:
+            return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
 def fprint(*objects, sep=" ", end="\n", file=sys.stdout, flush=False):
     """
     Custom print function that adds a timestamp and the pyabsa version before the printed message.
@@ -54,6 +54,12 @@ extras["optional"] = [
     "tensorflow_hub",
 ]
 
+# Packages required for exporting the models to ONNX, see InferenceModel.export().
+extras["onnx"] = [
+    "onnx",
+    "onnxruntime",
+]
+
 # For developers, install development tools along with all optional dependencies.
 extras["dev"] = (
     extras["docs"]
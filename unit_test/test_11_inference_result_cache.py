@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# file: test_11_inference_result_cache.py
+# time: 19/10/2026 21:20
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+import os
+
+import numpy as np
+
+from pyabsa import AspectPolarityClassification as APC
+
+from tiny_models import in_temp_dir, train_tiny_apc
+
+# the texts with several aspects have a line per aspect
+INFERENCE_LINES = [
+    "the [B-ASP]food[E-ASP] is good but the service is bad . $LABEL$ Positive",
+    "the food is good but the [B-ASP]service[E-ASP] is bad . $LABEL$ Negative",
+    "the [B-ASP]wine list[E-ASP] is great . $LABEL$ Positive",
+    "the [B-ASP]food[E-ASP] and the [B-ASP]wine[E-ASP] is good . $LABEL$ Positive, Positive",
+    "the [B-ASP]service[E-ASP] is not good . $LABEL$ Negative",
+    "the [B-ASP]food[E-ASP] is not bad .",
+    "the food is not bad , the [B-ASP]wine[E-ASP] is good .",
+]
+# the lines are predicted as a sample per aspect
+NUM_SAMPLES = 8
+
+
+def assert_same_results(results, expected):
+    assert len(results) == len(expected)
+    for result, expected_result in zip(results, expected):
+        assert result.keys() == expected_result.keys()
+        for key in expected_result:
+            if key == "probs":
+                assert np.allclose(
+                    np.asarray(result[key]), np.asarray(expected_result[key]), atol=1e-6
+                )
+            elif key == "confidence":
+                assert np.allclose(result[key], expected_result[key], atol=1e-6)
+            else:
+                assert result[key] == expected_result[key]
+
+
+def count_model_calls(classifier):
+    calls = []
+    predict_samples = classifier._predict_samples
+
+    def _predict_samples(samples, *args, **kwargs):
+        calls.append(len(samples))
+        return predict_samples(samples, *args, **kwargs)
+
+    classifier._predict_samples = _predict_samples
+    return calls
+
+
+def test_cached_batch_predict_is_independent_of_cache_state():
+    with in_temp_dir():
+        classifier = train_tiny_apc()
+        with open("toy.apc.inference", "w", encoding="utf8") as f:
+            f.write("\n".join(INFERENCE_LINES) + "\n")
+
+        expected = classifier.batch_predict(
+            "toy.apc.inference", print_result=False, save_result=False
+        )
+        assert len(expected) < len(INFERENCE_LINES)  # the aspects of a text are merged
+
+        cached = APC.SentimentClassifier(
+            classifier.checkpoint, auto_device="cpu", inference_cache_size=100
+        )
+        calls = count_model_calls(cached)
+
+        # cold
+        results = cached.batch_predict(
+            "toy.apc.inference", print_result=False, save_result=False
+        )
+        assert_same_results(results, expected)
+        assert calls == [NUM_SAMPLES]
+        # warm
+        results = cached.batch_predict(
+            "toy.apc.inference", print_result=False, save_result=False
+        )
+        assert_same_results(results, expected)
+        assert calls == [NUM_SAMPLES]
+
+        # half-warm, one aspect line of a text is cached, and its sibling is not
+        cached.result_cache.clear()
+        cached.predict(INFERENCE_LINES[0], print_result=False)
+        cached.predict(INFERENCE_LINES[4], print_result=False)
+        results = cached.batch_predict(
+            "toy.apc.inference", print_result=False, save_result=False
+        )
+        assert_same_results(results, expected)
+        assert calls[-1] == NUM_SAMPLES - 2
+
+
+def test_cached_predict_is_independent_of_cache_state():
+    with in_temp_dir():
+        classifier = train_tiny_apc()
+        texts = [line.split("$LABEL$")[0].strip() for line in INFERENCE_LINES]
+        expected = classifier.predict(texts, print_result=False)
+
+        cached = APC.SentimentClassifier(
+            classifier.checkpoint, auto_device="cpu", inference_cache_size=100
+        )
+        cached.predict(texts[1], print_result=False)
+        assert_same_results(cached.predict(texts, print_result=False), expected)
+        assert_same_results(cached.predict(texts, print_result=False), expected)
+
+        expected = classifier.predict(texts, print_result=False, merge_results=False)
+        assert_same_results(
+            cached.predict(texts, print_result=False, merge_results=False), expected
+        )
+
+
+def test_invalid_samples_are_not_cached():
+    with in_temp_dir():
+        classifier = train_tiny_apc()
+        # the sample of "[ASP]" is invalid, and ignored by ignore_error=True
+        texts = [
+            "the [B-ASP]food[E-ASP] is good .",
+            "[ASP]",
+            "the [B-ASP]wine[E-ASP] is bad .",
+        ]
+        expected = classifier.predict(texts, print_result=False)
+        assert len(expected) == 2
+
+        cached = APC.SentimentClassifier(
+            classifier.checkpoint, auto_device="cpu", inference_cache_size=100
+        )
+        assert_same_results(cached.predict(texts, print_result=False), expected)
+        assert len(cached.result_cache) == 2
+        assert_same_results(cached.predict(texts, print_result=False), expected)
+
+
+def test_retrained_checkpoint_is_not_served_from_cache():
+    with in_temp_dir():
+        classifier = train_tiny_apc()
+        texts = [line.split("$LABEL$")[0].strip() for line in INFERENCE_LINES]
+
+        def build_cached_classifier():
+            cached = APC.SentimentClassifier(
+                classifier.checkpoint,
+                auto_device="cpu",
+                inference_cache_size=100,
+                inference_cache_path="results.db",
+            )
+            return cached, count_model_calls(cached)
+
+        cached, calls = build_cached_classifier()
+        cached.predict(texts, print_result=False)
+        assert calls == [NUM_SAMPLES]
+        # the results in the database are shared by the predictors of the same checkpoint
+        cached, calls = build_cached_classifier()
+        cached.predict(texts, print_result=False)
+        assert calls == []
+
+        # the checkpoint is retrained in place
+        for file in os.listdir(classifier.checkpoint):
+            path = os.path.join(classifier.checkpoint, file)
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        cached, calls = build_cached_classifier()
+        cached.predict(texts, print_result=False)
+        assert calls == [NUM_SAMPLES]
+
+
+if __name__ == "__main__":
+    test_cached_batch_predict_is_independent_of_cache_state()
+    test_cached_predict_is_independent_of_cache_state()
+    test_invalid_samples_are_not_cached()
+    test_retrained_checkpoint_is_not_served_from_cache()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# file: test_12_model_export.py
+# time: 19/10/2026 22:05
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+import importlib.util
+
+import numpy as np
+import torch
+from torch import nn
+
+from pyabsa import AspectPolarityClassification as APC
+from pyabsa.utils.model_utils.model_export import (
+    EXPORT_FORMATS,
+    ExportedModel,
+    PositionalModel,
+    export_model,
+)
+
+from tiny_models import in_temp_dir, train_tiny_apc, train_tiny_tc
+
+# the ONNX graphs can not be run without onnxruntime
+FORMATS = [
+    export_format
+    for export_format in EXPORT_FORMATS
+    if export_format != "onnx" or importlib.util.find_spec("onnxruntime")
+]
+
+APC_SAMPLES = [
+    "the [B-ASP]food[E-ASP] is good but the service is bad .",
+    "the food is good but the [B-ASP]service[E-ASP] is bad .",
+    "the [B-ASP]wine list[E-ASP] is great .",
+]
+
+TC_SAMPLES = ["the food is good .", "the service is not good .", "the wine is bad !"]
+
+
+def check_exported_logits(predictor, samples):
+    """
+    Export the model of the predictor to every format, and check the logits against the eager model
+    at the batch sizes 1 and len(samples).
+    """
+    inputs_cols, inputs, input_format = predictor._export_inputs(samples)
+    eager_model = PositionalModel(predictor.model, inputs_cols, input_format).eval()
+    for export_format in FORMATS:
+        exported_model = predictor.export(
+            "exported/model.{}".format(export_format), export_format, samples
+        )
+        for batch_size in [1, len(samples)]:
+            batch = [tensor[:batch_size] for tensor in inputs]
+            with torch.no_grad():
+                reference = eager_model(*batch)
+            if input_format == "dict":
+                logits = exported_model(dict(zip(inputs_cols, batch)))["logits"]
+            else:
+                logits = exported_model(batch)
+            assert logits.shape == reference.shape
+            assert torch.allclose(logits.float(), reference.float(), atol=1e-4)
+
+
+def check_onnx_dynamic_axes(predictor, samples):
+    """
+    Check that only the batch axis and the axes of max_seq_len are dynamic in the ONNX graph.
+    """
+    if "onnx" not in FORMATS:
+        return
+    inputs_cols, inputs, _ = predictor._export_inputs(samples)
+    exported_model = predictor.export("exported/model.onnx", "onnx", samples)
+    sizes = {col: tensor.shape for col, tensor in zip(inputs_cols, inputs)}
+    for graph_input in exported_model.session.get_inputs():
+        shape = graph_input.shape
+        assert isinstance(shape[0], str)
+        for axis in range(1, len(shape)):
+            if sizes[graph_input.name][axis] == predictor.config.max_seq_len:
+                assert isinstance(shape[axis], str), (graph_input.name, shape)
+            else:
+                assert shape[axis] == sizes[graph_input.name][axis], (
+                    graph_input.name,
+                    shape,
+                )
+
+
+def check_exported_predictions(classifier, samples):
+    """
+    Load the exported models by the SentimentClassifier (the exported_model option), and check the predictions
+    against the eager model.
+    """
+    expected = classifier.predict(samples, print_result=False)
+    for export_format in FORMATS:
+        path = "exported/model.{}".format(export_format)
+        classifier.export(path, export_format, samples)
+        exported_classifier = APC.SentimentClassifier(
+            classifier.checkpoint, auto_device="cpu", exported_model=path
+        )
+        assert isinstance(exported_classifier.model, ExportedModel)
+        results = exported_classifier.predict(samples, print_result=False)
+        assert len(results) == len(expected)
+        for result, expected_result in zip(results, expected):
+            assert result["sentiment"] == expected_result["sentiment"]
+            assert np.allclose(
+                np.asarray(result["probs"]),
+                np.asarray(expected_result["probs"]),
+                atol=1e-4,
+            )
+
+
+def test_export_apc_model():
+    with in_temp_dir():
+        classifier = train_tiny_apc()
+        check_exported_logits(classifier, APC_SAMPLES)
+        check_onnx_dynamic_axes(classifier, APC_SAMPLES)
+        check_exported_predictions(classifier, APC_SAMPLES)
+
+
+class BoundaryModel(nn.Module):
+    """
+    A toy model which takes the inputs of different ranks, the aspect boundaries are [batch, 2].
+    """
+
+    def __init__(self, vocab_size=10, hidden_dim=8, num_classes=3):
+        super().__init__()
+        self.embed = nn.Embedding(vocab_size, hidden_dim)
+        self.dense = nn.Linear(hidden_dim, num_classes)
+
+    def forward(self, inputs):
+        x = self.embed(inputs["text_indices"])
+        x = torch.bmm(inputs["dependency_graph"], x)
+        positions = torch.arange(x.size(1)).unsqueeze(0)
+        boundary = inputs["aspect_boundary"]
+        aspect_mask = (positions >= boundary[:, :1]) & (positions <= boundary[:, 1:])
+        x = (x * aspect_mask.unsqueeze(-1)).sum(dim=1)
+        return {"logits": self.dense(x)}
+
+
+def test_export_dynamic_axes():
+    with in_temp_dir():
+        batch_size, seq_len = 3, 12
+        inputs_cols = ["text_indices", "aspect_boundary", "dependency_graph"]
+        torch.manual_seed(0)
+        inputs = [
+            torch.randint(1, 10, (batch_size, seq_len)),
+            torch.tensor([[0, 1], [2, 4], [5, 5]]),
+            torch.rand(batch_size, seq_len, seq_len),
+        ]
+        model = BoundaryModel().eval()
+        for export_format in FORMATS:
+            exported_model = export_model(
+                model,
+                inputs_cols,
+                inputs,
+                "exported/model.{}".format(export_format),
+                export_format=export_format,
+                seq_len=seq_len,
+            )
+            for n in [1, batch_size]:
+                batch = [tensor[:n] for tensor in inputs]
+                with torch.no_grad():
+                    reference = model(dict(zip(inputs_cols, batch)))["logits"]
+                logits = exported_model(dict(zip(inputs_cols, batch)))["logits"]
+                assert torch.allclose(logits, reference, atol=1e-4)
+
+            if export_format == "onnx":
+                shapes = {i.name: i.shape for i in exported_model.session.get_inputs()}
+                assert all(isinstance(shape[0], str) for shape in shapes.values())
+                assert isinstance(shapes["text_indices"][1], str)
+                assert shapes["aspect_boundary"][1] == 2
+                assert isinstance(shapes["dependency_graph"][1], str)
+                assert isinstance(shapes["dependency_graph"][2], str)
+
+
+def test_export_tc_model():
+    with in_temp_dir():
+        classifier = train_tiny_tc()
+        check_exported_logits(classifier, TC_SAMPLES)
+        check_onnx_dynamic_axes(classifier, TC_SAMPLES)
+
+
+if __name__ == "__main__":
+    test_export_apc_model()
+    test_export_dynamic_axes()
+    test_export_tc_model()
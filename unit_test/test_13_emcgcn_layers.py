@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# file: test_13_emcgcn_layers.py
+# time: 19/10/2026 22:40
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+# Check the EMCGCN layers against the reference implementations, which materialize
+# the concatenated and expanded [batch, seq, seq, ...] tensors.
+import torch
+import torch.nn.functional as F
+
+from pyabsa.tasks.AspectSentimentTripletExtraction.models.model import (
+    GraphConvLayer,
+    RefiningStrategy,
+)
+
+BATCH, SEQ, GCN_DIM, OUTPUT_DIM = 3, 7, 16, 4
+EDGE_DIM = 5 * OUTPUT_DIM
+
+
+def reference_refining(module, edge, node):
+    batch, seq, seq, edge_dim = edge.shape
+    node1 = node.unsqueeze(1).expand(batch, seq, seq, node.shape[-1])
+    node2 = node1.permute(0, 2, 1, 3).contiguous()
+    edge_diag = torch.diagonal(edge, offset=0, dim1=1, dim2=2).permute(0, 2, 1)
+    edge_i = edge_diag.unsqueeze(1).expand(batch, seq, seq, edge_dim)
+    edge_j = edge_i.permute(0, 2, 1, 3).contiguous()
+    return module.W(torch.cat([edge, edge_i, edge_j, node1, node2], dim=-1))
+
+
+def reference_graph_conv(layer, weight_prob_softmax, weight_adj, gcn_inputs, self_loop):
+    batch, seq, dim = gcn_inputs.shape
+    weight_prob_softmax = weight_prob_softmax.permute(0, 3, 1, 2)
+    gcn_inputs = gcn_inputs.unsqueeze(1).expand(batch, layer.edge_dim, seq, dim)
+    Ax = torch.matmul(weight_prob_softmax + self_loop, gcn_inputs)
+    if layer.pooling == "avg":
+        Ax = Ax.mean(dim=1)
+    elif layer.pooling == "max":
+        Ax, _ = Ax.max(dim=1)
+    elif layer.pooling == "sum":
+        Ax = Ax.sum(dim=1)
+    node_outputs = F.relu(layer.layernorm(layer.W(Ax)))
+    return node_outputs, reference_refining(layer.highway, weight_adj, node_outputs)
+
+
+def reference_self_loop(masks, edge_dim):
+    batch, seq = masks.shape
+    tensor_masks = masks.unsqueeze(1).expand(batch, seq, seq).unsqueeze(-1)
+    return (
+        torch.stack([torch.eye(seq) for _ in range(batch)])
+        .unsqueeze(1)
+        .expand(batch, edge_dim, seq, seq)
+        * tensor_masks.permute(0, 3, 1, 2).contiguous()
+    )
+
+
+def random_masks():
+    masks = torch.ones(BATCH, SEQ)
+    masks[1, 4:] = 0
+    masks[2, 2:] = 0
+    return masks
+
+
+def test_refining_strategy():
+    torch.manual_seed(0)
+    module = RefiningStrategy(GCN_DIM, EDGE_DIM, OUTPUT_DIM)
+    edge = torch.rand(BATCH, SEQ, SEQ, EDGE_DIM)
+    node = torch.rand(BATCH, SEQ, GCN_DIM)
+    assert torch.allclose(
+        module(edge, node), reference_refining(module, edge, node), atol=1e-5
+    )
+
+
+def test_self_loop():
+    masks = random_masks()
+    self_loop = torch.diag_embed(masks).unsqueeze(1)
+    reference = reference_self_loop(masks, EDGE_DIM)
+    assert torch.equal(self_loop.expand_as(reference), reference)
+
+
+def test_graph_conv_layer():
+    masks = random_masks()
+    self_loop = torch.diag_embed(masks).unsqueeze(1)
+    for pooling in ["avg", "sum", "max"]:
+        torch.manual_seed(0)
+        layer = GraphConvLayer("cpu", GCN_DIM, EDGE_DIM, OUTPUT_DIM, pooling)
+        weight_prob_softmax = torch.rand(BATCH, SEQ, SEQ, EDGE_DIM)
+        weight_adj = torch.rand(BATCH, SEQ, SEQ, EDGE_DIM)
+        gcn_inputs = torch.rand(BATCH, SEQ, GCN_DIM)
+
+        node_outputs, edge_outputs = layer(
+            weight_prob_softmax.clone(), weight_adj, gcn_inputs, self_loop
+        )
+        reference_node_outputs, reference_edge_outputs = reference_graph_conv(
+            layer,
+            weight_prob_softmax,
+            weight_adj,
+            gcn_inputs,
+            reference_self_loop(masks, EDGE_DIM),
+        )
+        assert torch.allclose(node_outputs, reference_node_outputs, atol=1e-5), pooling
+        assert torch.allclose(edge_outputs, reference_edge_outputs, atol=1e-5), pooling
+
+
+if __name__ == "__main__":
+    test_refining_strategy()
+    test_self_loop()
+    test_graph_conv_layer()
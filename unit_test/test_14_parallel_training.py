@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# file: test_14_parallel_training.py
+# time: 19/10/2026 23:10
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+import glob
+
+from pyabsa import AspectPolarityClassification as APC
+from pyabsa.tasks.AspectPolarityClassification.instructor.apc_instructor import (
+    APCTrainingInstructor,
+)
+
+from tiny_models import in_temp_dir, train_tiny_apc
+
+
+class RecordingInstructor(APCTrainingInstructor):
+    """
+    Record the seed and device of the run after the dataset is built (or loaded from the cache).
+    """
+
+    def run(self):
+        with open("run.{}.device".format(self.config.seed), "w") as f:
+            f.write(str(self.config.device))
+        return super().run()
+
+
+class RecordingTrainer(APC.APCTrainer):
+    def _run(self):
+        self.training_instructor = RecordingInstructor
+        super()._run()
+
+
+def test_parallel_workers_keep_their_seeds_and_devices():
+    with in_temp_dir():
+        # the second worker loads the dataset cache saved by the first one
+        train_tiny_apc(
+            trainer_class=RecordingTrainer,
+            seed=[1, 2],
+            parallel_workers=2,
+            parallel_devices=["cpu", "cpu:0"],
+            cache_dataset=True,
+        )
+        assert len(glob.glob("*.dataset.*.cache")) == 1
+        runs = {}
+        for seed in [1, 2]:
+            with open("run.{}.device".format(seed)) as f:
+                runs[seed] = f.read()
+        assert sorted(runs.values()) == ["cpu", "cpu:0"]
+
+
+if __name__ == "__main__":
+    test_parallel_workers_keep_their_seeds_and_devices()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# file: test_15_checkpoint_writer.py
+# time: 19/10/2026 23:40
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+import os
+import pickle
+
+import torch
+from torch import nn
+
+from pyabsa.framework.configuration_class.configuration_template import ConfigManager
+from pyabsa.utils.file_utils import checkpoint_writer
+from pyabsa.utils.file_utils.checkpoint_writer import CheckpointWriter
+
+from tiny_models import in_temp_dir
+
+
+def build_config(save_mode):
+    config = ConfigManager({"model_name": "toy", "save_mode": save_mode})
+    config.async_checkpoint = True
+    return config
+
+
+def failing_snapshot_tensors(tensors):
+    raise RuntimeError("can not snapshot")
+
+
+def test_save_without_snapshot():
+    # snapshot_checkpoint() fails to copy the model, the checkpoint is saved synchronously
+    snapshot_tensors = checkpoint_writer._snapshot_tensors
+    checkpoint_writer._snapshot_tensors = failing_snapshot_tensors
+    try:
+        with in_temp_dir():
+            torch.manual_seed(0)
+            model = nn.Linear(4, 2)
+            for save_mode in [1, 2]:
+                config = build_config(save_mode)
+                writer = CheckpointWriter(config)
+                save_path = "checkpoints/toy_{}/".format(save_mode)
+                writer.save(model, ["a", "tokenizer"], save_path)
+                writer.close()
+
+                with open(os.path.join(save_path, "toy.config"), mode="rb") as f:
+                    assert pickle.load(f).save_mode == save_mode
+                with open(os.path.join(save_path, "toy.tokenizer"), mode="rb") as f:
+                    assert pickle.load(f) == ["a", "tokenizer"]
+                if save_mode == 1:
+                    state_dict = torch.load(os.path.join(save_path, "toy.state_dict"))
+                else:
+                    state_dict = torch.load(
+                        os.path.join(save_path, "toy.model"), weights_only=False
+                    ).state_dict()
+                for key, tensor in model.state_dict().items():
+                    assert torch.equal(state_dict[key], tensor)
+                assert not os.path.exists(save_path.rstrip("/") + ".tmp")
+    finally:
+        checkpoint_writer._snapshot_tensors = snapshot_tensors
+
+
+if __name__ == "__main__":
+    test_save_without_snapshot()
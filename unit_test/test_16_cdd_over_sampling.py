@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# file: test_16_cdd_over_sampling.py
+# time: 19/10/2026 23:55
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+import json
+import logging
+
+import torch
+
+from pyabsa.framework.configuration_class.configuration_template import ConfigManager
+from pyabsa.framework.sampler_class.imblanced_sampler import ImbalancedDatasetSampler
+from pyabsa.tasks.CodeDefectDetection.dataset_utils.__plm__.data_utils_for_training import (
+    BERTCDDDataset,
+)
+
+from tiny_models import in_temp_dir
+
+
+class ToyTokenizer:
+    pad_token_id, cls_token_id, eos_token_id = 0, 1, 2
+
+    def text_to_sequence(self, text, **kwargs):
+        return (
+            [self.cls_token_id]
+            + [3 + len(t) for t in text.split()]
+            + [self.eos_token_id]
+        )
+
+
+def build_dataset(**kwargs):
+    with open("toy.cdd", "w", encoding="utf8") as f:
+        for i in range(4):
+            code = "int f ( ) { return " + str(i) + " ; }"
+            f.write(json.dumps({"func": code, "target": i % 2}) + "\n")
+    config = ConfigManager(
+        {
+            "dataset_file": {"train": ["toy.cdd"]},
+            "max_seq_len": 8,
+            "noise_instance_num": 1,
+            "over_sampling": 3,
+            "remove_comments": False,
+            "verbose": False,
+            "logger": logging.getLogger("toy"),
+            **kwargs,
+        }
+    )
+    return BERTCDDDataset(config, ToyTokenizer(), "train")
+
+
+def test_truncated_windows_are_not_corrupted():
+    with in_temp_dir():
+        # each example has two windows, and the second window of the defective example 1 is cut by data_num
+        dataset = build_dataset(sliding_window=True, data_num=3)
+        assert [int(data["ex_id"]) for data in dataset.data] == [0, 0, 1]
+        assert dataset.corrupt_windows == [(1, 0)]
+        assert len(dataset) == 4
+        assert dataset.get_sample_weights() == [1, 1, 3, 1]
+
+
+def test_imbalanced_sampler_over_samples():
+    with in_temp_dir():
+        dataset = build_dataset()
+        sample_weights = dataset.get_sample_weights()
+        sampler = ImbalancedDatasetSampler(
+            dataset,
+            num_samples=round(sum(sample_weights)),
+            sample_weights=sample_weights,
+        )
+        balanced_weights = ImbalancedDatasetSampler(dataset).weights
+        assert len(sampler) == round(sum(sample_weights))
+        assert torch.allclose(
+            sampler.weights, balanced_weights * torch.DoubleTensor(sample_weights)
+        )
+
+
+if __name__ == "__main__":
+    test_truncated_windows_are_not_corrupted()
+    test_imbalanced_sampler_over_samples()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# file: tiny_models.py
+# time: 19/10/2026 21:10
+# author: YANG, HENG <hy345@exeter.ac.uk> (杨恒)
+# github: https://github.com/yangheng95
+# GScholar: https://scholar.google.com/citations?user=NPq5a_0AAAAJ&hl=en
+# ResearchGate: https://www.researchgate.net/profile/Heng-Yang-17/research
+# Copyright (C) 2022. All Rights Reserved.
+
+# Build tiny randomly initialized models and toy datasets, so that the tests of the inference
+# utilities run on CPU in seconds and do not download checkpoints.
+import contextlib
+import os
+import shutil
+import tempfile
+
+VOCAB = (
+    "[PAD] [UNK] [CLS] [SEP] [MASK] the food is good bad service not great "
+    "and but wine list . , ! ? [B-ASP] [E-ASP]"
+).split()
+
+APC_LINES = [
+    ("the $T$ is good but the service is bad .", "food", "Positive"),
+    ("the food is good but the $T$ is bad .", "service", "Negative"),
+    ("the $T$ is great .", "wine list", "Positive"),
+    ("the $T$ is not good .", "service", "Negative"),
+    ("the $T$ is not bad .", "food", "Neutral"),
+    ("the food and the $T$ is good .", "wine", "Positive"),
+]
+
+TC_LINES = [
+    ("the food is good .", "1"),
+    ("the food is bad .", "0"),
+    ("the service is great !", "1"),
+    ("the service is not good .", "0"),
+]
+
+
+@contextlib.contextmanager
+def in_temp_dir():
+    cwd = os.getcwd()
+    path = tempfile.mkdtemp()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def build_tiny_bert(path):
+    """
+    Save a tiny randomly initialized BERT and its tokenizer to path.
+    """
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizer
+
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "vocab.txt"), "w", encoding="utf8") as f:
+        f.write("\n".join(VOCAB) + "\n")
+    BertTokenizer(os.path.join(path, "vocab.txt")).save_pretrained(path)
+    torch.manual_seed(0)
+    BertModel(
+        BertConfig(
+            vocab_size=len(VOCAB),
+            hidden_size=32,
+            num_hidden_layers=2,
+            num_attention_heads=4,
+            intermediate_size=64,
+            max_position_embeddings=128,
+        )
+    ).save_pretrained(path)
+    return path
+
+
+def build_blank_spacy(path):
+    """
+    Save a blank English spacy pipeline to path, which is used as the spacy_model of the datasets.
+    """
+    import spacy
+
+    spacy.blank("en").to_disk(path)
+    return path
+
+
+def write_toy_datasets(root="."):
+    """
+    Write the toy APC and TC datasets to root/datasets.
+    """
+    apc_dir = os.path.join(root, "datasets", "apc_datasets", "999.toy")
+    tc_dir = os.path.join(root, "datasets", "text_classification", "999.toy")
+    os.makedirs(apc_dir, exist_ok=True)
+    os.makedirs(tc_dir, exist_ok=True)
+    for split, repeat in [("train", 4), ("test", 2)]:
+        with open(
+            os.path.join(apc_dir, "toy.{}.txt.apc".format(split)), "w", encoding="utf8"
+        ) as f:
+            for _ in range(repeat):
+                for text, aspect, label in APC_LINES:
+                    f.write("{}\n{}\n{}\n".format(text, aspect, label))
+        with open(
+            os.path.join(tc_dir, "toy.{}.txt.tc".format(split)), "w", encoding="utf8"
+        ) as f:
+            for _ in range(repeat):
+                for text, label in TC_LINES:
+                    f.write("{}$LABEL${}\n".format(text, label))
+    return apc_dir, tc_dir
+
+
+def train_tiny_apc(model=None, trainer_class=None, **kwargs):
+    """
+    Train a tiny APC model on the toy dataset for an epoch, in the current directory.
+
+    :param model: the APC model, default BERT_SPC
+    :param trainer_class: the trainer class, default APCTrainer
+    :return: the SentimentClassifier of the trained model
+    """
+    from pyabsa import (
+        AspectPolarityClassification as APC,
+        DeviceTypeOption,
+        ModelSaveOption,
+    )
+
+    write_toy_datasets()
+    config = APC.APCConfigManager.get_apc_config_english()
+    config.model = model if model else APC.APCModelList.BERT_SPC
+    config.pretrained_bert = build_tiny_bert(os.path.abspath("tiny_bert"))
+    config.spacy_model = build_blank_spacy(os.path.abspath("tiny_spacy"))
+    config.max_seq_len = 24
+    config.hidden_dim = 32
+    config.embed_dim = 32
+    config.num_epoch = 1
+    config.batch_size = 8
+    config.log_step = -1
+    config.seed = 1
+    config.cache_dataset = False
+    config.verbose = False
+    for key, value in kwargs.items():
+        config[key] = value
+    trainer = (trainer_class if trainer_class else APC.APCTrainer)(
+        config=config,
+        dataset="datasets/apc_datasets/999.toy",
+        checkpoint_save_mode=ModelSaveOption.SAVE_MODEL_STATE_DICT,
+        auto_device=DeviceTypeOption.CPU,
+    )
+    return trainer.load_trained_model()
+
+
+def train_tiny_tc(model=None, **kwargs):
+    """
+    Train a tiny text classification model on the toy dataset for an epoch, in the current directory.
+
+    :param model: the TC model, default BERT_MLP
+    :return: the TextClassifier of the trained model
+    """
+    from pyabsa import TextClassification as TC, DeviceTypeOption, ModelSaveOption
+
+    write_toy_datasets()
+    config = TC.TCConfigManager.get_tc_config_english()
+    config.model = model if model else TC.BERTTCModelList.BERT_MLP
+    config.pretrained_bert = build_tiny_bert(os.path.abspath("tiny_bert"))
+    config.max_seq_len = 24
+    config.hidden_dim = 32
+    config.num_epoch = 1
+    config.batch_size = 8
+    config.log_step = -1
+    config.seed = 1
+    config.cache_dataset = False
+    config.verbose = False
+    for key, value in kwargs.items():
+        config[key] = value
+    trainer = TC.TCTrainer(
+        config=config,
+        dataset="datasets/text_classification/999.toy",
+        checkpoint_save_mode=ModelSaveOption.SAVE_MODEL_STATE_DICT,
+        auto_device=DeviceTypeOption.CPU,
+    )
+    return trainer.load_trained_model()